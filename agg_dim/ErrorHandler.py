@@ -58,4 +58,12 @@ class UnknownLayoutError(Exception):
         
         legal = ", ".join(legallist)
         self.message = f"{illegal} is no legal layout for {instrument}. You can use a custom layout or use one of the known layouts: {legal}"
-        super().__init__(self.message)
\ No newline at end of file
+        super().__init__(self.message)
+        
+
+class NotRefreshable(Exception):
+    
+    def __init__(self,reason,instrument):
+        
+        self.message = f"{instrument}.refresh() cant be used, since {reason}"
+        super().__init__(self.message)
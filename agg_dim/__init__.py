@@ -1,6 +1,35 @@
-from .drone import Dronedata, DroneWrapper
-from .fluoreszenz import FData, NewFData
-from .lowcostsensors import CCS811, SEN55, FlyingFlo_USB
-from .particle_counters import Pops, OPC
-from .wibs import WIBS
-from .weather import WeatherData
\ No newline at end of file
+"""
+All classes are loaded on first access (eg. 'from agg_dim import Pops' only imports particle_counters.py and its dependencies)
+"""
+
+import importlib
+
+lazyclasses = {"Dronedata" : "drone",
+               "DroneWrapper" : "drone",
+               "FData" : "fluoreszenz",
+               "NewFData" : "fluoreszenz",
+               "CCS811" : "lowcostsensors",
+               "SEN55" : "lowcostsensors",
+               "FlyingFlo_USB" : "lowcostsensors",
+               "Pops" : "particle_counters",
+               "OPC" : "particle_counters",
+               "WIBS" : "wibs",
+               "WeatherData" : "weather"}
+submodules = ["drone","fluoreszenz","lowcostsensors","particle_counters","wibs","weather",
+              "ErrorHandler","cachefile","decimation","filereaders","gridding","lazyloading","maplayers","profiling","timetools"]
+
+__all__ = list(lazyclasses)
+
+
+def __getattr__(name):
+    if name in lazyclasses:
+        obj = getattr(importlib.import_module(f".{lazyclasses[name]}",__name__),name)
+        globals()[name] = obj
+        return obj
+    if name in submodules:
+        return importlib.import_module(f".{name}",__name__)
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(submodules))
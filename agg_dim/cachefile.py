@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Shared columnar cache format for preprocessed files (.opc, .fspec, .wibs, .flight)
+
+A cache is a folder containing one .npy file per array and a meta.json, which describes the nested structure
+and holds all small values (details, units, bg parameters, ...). Arrays are memory-mapped and only read when they are accessed.
+Files in the old (pickled) format can still be loaded.
+"""
+
+from collections.abc import Mapping, MutableMapping
+import datetime as dt
+import json
+import os
+import pickle
+import shutil
+import numpy as np
+
+from .ErrorHandler import IllegalFileFormat
+
+metaname = "meta.json"
+formatname = "agg_dim cache"
+version = 1
+
+
+class LazyDict(MutableMapping):
+    """
+    dict-like view on a (part of a) cache folder. Values are read from disk on first access.
+
+    Variables
+    ---------
+    LazyDict.folder : str
+        Contains the path of the cache folder
+    LazyDict.tree : dict {str : dict}
+        Contains the description of every value, which has not been read yet (None for values that were set in memory)
+    LazyDict.loaded : dict
+        Contains all values that were already read or set
+    """
+
+    def __init__(self,folder,tree):
+        self.folder = folder
+        self.tree = dict(tree)
+        self.loaded = {}
+
+
+    def __getitem__(self,key):
+        if key not in self.loaded:
+            self.loaded[key] = hk_readnode(self.folder,self.tree[key])
+        return self.loaded[key]
+
+
+    def __setitem__(self,key,value):
+        if key not in self.tree:
+            self.tree[key] = None
+        self.loaded[key] = value
+
+
+    def __delitem__(self,key):
+        del self.tree[key]
+        self.loaded.pop(key,None)
+
+
+    def __iter__(self):
+        return iter(self.tree)
+
+
+    def __len__(self):
+        return len(self.tree)
+
+
+    def __contains__(self,key):
+        #without reading the value from disk (Mapping.__contains__ would call __getitem__)
+        return key in self.tree
+
+
+    def __repr__(self):
+        return f"LazyDict({list(self.tree)})"
+
+
+def savecache(path,content):
+    """
+    Saves a (nested) dict in the columnar cache format
+
+    Parameters
+    ----------
+    path : str
+        Path of the cache folder. An existing cache (or old pickled file) at this path is replaced.
+    content : dict {str : any}
+        Contains the data. np.arrays and lists of numbers or datetimes are saved as .npy files, everything else has to be json-serializable.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    #write into a temporary folder first, so that objs loaded from the same path can still read their arrays while they are saved
+    tmp = path + ".tmp"
+    if os.path.isdir(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+    files = []
+    tree = hk_writenode(tmp,content,files)
+    with open(os.path.join(tmp,metaname),"w") as f:
+        json.dump({"format" : formatname, "version" : version, "content" : tree},f)
+
+    if os.path.isfile(path):
+        os.remove(path)
+    elif os.path.isdir(path):
+        #arrays memory-mapped from the old folder are copied into memory first (mapped files cant be removed on Windows)
+        release(content,path)
+        shutil.rmtree(path)
+    os.replace(tmp,path)
+
+
+def release(value,path):
+    """
+    Copies all arrays in value, which are memory-mapped from a file of the cache folder at path, into memory (dicts, LazyDicts and lists are changed in place)
+
+    Call it on every attribute, which is not part of the content passed to savecache(), before a cache is saved over the folder it was loaded from.
+
+    Parameters
+    ----------
+    value : any
+        np.array, list or (nested) dict.
+    path : str
+        Path of the cache folder.
+
+    Returns
+    -------
+    any
+        value or an in-memory copy of it, if it is a mapped array.
+
+    """
+
+    if isinstance(value,np.ndarray):
+        return np.array(value) if hk_mappedfrom(value,path) else value
+    if isinstance(value,list):
+        value[:] = [release(element,path) for element in value]
+    elif isinstance(value,MutableMapping):
+        #only values of a LazyDict, which have already been read, can be mapped
+        items = value.loaded.items() if isinstance(value,LazyDict) else value.items()
+        for key,val in list(items):
+            new = release(val,path)
+            if new is not val:
+                value[key] = new
+    return value
+
+
+def loadcache(path,legacykeys=None):
+    """
+    Opens a cache folder without reading any arrays
+
+    Parameters
+    ----------
+    path : str
+        Path of the cache folder or of a file in the old pickled format.
+    legacykeys : list of str, optional
+        Names of the elements, if the old pickled format stored a list or tuple instead of a dict. The default is None.
+
+    Returns
+    -------
+    LazyDict or dict
+        Contains the saved data (old pickled files are returned as dict).
+
+    """
+
+    if os.path.isfile(path):
+        with open(path,"rb") as openfile:
+            ip = pickle.load(openfile)
+        if legacykeys is not None and isinstance(ip,(list,tuple)):
+            ip = dict(zip(legacykeys,ip))
+        return ip
+
+    metafile = os.path.join(path,metaname)
+    if not os.path.isfile(metafile):
+        raise FileNotFoundError(f"{path} is neither a cache folder nor a file")
+    with open(metafile) as f:
+        meta = json.load(f)
+    if meta.get("format") != formatname:
+        raise IllegalFileFormat(path.split(".")[-1], "opc, .fspec, .wibs or .flight cache folder", "path in loadcache()")
+    return hk_readnode(path,meta["content"])
+
+
+#housekeeping funcs
+
+def hk_writenode(folder,value,files):
+    """Writes value (arrays as .npy files) and returns its description for meta.json"""
+
+    if isinstance(value,Mapping):
+        return {"type" : "dict", "items" : {str(key) : hk_writenode(folder,val,files) for key,val in value.items()}}
+
+    if isinstance(value,np.generic):
+        return {"type" : "value", "value" : value.item()}
+
+    if isinstance(value,(np.ndarray,list,tuple)):
+        arr = hk_toarray(value)
+        if arr is not None:
+            name = f"{len(files)}.npy"
+            files.append(name)
+            np.save(os.path.join(folder,name),arr,allow_pickle=False)
+            return {"type" : "array",
+                    "file" : name,
+                    "datetime" : arr.dtype.kind == "M" and not (isinstance(value,np.ndarray) and value.dtype.kind == "M"),
+                    "time" : arr.dtype.kind == "m" and not (isinstance(value,np.ndarray) and value.dtype.kind == "m"),
+                    "list" : not isinstance(value,np.ndarray)}
+        if isinstance(value,np.ndarray):
+            value = value.tolist()
+
+    return {"type" : "value", "value" : value}
+
+
+def hk_mappedfrom(arr,path):
+    """Checks if arr (or the array it is a view of) is memory-mapped from a file inside the folder at path"""
+
+    folder = os.path.normcase(os.path.abspath(path)) + os.sep
+    while isinstance(arr,np.ndarray):
+        if isinstance(arr,np.memmap) and arr.filename is not None:
+            return os.path.normcase(os.path.abspath(arr.filename)).startswith(folder)
+        arr = arr.base
+    return False
+
+
+def hk_toarray(value):
+    """Converts value into an array, which can be saved as .npy file (returns None if that is not possible)"""
+
+    try:
+        arr = np.asarray(value)
+    except ValueError:
+        return None
+    if arr.dtype.kind in "biufcmM":
+        return arr
+    if arr.dtype.kind == "O" and arr.size > 0 and all(isinstance(element,dt.datetime) for element in arr.flat):
+        return arr.astype("datetime64[us]")
+    if arr.dtype.kind == "O" and arr.size > 0 and all(isinstance(element,dt.time) for element in arr.flat):
+        #times of the day are saved as timedelta64 since midnight
+        return np.array([((t.hour*60 + t.minute)*60 + t.second)*1000000 + t.microsecond for t in arr.flat]).reshape(arr.shape).astype("timedelta64[us]")
+    return None
+
+
+def hk_readnode(folder,node):
+    """Reads a value from its description in meta.json"""
+
+    match node["type"]:
+        case "dict":
+            return LazyDict(folder,node["items"])
+        case "array":
+            arr = np.load(os.path.join(folder,node["file"]),mmap_mode="c",allow_pickle=False)
+            if node["datetime"]:
+                arr = arr.astype(object)
+            if node.get("time",False):
+                midnight = dt.datetime(2000,1,1)
+                arr = np.array([(midnight + dt.timedelta(microseconds=int(us))).time() for us in arr.astype(np.int64).flat],dtype=object).reshape(arr.shape)
+            if node["list"]:
+                return list(arr)
+            return arr
+        case _:
+            return node["value"]
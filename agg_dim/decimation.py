@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Shared decimation of long time series before they are drawn (used by the plot methods with decimate=True)
+
+Only as many points as the axis has pixel columns can be told apart on screen, so a series is reduced to a few points per pixel column
+while its visual peaks are kept (min/max per column or largest-triangle-three-buckets).
+"""
+
+import numpy as np
+
+from .ErrorHandler import IllegalValue
+
+modes = ["minmax","lttb"]
+
+
+def fitpixels(ax,x,y,mode=True,pixels=None):
+    """
+    Decimates a series to the pixel width of an axis (the series is returned unchanged if it is short enough, mode is False or x is not sorted)
+
+    Parameters
+    ----------
+    ax : mpl-axis
+        Axis the series will be drawn on (its width in pixels decides the number of buckets).
+    x : array-like
+        x-values of the series (float, np.datetime64 or dt.datetime, ascending).
+    y : array-like of float
+        y-values of the series.
+    mode : bool or str, optional
+        False: no decimation, True or "minmax": first, min, max and last point of every pixel column, "lttb": one point per pixel column (largest-triangle-three-buckets). The default is True.
+    pixels : int or None, optional
+        Number of buckets, if None the width of ax in pixels is used. The default is None.
+
+    Returns
+    -------
+    x : np.array
+        Contains the kept x-values (same type as the given ones).
+    y : np.array
+        Contains the kept y-values.
+
+    """
+
+    if mode is False:
+        return x,y
+    mode = "minmax" if mode is True else mode
+    if mode not in modes:
+        raise IllegalValue("decimate","fitpixels()",["False","True"] + modes)
+    if pixels is None:
+        pixels = int(ax.get_window_extent().width)
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if len(x) <= 4*max(pixels,1):
+        return x,y
+    try:
+        position = hk_numeric(x)
+    except (TypeError,ValueError,AttributeError):
+        return x,y
+    if np.any(np.diff(position) < 0):
+        return x,y
+    idx = minmax(position,y,pixels) if mode == "minmax" else lttb(position,y,pixels)
+    return x[idx],y[idx]
+
+
+def minmax(x,y,buckets):
+    """
+    Returns the indices of the first, min, max and last point of every bucket (buckets are equally wide in x)
+
+    Parameters
+    ----------
+    x : np.array of float
+        x-values (ascending).
+    y : np.array of float
+        y-values (nan gaps are kept: the first nan of a bucket is kept as well).
+    buckets : int
+        Number of buckets.
+
+    Returns
+    -------
+    np.array of int
+        Contains the kept indices (ascending, without duplicates).
+
+    """
+
+    y = np.asarray(y,dtype=float)
+    if len(x) == 0 or x[-1] == x[0]:
+        return np.arange(len(x))
+    span = x[-1] - x[0]
+    bucket = np.minimum(((x - x[0]) / span * buckets).astype(np.int64),buckets-1)
+
+    #every bucket is a contiguous block of the sorted series
+    starts = np.concatenate([[0],np.flatnonzero(np.diff(bucket)) + 1])
+    ends = np.append(starts[1:],len(x)) - 1
+    gid = np.repeat(np.arange(len(starts)),ends - starts + 1)
+    nans = np.isnan(y)
+    low = np.where(nans,np.inf,y)
+    high = np.where(nans,-np.inf,y)
+    mins = np.minimum.reduceat(low,starts)
+    maxs = np.maximum.reduceat(high,starts)
+    keep = np.zeros(len(x),dtype=bool)
+    keep[starts] = True
+    keep[ends] = True
+    for hit in [low == mins[gid],high == maxs[gid],nans]:
+        first = np.flatnonzero(hit)
+        first = first[np.unique(gid[first],return_index=True)[1]]
+        keep[first] = True
+    return np.flatnonzero(keep)
+
+
+def lttb(x,y,n):
+    """
+    Returns the indices of n points picked with largest-triangle-three-buckets (keeps the shape of the series with one point per bucket)
+
+    Parameters
+    ----------
+    x : np.array of float
+        x-values (ascending).
+    y : np.array of float
+        y-values.
+    n : int
+        Number of points which are kept (including the first and the last one).
+
+    Returns
+    -------
+    np.array of int
+        Contains the kept indices (ascending).
+
+    """
+
+    y = np.asarray(y,dtype=float)
+    if n >= len(x) or n < 3:
+        return np.arange(len(x))
+    edges = np.linspace(1,len(x)-1,n-1).astype(np.int64)
+    idx = np.zeros(n,dtype=np.int64)
+    idx[-1] = len(x) - 1
+    for i in range(n-2):
+        a = idx[i]
+        lo,hi = edges[i],edges[i+1]
+        if hi <= lo:
+            idx[i+1] = lo
+            continue
+        nxt = slice(hi,edges[i+2]) if i+2 < len(edges) else slice(len(x)-1,len(x))
+        cx,cy = np.mean(x[nxt]),np.nanmean(y[nxt]) if np.any(np.isfinite(y[nxt])) else 0.0
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        idx[i+1] = lo + (np.nanargmax(area) if np.any(np.isfinite(area)) else 0)
+    return np.unique(idx)
+
+
+#housekeeping funcs
+
+def hk_numeric(x):
+    """Turns x-values (float, np.datetime64 or dt.datetime) into float"""
+
+    if x.dtype == object:
+        #seconds since the first value (much faster than converting every dt.datetime to np.datetime64)
+        return np.fromiter(((value - x[0]).total_seconds() for value in x),float,len(x))
+    if np.issubdtype(x.dtype,np.datetime64):
+        return x.astype("datetime64[us]").astype(np.int64).astype(float)
+    return x.astype(float)
@@ -1,13 +1,20 @@
 import csv
-import pickle
 import datetime as dt
-import matplotlib.dates as md
-import folium
-import branca.colormap as cm
 import numpy as np
-from PIL import Image
-import utm
-from .ErrorHandler import IllegalArgument, IllegalFileFormat
+from .ErrorHandler import IllegalArgument, IllegalFileFormat, IllegalValue
+from .cachefile import loadcache, savecache
+from .decimation import fitpixels
+from .filereaders import readlines
+from .gridding import bingrid
+from .lazyloading import LazyModule
+from .maplayers import decimate, gridlayer, pointlayer
+from .timetools import align, crop, parsedatetime, resample
+
+md = LazyModule("matplotlib.dates")
+folium = LazyModule("folium")
+cm = LazyModule("branca.colormap")
+Image = LazyModule("PIL.Image")
+utm = LazyModule("utm")
 
 class Dronedata: 
     """full documentation see https://github.com/matrup01/data_import_modules \n
@@ -30,7 +37,7 @@ class Dronedata:
         """
         with open(file) as f:
             data = csv.reader(f,delimiter=",")
-        data = list(data)
+            data = list(data)
         
         self.t = [dt.datetime.strptime(data[i][1].replace(",","."),"%I:%M:%S.%f %p") for i in range(1,len(data))]
         #data: [height,long,lat,ws]
@@ -79,7 +86,7 @@ class Dronedata:
             ax.spines["left"].set_alpha(0)
             
             
-    def flightmap(self,zoomstart=21,colors=["brown","white","blue"]):
+    def flightmap(self,zoomstart=21,colors=["brown","white","blue"],mindistance=None,maxpoints=None):
         """
         Opens your flight in openstreetmap in the browser with colors indicating height.
 
@@ -89,6 +96,10 @@ class Dronedata:
             Changes the zoomlevel of the map (can be further changed manually once the map is opened). The default is 21.
         colors : str, optional
             Changes the colors for the height colormap. The default is ["brown","white","blue"].
+        mindistance : int|float, optional
+            If given, consecutive points closer than about mindistance meters are only drawn once (see maplayers.decimate). The default is None.
+        maxpoints : int, optional
+            If given, at most maxpoints points are drawn. The default is None.
 
         Returns
         -------
@@ -103,8 +114,9 @@ class Dronedata:
         
         output = folium.Map(location=(x_start,y_start),control_scale=True,zoom_start=zoomstart,max_zoom=50)
         
-        for height,long,lat in zip(self.data[0],self.data[1],self.data[2]):
-            folium.Circle(location=[lat,long],radius=0.1,fill=True,color=cmap(height)).add_to(output)
+        height,long,lat = np.asarray(self.data[0]),np.asarray(self.data[1]),np.asarray(self.data[2])
+        keep = decimate(lat,long,mindistance,maxpoints)
+        pointlayer(lat[keep],long[keep],height[keep],cmap).add_to(output)
             
         output.add_child(cmap)
         
@@ -176,7 +188,9 @@ class DroneWrapper:
     file (str) ... takes a Drone produced .csv file
     dronetype (str, optional) ... specifies which drone was used to read csv correctly (currently implemented: "BladeScapes","Own") - default: "BladeScapes"\n
     start (str, optional) ... if a str of the form "HH:MM:SS" is given, all data acquired before this timestamp wont be used\n
-    end (str, optional) ... if a str of the form "HH:MM:SS" ist given, all data acquired after this timestamp wont be used\n\n
+    end (str, optional) ... if a str of the form "HH:MM:SS" ist given, all data acquired after this timestamp wont be used\n
+    window (int, float or str, optional) ... length of the windows the BladeScapes telemetry is averaged over (seconds or str like '10s') - default: 1\n
+    columns (dict, optional) ... extra telemetry columns {key : [column, name, unit]}, column is the index or header of the column in the csv-file - default: {}\n\n
     
     Variables\n
     ---------\n
@@ -198,6 +212,10 @@ class DroneWrapper:
             if a str of the form "HH:MM:SS" is given, all data acquired before this timestamp wont be used
         end : str, optional
             if a str of the form "HH:MM:SS" is given, all data acquired after this timestamp wont be used
+        window : int, float or str, optional
+            length of the windows the BladeScapes telemetry is averaged over (seconds or str like '10s', '1min', see timetools.resample). The default is 1.
+        columns : dict, optional
+            extra telemetry columns (eg. speed or heading) in the form {key : [column, name, unit]}, where column is the index or the header of the column in the csv-file. They end up in DroneWrapper.data["Drone"][key] (averaged like height, long and lat). The default is {}.
 
         Returns
         -------
@@ -208,27 +226,32 @@ class DroneWrapper:
         #kwargs
         defaults = {"dronetype" : "BladeScapes",
                     "start" : "*",
-                    "end" : "*"
+                    "end" : "*",
+                    "window" : 1,
+                    "columns" : {}
             }
         for key,value in zip(defaults.keys(),defaults.values()):
             self.hk_kwargs(kwargs, key, value)
         self.hk_errorhandling(kwargs, defaults.keys(), "DroneWrapper")
         
         #variables
+        self.aligncache = {}
         self.data = {}
         self.details = {"Drone" : {"height" : ["Height AGL","m AGL"],
                                    "long" : ["longitude","eastern longitude"], 
                                    "lat" : ["latitude","nothern latitude"]}}
          
+        for key,(col,name,unit) in self.columns.items():
+            self.details["Drone"][key] = [name,unit]
+         
         match file.split(".")[-1]:
             case "csv":
-        
-                with open(file) as f:
-                    data = csv.reader(f,delimiter=",")
-                data = list(data)
                     
                 match self.dronetype.lower():
                     case "own":
+                        with open(file) as f:
+                            data = csv.reader(f,delimiter=",")
+                            data = list(data)
                         self.data["Drone"] = {
                             "t" : np.array([dt.datetime.strptime(data[i][1].replace(",","."),"%I:%M:%S.%f %p").replace(microsecond=0) for i in range(1,len(data))]),
                             #data: [height,long,lat,ws]
@@ -236,60 +259,44 @@ class DroneWrapper:
                             "long" : np.array([float(data[i][5].replace(",",".")) for i in range(1,len(data))]),
                             "lat" : np.array([float(data[i][4].replace(",",".")) for i in range(1,len(data))]),
                             }
+                        for key,(col,name,unit) in self.columns.items():
+                            col = self.hk_column(data[0],col)
+                            self.data["Drone"][key] = np.array([float(data[i][col].replace(",",".") or "nan") for i in range(1,len(data))])
                     case "bladescapes":
-                        current_time = data[1][1][:-4]
-                        takeoff_alt = float(data[1][12])
-                        h_appender, long_appender, lat_appender = [],[],[]
-                        t, h, long, lat = [], [], [], []
-                        for line in data[1:]:
-                            if line[1][:-4] == current_time:
-                                h_appender.append(float(line[12])-takeoff_alt)
-                                long_appender.append(float(line[11]))
-                                lat_appender.append(float(line[10]))
-                            else:
-                                t.append(dt.datetime.strptime(current_time.replace(".","-"),"%Y-%m-%d %H:%M:%S"))
-                                h.append(np.mean(h_appender))
-                                long.append(np.mean(long_appender))
-                                lat.append(np.mean(lat_appender))
-                                h_appender = [float(line[12])-takeoff_alt]
-                                long_appender = [float(line[11])]
-                                lat_appender = [float(line[10])]
-                                current_time = line[1][:-4]
-                                
-                            self.data["Drone"] = {
-                                "t" : np.array(t),
-                                "height" : np.array(h),
-                                "long" : np.array(long),
-                                "lat" : np.array(lat)
-                                }
+                        lines = readlines(file)
+                        header = lines[0].split(",")
+                        lines = [line for line in lines[1:] if line.count(",") == len(header)-1] #skip incomplete lines
+                        #data: [lat,long,altitude,extra columns]
+                        cols = [10,11,12] + [self.hk_column(header,col) for col,name,unit in self.columns.values()]
+                        fields = np.array(",".join(lines).split(",")).reshape(len(lines),len(header)) if lines else np.empty((0,len(header)),dtype=str)
+                        t = parsedatetime(fields[:,1],fmt="%Y.%m.%d %H:%M:%S.%f")
+                        values = fields[:,cols].T.astype(float)
+                        if len(lines) > 0:
+                            values[2] -= values[2][0] #height above takeoff
+                        
+                        #average all columns per window in one grouped reduction
+                        t,values = resample(t,values,window=self.window,agg="mean",label="left")
+                        self.data["Drone"] = {"t" : t.astype(object),
+                                              "height" : values[2],
+                                              "long" : values[1],
+                                              "lat" : values[0]}
+                        for i,key in enumerate(self.columns):
+                            self.data["Drone"][key] = values[3+i]
                             
                 #crop
-                if self.start != "*":
-                    for i in range(len(self.data["Drone"]["t"])):
-                        if dt.datetime.strptime(self.start,"%H:%M:%S").time() <= self.data["Drone"]["t"][i].time():
-                            break
-                    start_i = i
-                else: start_i = 0
-                
-                if self.end != "*":
-                    for i in range(len(self.data["Drone"]["t"])):
-                        if dt.datetime.strptime(self.end,"%H:%M:%S") <= self.data["Drone"]["t"][i]:
-                            break
-                    end_i = i
-                else: end_i = len(self.data["Drone"]["t"])-1
-                
+                sl = crop(self.data["Drone"]["t"],None if self.start == "*" else self.start,None if self.end == "*" else self.end)
                 for key in self.data["Drone"]:
-                    self.data["Drone"][key] = self.data["Drone"][key][start_i:end_i]
+                    self.data["Drone"][key] = self.data["Drone"][key][sl]
             
             case "flight":
-                with open(file,"rb") as openfile:
-                    self.data, self.details = pickle.load(openfile)
+                ip = loadcache(file,legacykeys=["data","details"])
+                self.data, self.details = ip["data"], ip["details"]
             
             case _:
                 raise IllegalFileFormat(file.split(".")[-1], ".csv or .flight", "DroneWrapper arguments")
                  
                 
-    def wrap(self,name,obj):
+    def wrap(self,name,obj,**kwargs):
         """
         adds an instance of a data class (Pops,NewFData or FlyingFlo_USB) to the DroneWrapper
 
@@ -299,6 +306,8 @@ class DroneWrapper:
             name that is used to find the data from the wrapped object (key in DroneWrapper.data and DroneWrapper.details).
         obj : Pops, NewFDatam or FlyingFlo_USB
             Object which should  be wrapped.
+        agg : str, optional
+            decides which value is used if the wrapped obj has more than one measurement in a second ("first", "last" or "mean"). The default is "first".
 
         Returns
         -------
@@ -306,10 +315,19 @@ class DroneWrapper:
 
         """
         
-        y,details = obj.returndata()
+        #import kwargs
+        defaults = {"agg" : "first"
+            }
+        for key,def_val in zip(defaults.keys(),defaults.values()):
+            kwargs[key] = self.hk_func_kwargs(kwargs,key,def_val)
+        self.hk_errorhandling(kwargs, defaults.keys(), "DroneWrapper.wrap()")
+        
+        y,details = obj.returndata(agg=kwargs["agg"])
         
         self.data[name] = y
         self.details[name] = details
+        for key in [key for key in self.aligncache if name in key[:2]]:
+            del self.aligncache[key]
         
     
     def returndata(self,nested=False):
@@ -351,6 +369,10 @@ class DroneWrapper:
             takes a value taht is checked in targetfunc
         targety : str, optional
             takes a legal y-string (depends on wrapped objects) and hands the corresponding data to targetfunc
+        join : str, optional
+            decides how the timestamps of different objects are matched ("inner": nearest timestamp, "asof": last timestamp that is not later). The default is "inner".
+        tolerance : float or None, optional
+            maximum time difference in seconds for two timestamps to be matched (None for no limit). The default is 0.
 
         Returns
         -------
@@ -362,7 +384,9 @@ class DroneWrapper:
         defaults = {"targetfunc" : None,
                     "target1" : None,
                     "target2" : None,
-                    "targety" : None
+                    "targety" : None,
+                    "join" : "inner",
+                    "tolerance" : 0
             }
         for key,def_val in zip(defaults.keys(),defaults.values()):
             kwargs[key] = self.hk_func_kwargs(kwargs,key,def_val)
@@ -380,31 +404,10 @@ class DroneWrapper:
                 kwargs["targetfunc"] = default
                 
             ty1,ty2 = kwargs["targety"].split("_")
-                
-            xt = [self.data[y1]["t"][i].time() for i in range(len(self.data[y1]["t"]))]
-            yt = [self.data[ty1]["t"][i].time() for i in range(len(self.data[ty1]["t"]))]
-            
-            if xt[0] in yt:
-                x_start = 0
-                y_start = yt.index(xt[0])
-                if len(yt) >= y_start + len(xt):
-                    x_end = len(xt)
-                    y_end = y_start + len(xt)
-                else:
-                    y_end = len(yt)
-                    x_end = x_start + (y_end - y_start)
-            else:
-                y_start = 0
-                x_start = xt.index(yt[0])
-                if len(xt) >= x_start + len(yt):
-                    y_end = len(yt)
-                    x_end = x_start + len(yt)
-                else:
-                    x_end = len(xt)
-                    y_end = y_start + (x_end - x_start)
+            ix,iy = self.hk_align(y1,ty1,kwargs["join"],kwargs["tolerance"])
                     
-            op = op[x_start:x_end]
-            ty = self.data[ty1][ty2][y_start:y_end]
+            op = op[ix]
+            ty = self.data[ty1][ty2][iy]
                 
             m = kwargs["targetfunc"](kwargs["target1"],kwargs["target2"],ty)
             op = op[m]
@@ -412,7 +415,7 @@ class DroneWrapper:
         return op
         
         
-    def flightmap(self,zoomstart=21,colors=["brown","white","blue"]):
+    def flightmap(self,zoomstart=21,colors=["brown","white","blue"],mindistance=None,maxpoints=None):
         """
         plots the height AGL of the drone over an OSM Map in your browser
 
@@ -422,6 +425,10 @@ class DroneWrapper:
             decides on which zoomlevel the map should be rendered (can be changed while using the map by turning the mousewheel). The default is 21.
         colors : list of str, optional
             changes the color used for the colormap. The default is ["brown","white","blue"].
+        mindistance : int|float, optional
+            if given, consecutive points closer than about mindistance meters are only drawn once (see maplayers.decimate). The default is None.
+        maxpoints : int, optional
+            if given, at most maxpoints points are drawn. The default is None.
 
         Returns
         -------
@@ -429,23 +436,21 @@ class DroneWrapper:
 
         """
         
-        _lat = self.data["Drone"]["lat"]
-        _long = self.data["Drone"]["long"]
-        for i in range(len(_lat)):
-            if np.isnan(_lat[i]):
-                _lat[i] = _lat[i-1] if i != 0 else _lat[-1]
-            if np.isnan(_long[i]):
-                _long[i] = _long[i-1] if i != 0 else _lat[-1]
+        lat = self.data["Drone"]["lat"]
+        long = self.data["Drone"]["long"]
+        height = self.data["Drone"]["height"]
+        m = np.isfinite(lat) & np.isfinite(long)
+        lat,long,height = lat[m],long[m],height[m]
         
-        x_start = (max(self.data["Drone"]["lat"]) + min(self.data["Drone"]["lat"])) / 2
-        y_start = (max(self.data["Drone"]["long"]) + min(self.data["Drone"]["long"])) / 2
+        x_start = (max(lat) + min(lat)) / 2
+        y_start = (max(long) + min(long)) / 2
         
-        cmap = cm.LinearColormap(colors=colors,vmin=min(self.data["Drone"]["height"]),vmax=max(self.data["Drone"]["height"]),caption="Height AGL in m")
+        cmap = cm.LinearColormap(colors=colors,vmin=min(height),vmax=max(height),caption="Height AGL in m")
         
         output = folium.Map(location=(x_start,y_start),control_scale=True,zoom_start=zoomstart,max_zoom=50)
         
-        for height,long,lat in zip(self.data["Drone"]["height"],self.data["Drone"]["long"],self.data["Drone"]["lat"]):
-            folium.Circle(location=[lat,long],radius=0.1,fill=True,color=cmap(height)).add_to(output)
+        keep = decimate(lat,long,mindistance,maxpoints)
+        pointlayer(lat[keep],long[keep],height[keep],cmap).add_to(output)
             
         output.add_child(cmap)
         
@@ -468,14 +473,28 @@ class DroneWrapper:
             if a target height is given, only data in the height-range of target_height+-height_deviation is plotted
         height_deviation : int|float, optional
             specifies the range for the target height (only usefull if a target_height is given). The default is 1.
+        mindistance : int|float, optional
+            only usefull if bettermap=False. If given, consecutive points closer than about mindistance meters are only drawn once (see maplayers.decimate).
+        maxpoints : int, optional
+            only usefull if bettermap=False. If given, at most maxpoints points are drawn.
         bettermap : bool, optional
             if True a grid of the values is calculated and plotted instead of single datapoints. The default is False.
         bettermap_resolution : int, optional
             only usefull if bettermap=True. A grid of bettermap_resolution x bettermap_resolution will be used to plot the data. The default is 15.
+        bettermap_minimumcounts : int, optional
+            only usefull if bettermap=True. Cells with less datapoints are not plotted. The default is 0.
+        bettermap_stat : str, optional
+            only usefull if bettermap=True. Statistic of every cell ("mean", "median", "max", "min", "sum", "count" or "std", see gridding.bingrid). The default is "mean".
+        bettermap_cellsize : int|float, optional
+            only usefull if bettermap=True. If a cellsize is given, cells of bettermap_cellsize x bettermap_cellsize meters are used instead of bettermap_resolution.
         mapimage : str, optional
             if a mapimage is given and a mapimage.png and mapimage.tfw exist, the png will be plotted onto the map
         save_loc : str, optional
             if a save_loc is given, the map will be saved as a html file and not displayed in the browser
+        join : str, optional
+            decides how the timestamps of the drone and the wrapped obj are matched ("inner": nearest timestamp, "asof": last timestamp that is not later). The default is "inner".
+        tolerance : float or None, optional
+            maximum time difference in seconds for two timestamps to be matched (None for no limit). The default is 0.
 
         Returns
         -------
@@ -488,11 +507,17 @@ class DroneWrapper:
                     "colors" : ["purple","blue","yellow","red"],
                     "target_height" : "none",
                     "height_deviation" : 1,
+                    "mindistance" : None,
+                    "maxpoints" : None,
                     "bettermap" : False,
                     "bettermap_resolution" : 15,
                     "bettermap_minimumcounts" : 0,
+                    "bettermap_stat" : "mean",
+                    "bettermap_cellsize" : None,
                     "mapimage" : None,
-                    "save_loc" : None
+                    "save_loc" : None,
+                    "join" : "inner",
+                    "tolerance" : 0
             }
         for key,default in zip(defaults.keys(),defaults.values()):
             kwargs[key] = self.hk_func_kwargs(kwargs,key,default)
@@ -501,31 +526,11 @@ class DroneWrapper:
         name,yy = y.split("_")
         y = self.data[name][yy]
         
-        xt = [self.data["Drone"]["t"][i].time() for i in range(len(self.data["Drone"]["t"]))]
-        yt = [self.data[name]["t"][i].time() for i in range(len(self.data[name]["t"]))]
-        
-        if xt[0] in yt:
-            x_start = 0
-            y_start = yt.index(xt[0])
-            if len(yt) >= y_start + len(xt):
-                x_end = len(xt)
-                y_end = y_start + len(xt)
-            else:
-                y_end = len(yt)
-                x_end = x_start + (y_end - y_start)
-        else:
-            y_start = 0
-            x_start = xt.index(yt[0])
-            if len(xt) >= x_start + len(yt):
-                y_end = len(yt)
-                x_end = x_start + len(yt)
-            else:
-                x_end = len(xt)
-                y_end = y_start + (x_end - x_start)
+        ix,iy = self.hk_align("Drone",name,kwargs["join"],kwargs["tolerance"])
                 
-        lat = self.data["Drone"]["lat"][x_start:x_end]
-        long = self.data["Drone"]["long"][x_start:x_end]
-        y = self.data[name][yy][y_start:y_end]
+        lat = self.data["Drone"]["lat"][ix]
+        long = self.data["Drone"]["long"][ix]
+        y = self.data[name][yy][iy]
         
         m1 = np.isfinite(lat)
         m2 = np.isfinite(long)
@@ -537,7 +542,7 @@ class DroneWrapper:
         y = y[m]
         
         if not isinstance(kwargs["target_height"],str):
-            height = self.data["Drone"]["height"][x_start:x_end]
+            height = self.data["Drone"]["height"][ix]
             height = height[m]
             m1 = np.greater_equal(height,kwargs["target_height"]-kwargs["height_deviation"])
             m2 = np.less_equal(height,kwargs["target_height"]+kwargs["height_deviation"])
@@ -554,28 +559,10 @@ class DroneWrapper:
             output = folium.Map(location=(x1_start,x2_start),control_scale=True,zoom_start=kwargs["zoomstart"],max_zoom=50)
             
             if kwargs["mapimage"] != None:
-                try:
-                    with open(f"{kwargs['mapimage']}.tfw") as f:
-                        tfw = f.read().split("\n")
-                        
-                    png = Image.open(f"{kwargs['mapimage']}.png")
-                    pixelheight = png.height
-                    pixelwidth = png.width
-                        
-                    lowerleft_utm = (float(tfw[4]),float(tfw[5])+pixelheight*float(tfw[3]))
-                    upperright_utm = (float(tfw[4])+pixelwidth*float(tfw[0]),float(tfw[5]))
-    
-                    lower_left_lat,lower_left_long = utm.to_latlon(lowerleft_utm[0], lowerleft_utm[1], 33,"T")
-                    upper_right_lat,upper_right_long = utm.to_latlon(upperright_utm[0], upperright_utm[1], 33,"T")
+                self.hk_mapimage(output,kwargs["mapimage"])
     
-                    img = folium.raster_layers.ImageOverlay("C:/Users/mrupp/OneDrive - TU Wien/Wieland, Florian's files - DATA/Field Measurements/2025-08-05 and 07_Stmk/Orthofoto_DSM/Orthofoto_DSM/Steinalpl_Duerrieglalm-Graben_Orthofoto.png", 
-                                                            [[lower_left_lat,lower_left_long],[upper_right_lat,upper_right_long]])
-                    img.add_to(output)
-                except Exception:
-                    print("Problem with mapimage. Make sure that you give a valid path for .tfw and .png without the file ending.")
-    
-            for _y,_long,_lat in zip(y,long,lat):
-                folium.Circle(location=[_lat,_long],radius=0.1,fill=True,color=cmap(_y)).add_to(output)
+            keep = decimate(lat,long,kwargs["mindistance"],kwargs["maxpoints"])
+            pointlayer(lat[keep],long[keep],y[keep],cmap).add_to(output)
                     
             output.add_child(cmap)
             
@@ -584,66 +571,21 @@ class DroneWrapper:
             else:
                 output.save(kwargs["save_loc"])
         else:
-            res = kwargs["bettermap_resolution"]
-            map_array = np.zeros((res,res,2))
-            min_lat = min(lat)
-            max_lat = max(lat)
-            min_long = min(long)
-            max_long = max(long)
-            lats = np.array([ min_lat + (max_lat-min_lat)/res*i for i in range(res+1)],float)
-            longs = np.array([min_long + (max_long-min_long)/res*i for i in range(res+1)],float)
-            
-            #@njit(float64[:,:,:],(float64[:,:,:],float64[:],float64[:],float64[:],float64[:],float64[:]))
-            def calcmap(nb_map_array,nb_lats,nb_longs,nb_y,nb_lat,nb_long):
-                for i in range(len(nb_y)):
-                    for x in range(res):
-                        if nb_lat[i] >= nb_lats[x] and nb_lat[i] <= nb_lats[x+1]:
-                            for y in range(res):
-                                if nb_long[i] >= nb_longs[y] and nb_long[i] <= nb_longs[y+1]:
-                                    nb_map_array[x][y][0] += nb_y[i]
-                                    nb_map_array[x][y][1] += 1
-                                    
-                return nb_map_array
-             
-            map_array = calcmap(map_array,lats,longs,y,lat,long)
-            map_array_2d = np.zeros((res,res))
-            for xx in range(len(map_array)):
-                for yi in range(len(map_array)):
-                    map_array_2d[xx][yi] = map_array[xx][yi][0] / map_array[xx][yi][1] if map_array[xx][yi][1] != 0 else 0
-                    if kwargs["bettermap_minimumcounts"] > map_array[xx][yi][1]:
-                        map_array_2d[xx][yi] = 0
+            map_array_2d,counts,lats,longs = bingrid(lat,long,y,kwargs["bettermap_resolution"],kwargs["bettermap_stat"],kwargs["bettermap_minimumcounts"],kwargs["bettermap_cellsize"])
+            caption = "datapoints per cell" if kwargs["bettermap_stat"] == "count" else f"{self.details[name][yy][0]} in {self.details[name][yy][1]}"
                     
             x1_start = (max(lat) + min(lat)) / 2
             x2_start = (max(long) + min(long)) / 2
             
-            cmap = cm.LinearColormap(colors=kwargs["colors"],vmin=min(y),vmax=max(y),caption=f"{self.details[name][yy][0]} in {self.details[name][yy][1]}")
+            #if bettermap_minimumcounts masks every cell, an empty grid is drawn with the range of y
+            limits = map_array_2d if np.isfinite(map_array_2d).any() else y
+            cmap = cm.LinearColormap(colors=kwargs["colors"],vmin=np.nanmin(limits),vmax=np.nanmax(limits),caption=caption)
             output = folium.Map(location=(x1_start,x2_start),control_scale=True,zoom_start=kwargs["zoomstart"],max_zoom=50)
             
             if kwargs["mapimage"] != None:
-                try:
-                    with open(f"{kwargs['mapimage']}.tfw") as f:
-                        tfw = f.read().split("\n")
-                        
-                    png = Image.open(f"{kwargs['mapimage']}.png")
-                    pixelheight = png.height
-                    pixelwidth = png.width
-                        
-                    lowerleft_utm = (float(tfw[4]),float(tfw[5])+pixelheight*float(tfw[3]))
-                    upperright_utm = (float(tfw[4])+pixelwidth*float(tfw[0]),float(tfw[5]))
+                self.hk_mapimage(output,kwargs["mapimage"])
     
-                    lower_left_lat,lower_left_long = utm.to_latlon(lowerleft_utm[0], lowerleft_utm[1], 33,"T")
-                    upper_right_lat,upper_right_long = utm.to_latlon(upperright_utm[0], upperright_utm[1], 33,"T")
-    
-                    img = folium.raster_layers.ImageOverlay("C:/Users/mrupp/OneDrive - TU Wien/Wieland, Florian's files - DATA/Field Measurements/2025-08-05 and 07_Stmk/Orthofoto_DSM/Orthofoto_DSM/Steinalpl_Duerrieglalm-Graben_Orthofoto.png", 
-                                                            [[lower_left_lat,lower_left_long],[upper_right_lat,upper_right_long]])
-                    img.add_to(output)
-                except Exception:
-                    print("Problem with mapimage. Make sure that you give a valid path for .tfw and .png without the file ending.")
-    
-            for x in range(res):
-                for y in range(res):
-                    if map_array_2d[x][y] != 0:
-                        folium.Rectangle([(lats[x],longs[y]),(lats[x+1],longs[y+1])],fill=True,color=cmap(map_array_2d[x][y]),fill_opacity=1).add_to(output)
+            gridlayer(map_array_2d,lats,longs,cmap).add_to(output)
                     
             output.add_child(cmap)
             
@@ -687,6 +629,12 @@ class DroneWrapper:
             takes a value taht is checked in targetfunc
         targety : str, optional
             takes a legal y-string (depends on wrapped objects) and hands the corresponding data to targetfunc
+        join : str, optional
+            decides how the timestamps of different objects are matched ("inner": nearest timestamp, "asof": last timestamp that is not later). The default is "inner".
+        tolerance : float or None, optional
+            maximum time difference in seconds for two timestamps to be matched (None for no limit). The default is 0.
+        decimate : bool or str, optional
+            if True or "minmax", only the first, min, max and last value of every pixel column of ax are drawn ("lttb": one value per pixel column, see decimation.fitpixels), which speeds up plots of long series. The default is False.
         
 
         Returns
@@ -707,7 +655,10 @@ class DroneWrapper:
                     "targetfunc" : None,
                     "target1" : None,
                     "target2" : None,
-                    "targety" : None}
+                    "targety" : None,
+                    "join" : "inner",
+                    "tolerance" : 0,
+                    "decimate" : False}
         
         for key,def_val in zip(defaults.keys(),defaults.values()):
             kwargs[key] = self.hk_func_kwargs(kwargs,key,def_val)
@@ -726,33 +677,12 @@ class DroneWrapper:
                 kwargs["targetfunc"] = default
                 
             ty1,ty2 = kwargs["targety"].split("_")
-                
-            xt = [i.time() for i in x]
-            yt = [self.data[ty1]["t"][i].time() for i in range(len(self.data[ty1]["t"]))]
-            
-            if xt[0] in yt:
-                x_start = 0
-                y_start = yt.index(xt[0])
-                if len(yt) >= y_start + len(xt):
-                    x_end = len(xt)
-                    y_end = y_start + len(xt)
-                else:
-                    y_end = len(yt)
-                    x_end = x_start + (y_end - y_start)
-            else:
-                y_start = 0
-                x_start = xt.index(yt[0])
-                if len(xt) >= x_start + len(yt):
-                    y_end = len(yt)
-                    x_end = x_start + len(yt)
-                else:
-                    x_end = len(xt)
-                    y_end = y_start + (x_end - x_start)
+            ix,iy = self.hk_align(name,ty1,kwargs["join"],kwargs["tolerance"])
                     
-            x = x[x_start:x_end]
-            y = y[x_start:x_end]
+            x = x[ix]
+            y = y[ix]
             
-            ty = self.data[ty1][ty2][y_start:y_end]
+            ty = self.data[ty1][ty2][iy]
                 
             m = kwargs["targetfunc"](kwargs["target1"],kwargs["target2"],ty)
             y = y[m]
@@ -767,7 +697,7 @@ class DroneWrapper:
             kwargs["ylabel"] = f"{self.details[name][yy][0]} in {self.details[name][yy][1]}"
         
         #draw plot
-        ax.plot(x,y,label=kwargs["plotlabel"],color=kwargs["color"])
+        ax.plot(*fitpixels(ax,x,y,kwargs["decimate"]),label=kwargs["plotlabel"],color=kwargs["color"])
         ax.set_ylabel(kwargs["ylabel"])
         ax.set_xlabel("CET")
         ax.xaxis.set_major_formatter(md.DateFormatter('%H:%M'))
@@ -818,6 +748,12 @@ class DroneWrapper:
             takes a value taht is checked in targetfunc
         targety : str, optional
             takes a legal y-string (depends on wrapped objects) and hands the corresponding data to targetfunc
+        join : str, optional
+            decides how the timestamps of different objects are matched ("inner": nearest timestamp, "asof": last timestamp that is not later). The default is "inner".
+        tolerance : float or None, optional
+            maximum time difference in seconds for two timestamps to be matched (None for no limit). The default is 0.
+        decimate : bool or str, optional
+            only usefull if scatter=False and x is a time (name_t). If True or "minmax", only the first, min, max and last value of every pixel column of ax are drawn ("lttb": one value per pixel column, see decimation.fitpixels). The default is False.
 
         Returns
         -------
@@ -837,7 +773,10 @@ class DroneWrapper:
                     "targetfunc" : None,
                     "target1" : None,
                     "target2" : None,
-                    "targety" : None}
+                    "targety" : None,
+                    "join" : "inner",
+                    "tolerance" : 0,
+                    "decimate" : False}
         
         for key,def_val in zip(defaults.keys(),defaults.values()):
             kwargs[key] = self.hk_func_kwargs(kwargs,key,def_val)
@@ -845,30 +784,10 @@ class DroneWrapper:
         
         xname,xx = x.split("_")
         yname,yy = y.split("_")
-        xt = [self.data[xname]["t"][i].time() for i in range(len(self.data[xname]["t"]))]
-        yt = [self.data[yname]["t"][i].time() for i in range(len(self.data[yname]["t"]))]
-        
-        if xt[0] in yt:
-            x_start = 0
-            y_start = yt.index(xt[0])
-            if len(yt) >= y_start + len(xt):
-                x_end = len(xt)
-                y_end = y_start + len(xt)
-            else:
-                y_end = len(yt)
-                x_end = x_start + (y_end - y_start)
-        else:
-            y_start = 0
-            x_start = xt.index(yt[0])
-            if len(xt) >= x_start + len(yt):
-                y_end = len(yt)
-                x_end = x_start + len(yt)
-            else:
-                x_end = len(xt)
-                y_end = y_start + (x_end - x_start)
+        ix,iy = self.hk_align(xname,yname,kwargs["join"],kwargs["tolerance"])
                 
-        x = self.data[xname][xx][x_start:x_end]
-        y = self.data[yname][yy][y_start:y_end]
+        x = self.data[xname][xx][ix]
+        y = self.data[yname][yy][iy]
         
         if kwargs["target1"] != None and kwargs["target2"] != None and kwargs["targety"] != None:
             if kwargs["targetfunc"] == None:
@@ -879,33 +798,18 @@ class DroneWrapper:
                 kwargs["targetfunc"] = default
                 
             ty1,ty2 = kwargs["targety"].split("_")
-                
-            xt = xt[x_start:x_end]
-            yt = [self.data[ty1]["t"][i].time() for i in range(len(self.data[ty1]["t"]))]
             
-            if xt[0] in yt:
-                x_start = 0
-                y_start = yt.index(xt[0])
-                if len(yt) >= y_start + len(xt):
-                    x_end = len(xt)
-                    y_end = y_start + len(xt)
-                else:
-                    y_end = len(yt)
-                    x_end = x_start + (y_end - y_start)
-            else:
-                y_start = 0
-                x_start = xt.index(yt[0])
-                if len(xt) >= x_start + len(yt):
-                    y_end = len(yt)
-                    x_end = x_start + len(yt)
-                else:
-                    x_end = len(xt)
-                    y_end = y_start + (x_end - x_start)
+            #compose the cached alignments xname->yname and xname->ty1
+            jx,jt = self.hk_align(xname,ty1,kwargs["join"],kwargs["tolerance"])
+            target_i = np.full(len(self.data[xname]["t"]),-1)
+            target_i[jx] = jt
+            target_i = target_i[ix]
+            found = target_i >= 0
                     
-            x = x[x_start:x_end]
-            y = y[x_start:x_end]
+            x = x[found]
+            y = y[found]
             
-            ty = self.data[ty1][ty2][y_start:y_end]
+            ty = self.data[ty1][ty2][target_i[found]]
                 
             m = kwargs["targetfunc"](kwargs["target1"],kwargs["target2"],ty)
             y = y[m]
@@ -937,7 +841,7 @@ class DroneWrapper:
         if kwargs["scatter"]:
             ax.scatter(x,y,label=kwargs["plotlabel"],color=kwargs["color"])
         else:
-            ax.plot(x,y,label=kwargs["plotlabel"],color=kwargs["color"])
+            ax.plot(*fitpixels(ax,x,y,kwargs["decimate"]),label=kwargs["plotlabel"],color=kwargs["color"])
         ax.set_ylabel(kwargs["ylabel"])
         ax.set_xlabel(kwargs["xlabel"])
         ax.tick_params(axis='y', colors=kwargs["color"])
@@ -953,7 +857,7 @@ class DroneWrapper:
             
     def save(self, filename):
         """
-        saves object as .flight file
+        saves object as .flight file (columnar cache folder, see cachefile.py)
 
         Parameters
         ----------
@@ -966,11 +870,11 @@ class DroneWrapper:
 
         """
         
-        op = (self.data,self.details)
+        op = {"data" : self.data,
+              "details" : self.details}
         if filename[-7:] != ".flight":
             filename += ".flight"
-        with open(filename,"wb") as openfile:    
-            pickle.dump(op,openfile,4)
+        savecache(filename,op)
         
         
     def returnattime(self, y, timestamp):
@@ -1004,6 +908,45 @@ class DroneWrapper:
         
             
     #housekeeping funcs
+    def hk_mapimage(self,output,mapimage):
+        """Adds mapimage.png to the map (its position is read from mapimage.tfw, UTM zone 33T)"""
+        
+        try:
+            with open(f"{mapimage}.tfw") as f:
+                tfw = f.read().split("\n")
+                
+            png = Image.open(f"{mapimage}.png")
+            pixelheight = png.height
+            pixelwidth = png.width
+                
+            lowerleft_utm = (float(tfw[4]),float(tfw[5])+pixelheight*float(tfw[3]))
+            upperright_utm = (float(tfw[4])+pixelwidth*float(tfw[0]),float(tfw[5]))
+
+            lower_left_lat,lower_left_long = utm.to_latlon(lowerleft_utm[0], lowerleft_utm[1], 33,"T")
+            upper_right_lat,upper_right_long = utm.to_latlon(upperright_utm[0], upperright_utm[1], 33,"T")
+
+            img = folium.raster_layers.ImageOverlay(f"{mapimage}.png",[[lower_left_lat,lower_left_long],[upper_right_lat,upper_right_long]])
+            img.add_to(output)
+        except Exception:
+            print("Problem with mapimage. Make sure that you give a valid path for .tfw and .png without the file ending.")
+    
+    def hk_column(self,header,col):
+        """Returns the index of a csv column given by its index or header"""
+        
+        if isinstance(col,str):
+            if col not in header:
+                raise IllegalValue("column","DroneWrapper",header)
+            return header.index(col)
+        return col
+    
+    def hk_align(self,name1,name2,join="inner",tolerance=0):
+        """Returns (and caches) the indices of matching timestamps of two wrapped objs"""
+        
+        key = (name1,name2,join,tolerance)
+        if key not in self.aligncache:
+            self.aligncache[key] = align(self.data[name1]["t"],self.data[name2]["t"],join,tolerance)
+        return self.aligncache[key]
+    
     def hk_kwargs(self,kwargs,key,default):
         """Turns kwargs into attributes"""
 
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+Shared columnar file readers, which parse instrument files directly into np.arrays
+"""
+
+import numpy as np
+
+from .ErrorHandler import IllegalFileFormat
+from .timetools import parsetime,parsedatetime,unwrapdays
+
+
+def readlines(file,prefix=None,encoding=None):
+    """
+    Reads a text file into a list of lines
+
+    Parameters
+    ----------
+    file : str
+        Path to the file.
+    prefix : str, optional
+        If a prefix is given, only lines starting with it are kept (used to skip headers). The default is None.
+    encoding : str, optional
+        Encoding of the file. The default is None.
+
+    Returns
+    -------
+    lines : list of str
+        Contains the lines without linebreaks.
+
+    """
+
+    with open(file,encoding=encoding) as f:
+        lines = f.read().splitlines()
+    if prefix is not None:
+        lines = [line for line in lines if line.startswith(prefix)]
+    return lines
+
+
+def readcolumns(lines,columns,dtype=float,delimiter=","):
+    """
+    Parses only the given columns of delimited lines into a 2D np.array
+
+    Parameters
+    ----------
+    lines : list of str
+        Lines of a csv-file (all of them need to have the same number of fields).
+    columns : list of int
+        Indices of the columns that should be parsed (negative indices count from the end, duplicates are allowed).
+    dtype : type, optional
+        dtype of the returned array. The default is float.
+    delimiter : str, optional
+        Delimiter of the csv-file. The default is ",".
+
+    Returns
+    -------
+    np.array with shape (len(columns),len(lines))
+        Contains one row per requested column.
+
+    """
+
+    columns = list(columns)
+    if len(lines) == 0:
+        return np.empty((len(columns),0),dtype=dtype)
+    unique = list(dict.fromkeys(columns))
+    data = np.loadtxt(lines,delimiter=delimiter,usecols=unique,dtype=dtype,ndmin=2,comments=None).T
+    if unique == columns:
+        return data
+    return data[[unique.index(col) for col in columns]]
+
+
+def readfspec(file,columns,timecol=1,nfields=19,skipfirst=1,skiplast=0,fill=1000,dtype=np.int32,encoding_artifacts=True,countrejected=False):
+    """
+    Reads an FSpec-produced csv-file into a timestamp array and an int array of the channel columns
+
+    Parameters
+    ----------
+    file : str
+        Path to the FSpec-produced csv-file.
+    columns : list of int
+        Indices of the channel columns.
+    timecol : int, optional
+        Index of the column containing the timestamps ('hh:mm:ss.ffffff'). The default is 1.
+    nfields : int, optional
+        Number of fields of a complete row, all other rows are rejected. The default is 19.
+    skipfirst : int, optional
+        Number of lines which are skipped at the start of the file (header). The default is 1.
+    skiplast : int, optional
+        Number of lines which are skipped at the end of the file (may not have been written completely). The default is 0.
+    fill : int, optional
+        Value for channel cells which are not an int. The default is 1000 (the channels offset).
+    dtype : type, optional
+        dtype of the channel array. The default is np.int32.
+    encoding_artifacts : bool, optional
+        If True, all NUL-bytes are removed before parsing. The default is True.
+    countrejected : bool, optional
+        If True, the number of rejected (malformed) rows is returned as a third value. The default is False.
+
+    Returns
+    -------
+    t : np.array of np.datetime64[us]
+        Contains the timestamp of every accepted row (times of day on 01.01.1900, rows after midnight on the following days).
+    channels : np.array with shape (len(columns),len(t))
+        Contains one row per requested column.
+    rejected : int
+        Number of rejected rows (only returned if countrejected is True).
+
+    """
+
+    columns = list(columns)
+    with open(file,"rb") as f:
+        raw = f.read()
+    if encoding_artifacts:
+        raw = raw.replace(b"\x00",b"")
+    lines = raw.splitlines()
+    lines = lines[skipfirst:len(lines)-skiplast]
+
+    #reject malformed rows by their number of fields
+    total = len(lines)
+    lines = [line for line in lines if line.count(b";") == nfields-1]
+    rejected = (total - len(lines),) if countrejected else ()
+    if len(lines) == 0:
+        return (np.array([],dtype="datetime64[us]"),np.empty((len(columns),0),dtype=dtype)) + rejected
+
+    #every column is a strided slice of the flat list of fields
+    fields = b";".join(lines).split(b";")
+    t = unwrapdays(parsetime(np.array(fields[timecol::nfields]),fmt="%H:%M:%S.%f"))
+    channels = np.array([fields[col::nfields] for col in columns])
+    try:
+        channels = channels.astype(dtype)
+    except ValueError:
+        channels = hk_toint(channels,fill,dtype)
+    return (t,channels) + rejected
+
+
+def readdat(file,skiprows=14,delimiter="\t",decimal=",",headeronly=False,encoding=None):
+    """
+    Reads a tab separated .dat-file with decimal commas and 'dd.mm.yyyy hh:mm:ss' timestamps in the first column (eg. OPC files)
+
+    Parameters
+    ----------
+    file : str
+        Path to the file.
+    skiprows : int, optional
+        Number of lines before the header line. The default is 14.
+    delimiter : str, optional
+        Delimiter of the fields. The default is "\t".
+    decimal : str, optional
+        Decimal separator of the numbers (replaced by '.', also in the header). The default is ",".
+    headeronly : bool, optional
+        If True, only the lines up to the header are read and t and values are empty. The default is False.
+    encoding : str, optional
+        Encoding of the file. The default is None.
+
+    Returns
+    -------
+    header : list of str
+        Contains the fields of the header line.
+    t : np.array of np.datetime64[us]
+        Contains the timestamp of every row.
+    values : np.array of float with shape (len(header)-1,len(t))
+        Contains one row per column after the timestamps.
+
+    """
+
+    with open(file,encoding=encoding) as f:
+        if headeronly:
+            lines = [line for i,line in zip(range(skiprows+1),f)][skiprows:]
+        else:
+            lines = f.read().splitlines()[skiprows:]
+    if len(lines) == 0:
+        raise IllegalFileFormat(file.split(".")[-1],"dat with a header in line " + str(skiprows+1),"file")
+    header = lines[0].rstrip("\r\n").replace(decimal,".").split(delimiter)
+    n = len(header)
+    empty = (np.array([],dtype="datetime64[us]"),np.empty((n-1,0)))
+    if headeronly:
+        return (header,) + empty
+
+    #rows without the fields of the header (eg. an incomplete last line) are rejected
+    lines = [line for line in lines[1:] if line.count(delimiter) == n-1]
+    if len(lines) == 0:
+        return (header,) + empty
+
+    #the body is converted as one flat array of fields (float conversion and timestamp parsing run in numpy)
+    fields = np.array(delimiter.join(lines).replace(decimal,".").split(delimiter)).reshape(len(lines),n)
+    t = parsedatetime(fields[:,0])
+    values = fields[:,1:].T.astype(float)
+    return header,t,values
+
+
+def hk_toint(cells,fill,dtype):
+    """Converts an array of byte strings into ints, cells which are not an int are set to fill"""
+
+    cells = np.char.strip(cells)
+    valid = np.char.isdigit(np.char.lstrip(cells,b"+-"))
+    op = np.full(cells.shape,fill,dtype=dtype)
+    op[valid] = cells[valid].astype(dtype)
+    return op
+
+
+def appendcolumns(data,new,buffer=None):
+    """
+    Appends new along the last axis of data in amortized O(len(new)) by writing into a buffer with spare capacity
+
+    Parameters
+    ----------
+    data : np.array
+        Contains the stored data (1D or 2D, time along the last axis).
+    new : np.array
+        Contains the data that should be appended (same shape as data except for the last axis).
+    buffer : np.array, optional
+        Buffer returned by the last call. It is only reused if data is still the view into it, which was returned by that call. The default is None.
+
+    Returns
+    -------
+    data : np.array
+        View into buffer which contains data and new.
+    buffer : np.array
+        Has to be passed to the next call.
+
+    """
+
+    n,m = data.shape[-1],new.shape[-1]
+    if not hk_isprefix(data,buffer) or buffer.shape[-1] < n+m:
+        buffer = np.empty(data.shape[:-1] + (max(2*(n+m),64),),dtype=data.dtype)
+        buffer[...,:n] = data
+    buffer[...,n:n+m] = new
+    return buffer[...,:n+m],buffer
+
+
+class TailReader:
+    """
+    Follows a file which is appended to by a logger and returns only the lines written since the last read
+
+    Parameters
+    ----------
+    file : str
+        Path to the file.
+    encoding : str, optional
+        Encoding of the file. The default is "utf-8".
+
+    Variables
+    ---------
+    TailReader.file : str
+        Contains the file path
+    TailReader.offset : int
+        Number of bytes which have already been read
+    TailReader.partial : bytes
+        Contains the last line of the file as long as it hasnt been written completely (no linebreak yet)
+    """
+
+    def __init__(self,file,encoding="utf-8"):
+        self.file = file
+        self.encoding = encoding
+        self.offset = 0
+        self.partial = b""
+
+
+    def read(self,prefix=None):
+        """
+        Reads all complete lines which were appended since the last read (an incomplete last line is kept in TailReader.partial)
+
+        Parameters
+        ----------
+        prefix : str, optional
+            If a prefix is given, only lines starting with it are returned (used to skip headers). The default is None.
+
+        Returns
+        -------
+        list of str
+            Contains the new lines without linebreaks.
+
+        """
+
+        with open(self.file,"rb") as f:
+            f.seek(self.offset)
+            chunk = f.read()
+        self.offset += len(chunk)
+        lines = (self.partial + chunk).split(b"\n")
+        self.partial = lines.pop()
+        return self.hk_decode(lines,prefix)
+
+
+    def flush(self,prefix=None):
+        """
+        Returns the incomplete last line (as a list with one or no element) and empties TailReader.partial
+
+        Parameters
+        ----------
+        prefix : str, optional
+            If a prefix is given, the line is only returned if it starts with it. The default is None.
+
+        Returns
+        -------
+        list of str
+            Contains the incomplete line if there is one.
+
+        """
+
+        lines = [self.partial] if self.partial.strip() else []
+        self.partial = b""
+        return self.hk_decode(lines,prefix)
+
+
+    def hk_decode(self,lines,prefix):
+        """Decodes lines (without linebreaks) and keeps only those starting with prefix"""
+
+        if prefix is not None:
+            bprefix = prefix.encode(self.encoding)
+            lines = [line for line in lines if line.startswith(bprefix)]
+        return [line.rstrip(b"\r").decode(self.encoding,errors="replace") for line in lines]
+
+
+def hk_isprefix(data,buffer):
+    """Checks if data is a view on the first columns of buffer"""
+
+    return (isinstance(buffer,np.ndarray)
+            and data.base is buffer
+            and data.dtype == buffer.dtype
+            and data.shape[:-1] == buffer.shape[:-1]
+            and data.strides == buffer.strides
+            and data.ctypes.data == buffer.ctypes.data)
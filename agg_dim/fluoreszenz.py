@@ -1,13 +1,18 @@
 from copy import deepcopy
 import csv
 import datetime as dt
-import pickle
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.dates as md
-from matplotlib.colors import LogNorm
-from numba import njit, prange, float64
 from .ErrorHandler import IllegalArgument, IllegalFileFormat
+from .cachefile import loadcache, savecache, release
+from .decimation import fitpixels
+from .filereaders import readfspec
+from .lazyloading import LazyModule, lazyjit
+from .profiling import Profiler
+from .timetools import regrid, crop
+
+plt = LazyModule("matplotlib.pyplot")
+md = LazyModule("matplotlib.dates")
+mcolors = LazyModule("matplotlib.colors")
 
 
 class FData:    
@@ -40,60 +45,16 @@ class FData:
 
         """
         
-        #reads data from csv to list
+        #reads the timestamps and channels from csv to np.arrays (malformed rows are rejected)
         self.title = title
         self.file = file
-        with open(file,encoding="ansi") as openfile:
-            data = csv.reader(openfile,delimiter=";")
-        data = list(data)
-        
-        #get rid of encoding-artifacts
-        if encoding_artifacts:
-            for i in range(len(data)):
-                for j in range(len(data[i])):
-                    data[i][j] = data[i][j].replace('\x00','')
-                    #if j == 2 and i > 0:
-                        #data[i][j] = data[i][j][126:130]
-        
-        #extract x and y values from list
-        faulty_lines = []
-        for i in range(len(data)):
-            if len(data[i]) != 19:
-                faulty_lines.append(i)
-        newdata = []
-        for i in range(len(data)):
-            if i not in faulty_lines:
-                newdata.append(data[i])
-        data = newdata
-        del newdata
-        del faulty_lines
-        self.t = [dt.datetime.strptime(data[i][1],"%H:%M:%S.%f") for i in range(1+skiprows,len(data))]
-        self.channels = [[data[i][j] for i in range(1+skiprows,len(data))] for j in range(layout[0],layout[1]+1)]
-        for i in range(len(self.channels)):
-            for j in range(len(self.channels[i])):
-                try:
-                    self.channels[i][j] = int(self.channels[i][j]) - 1000
-                except ValueError:
-                    self.channels[i][j] = 0
+        t,channels = readfspec(file,range(layout[0],layout[1]+1),skipfirst=1+skiprows,encoding_artifacts=encoding_artifacts)
+        channels = channels - 1000
         
         #crop
-        t_start = 0
-        t_end = len(self.t)
-        if start != "none":
-            tcounter = -1
-            for element in self.t:
-                tcounter += 1
-                if str(element)[11:19] == start:
-                    t_start = tcounter
-            
-        if end != "none":
-            tcounter = -1
-            for element in self.t:
-                tcounter += 1
-                if str(element)[11:19] == end:
-                    t_end = tcounter
-
-        self.crop(t_start,len(self.t)-t_end)
+        sl = crop(t,None if start == "none" else start,None if end == "none" else end)
+        self.t = t[sl].tolist()
+        self.channels = list(channels[:,sl])
         
         
     def internalbg(self,startmeasurementtime,bgcrop=0):
@@ -149,7 +110,7 @@ class FData:
         #reads data from csv to list
         with open(bgfile) as openbg:
             data = csv.reader(openbg,delimiter=";")
-        data = list(data)
+            data = list(data)
             
         #get rid of encoding-artifacts
         for i in range(len(data)):
@@ -283,7 +244,7 @@ class FData:
         
         _,ax = plt.subplots()
         
-        im = ax.pcolormesh(xx,yy,heatmap_data,cmap="RdYlBu_r",norm=LogNorm(),shading="nearest")
+        im = ax.pcolormesh(xx,yy,heatmap_data,cmap="RdYlBu_r",norm=mcolors.LogNorm(),shading="nearest")
         ax.xaxis.set_major_formatter(md.DateFormatter('%H:%M'))
         ax.set_ylabel("Channels")
         ax.set_xlabel("CET")
@@ -345,9 +306,9 @@ class FData:
         
         #draw
         if smooth:
-            im = ax.pcolormesh(xx,yy,heatmap_data,cmap=cmap,norm=LogNorm(),shading="gouraud")
+            im = ax.pcolormesh(xx,yy,heatmap_data,cmap=cmap,norm=mcolors.LogNorm(),shading="gouraud")
         else:
-            im = ax.pcolormesh(xx,yy,heatmap_data,cmap=cmap,norm=LogNorm(),shading="nearest")
+            im = ax.pcolormesh(xx,yy,heatmap_data,cmap=cmap,norm=mcolors.LogNorm(),shading="nearest")
         ax.xaxis.set_major_formatter(md.DateFormatter('%H:%M'))
         ax.set_ylabel("Channels")
         ax.set_xlabel("CET")
@@ -408,6 +369,8 @@ class NewFData:
         String in the form 'hh:mm:ss'. If bg_end is given, all data acquired after this timestamp will be ignored for the background. Only works if a .csv file is passed as bg_file.
     layout : list of int with len 2
         Decides which columns of the .csv files should be used for the channels.
+    profile : bool or str, optional
+        If True, time, peak memory and rows of every stage are recorded in NewFData.profiler ("time": without peak memory, which is measured with tracemalloc and slows down parsing). The default is False.
 
     Variables
     ---------
@@ -425,6 +388,10 @@ class NewFData:
         Contains the time for each datapoint of the processed data
     NewFData.channels : 2D np.array of float
         Contains the porcessed fluorescence index values of each channel
+    NewFData.rejectedrows : dict {str : int}
+        Contains the number of rows of the .csv file rejected by each cleaning step ("malformed": not 19 fields, "zeros": a channel reads 0, "cropped": outside of start/end)
+    NewFData.profiler : Profiler
+        Contains the report of the profiled stages (see profiling.py)
 
     """
     
@@ -454,6 +421,8 @@ class NewFData:
             String in the form 'hh:mm:ss'. If bg_end is given, all data acquired after this timestamp will be ignored for the background. Only works if a .csv file is passed as bg_file.
         layout : list of int with len 2
             Decides which columns of the .csv files should be used for the channels.
+        profile : bool or str, optional
+            If True, time, peak memory and rows of every stage are recorded in NewFData.profiler ("time": without peak memory, which is measured with tracemalloc and slows down parsing). The default is False.
 
         Returns
         -------
@@ -473,146 +442,89 @@ class NewFData:
                         "jit" : True,
                         "bg_start" : "*",
                         "bg_end" : "*",
-                        "layout" : [3,18]}
+                        "layout" : [3,18],
+                        "profile" : False}
             for key,value in zip(defaults.keys(),defaults.values()):
                 self.hk_kwargs(kwargs, key, value)
             self.hk_errorhandling(kwargs, defaults.keys(), "NewFData")
+            self.profiler = Profiler("NewFData",self.profile)
             
             #error handling
             for key in kwargs:
-                if key not in ["sigma","measurement_frequency","start","end","jit","bg_start","bg_end"]:
+                if key not in defaults:
                     raise IllegalArgument(key,"NewFData")
             
             #import background-data
-            bg_filetype = bg_file.split(".")[-1]
-            if bg_filetype == "csv":
-                with open(bg_file,"r",encoding="ansi") as f:
-                    bgdata_all = list(f)[1:-1]
-                for i in range(len(bgdata_all)):
-                    bgdata_all[i] = bgdata_all[i].split(";")
-                    if len(bgdata_all[i]) < 2:
-                        print(bgdata_all[i])
-                bgdata_time = [bgdata_all[i][1] for i in range(len(bgdata_all))]
-                bgdata = bgdata_all[1:]
-                bg_start_index = 100
-                bg_end_index = len(bgdata)
-                if self.bg_start != "*" or self.bg_end != "*":
-                   
-                    for i in range(len(bgdata_time)):
-                        match bgdata_time[i][:8]:
-                            case self.bg_start:
-                                bg_start_index = i
-                            case self.bg_end:
-                                bg_end_index = i
-                            case _:
-                                pass
-                bgdata = bgdata[bg_start_index:bg_end_index]
-                for i in range(len(bgdata)):
-                    if len(bgdata[i]) != 19:
-                        if len(bgdata[i]) < 19:
-                            for j in range(19-len(bgdata[i])):
-                                bgdata[i].append(0)
-                        elif len(bgdata[i]) > 19:
-                            j = len(bgdata[i]) - 19
-                            bgdata[i] = bgdata[i][:-j]
-                bgdata = np.array(bgdata).transpose()
-                bgdata = bgdata[3:].astype("int")
-                bgdata = np.where(bgdata != 1000,bgdata,np.nan)
-                self.bg = np.array([np.nanmean(channel)+np.nanstd(channel)*self.sigma for channel in bgdata])
-                self.bg = self.bg - 1000
-            elif bg_filetype == "fspec":
-                with open(bg_file,"rb") as openbg:
-                    bg_ip = pickle.load(openbg)
-                self.bg = np.array([mean+std*self.sigma for mean,std in zip(bg_ip["bg_means"],bg_ip["bg_stds"])])
-            else:
-                raise IllegalFileFormat(bg_filetype, "csv or .fspec", "bg_file")
+            with self.profiler.stage("background") as stage:
+                bg_filetype = bg_file.split(".")[-1]
+                if bg_filetype == "csv":
+                    bg_t,bgdata = readfspec(bg_file,range(3,19),skipfirst=2,skiplast=1)
+                    sl = crop(bg_t,None if self.bg_start == "*" else self.bg_start,None if self.bg_end == "*" else self.bg_end)
+                    bg_start_index = 100 if self.bg_start == "*" else sl.start
+                    bgdata = bgdata[:,bg_start_index:sl.stop]
+                    bgdata = np.where(bgdata != 1000,bgdata,np.nan)
+                    self.bg = np.array([np.nanmean(channel)+np.nanstd(channel)*self.sigma for channel in bgdata])
+                    self.bg = self.bg - 1000
+                    stage["rows"] = bgdata.shape[1]
+                elif bg_filetype == "fspec":
+                    bg_ip = loadcache(bg_file)
+                    self.bg = np.array([mean+std*self.sigma for mean,std in zip(bg_ip["bg_means"],bg_ip["bg_stds"])])
+                else:
+                    raise IllegalFileFormat(bg_filetype, "csv or .fspec", "bg_file")
             
-            #import raw data
-            with open(file,"r",encoding="ansi") as f:
-                data = list(f)[1:-1]
-            for i in range(len(data)):
-                data[i] = data[i].split(";")
-                if len(data[i]) != 19:
-                    if len(data[i]) < 19:
-                        for j in range(19-len(data[i])):
-                            data[i].append(0)
-                    elif len(data[i]) > 19:
-                        j = len(data[i]) - 19
-                        data[i] = data[i][:-j]
-            #data = np.array(data).transpose()
-            data = [list(row) for row in zip(*data)] #transpose without np
-            self.rawtime = np.array([dt.datetime.strptime(time,"%H:%M:%S.%f").replace(microsecond=0) for time in data[1]])
-            self.rawchannels = data[self.layout[0]:self.layout[1]]
-            for i in range(len(self.rawchannels)):
-                for j in range(len(self.rawchannels[i])):
-                    try:
-                        self.rawchannels[i][j] = int(self.rawchannels[i][j])
-                    except ValueError:
-                        self.rawchannels[i][j] = 1000
-            self.rawchannels = np.array(self.rawchannels,int)
-            self.rawchannels = self.rawchannels - 1000
-            self.rawchannels = self.rawchannels.T
-            rows,_ = np.where(self.rawchannels == 0)
-            m = [i for i in range(len(self.rawchannels)) if i not in rows]
-            self.rawchannels = self.rawchannels[m].T
-            self.rawtime = self.rawtime[m]
+            #import raw data (malformed rows are rejected by the reader)
+            with self.profiler.stage("parse") as stage:
+                rawtime,rawchannels,malformed = readfspec(file,range(self.layout[0],self.layout[1]),skiplast=1,countrejected=True)
+                rawtime = rawtime.astype("datetime64[s]").astype("datetime64[us]")
+                rawchannels = rawchannels - 1000
+                stage["rows"] = len(rawtime) + malformed
             
-            #crop
-            t_start = 0
-            t_end = len(self.rawtime)
-            if self.start != "none":
-                tcounter = -1
-                for element in self.rawtime:
-                    tcounter += 1
-                    if str(element)[11:19] == self.start:
-                        t_start = tcounter
+            with self.profiler.stage("clean") as stage:
+                #drop all samples in which any channel reads 0
+                valid = np.all(rawchannels != 0,axis=0)
+                rawtime = rawtime[valid]
+                rawchannels = rawchannels[:,valid]
                 
-            if self.end != "none":
-                tcounter = -1
-                for element in self.rawtime:
-                    tcounter += 1
-                    if str(element)[11:19] == self.end:
-                        t_end = tcounter
+                #crop
+                sl = crop(rawtime,None if self.start == "none" else self.start,None if self.end == "none" else self.end)
+                self.rawtime = rawtime[sl].astype(object)
+                self.rawchannels = rawchannels[:,sl]
+                self.rejectedrows = {"malformed" : malformed,
+                                     "zeros" : len(valid) - int(np.count_nonzero(valid)),
+                                     "cropped" : len(rawtime) - len(self.rawtime)}
+                stage["rows"] = len(valid)
             
-            self.rawtime = self.rawtime[t_start:t_end]
-            self.rawchannels = [channel[t_start:t_end] for channel in self.rawchannels]
+            #process data (map every raw sample to its second once)
+            with self.profiler.stage("seconds") as stage:
+                t,sec_idx = self.hk_secondindex(rawtime[sl])
+                self.t = t.astype(object)
+                stage["rows"] = len(sec_idx)
             
-            #process data
-            secs = []
-            for t in self.rawtime:
-                if t not in secs:
-                    secs.append(t)
-            self.t = np.array(secs)
-            
-            if self.jit:
-                numba_t = np.array([(i - dt.datetime(1970, 1, 1)).total_seconds() for i in self.t],float)
-                numba_rt = np.array([(i - dt.datetime(1970, 1, 1)).total_seconds() for i in self.rawtime],float)
-                numba_rc = np.array(self.rawchannels,float)
-                numba_bg = np.array(self.bg,float)
-                numba_ch = np.array([[float(0) for j in range(len(numba_t))] for i in range(len(numba_rc))])
-                self.channels = self.hk_process_data(numba_t,numba_rc,numba_bg,numba_rt,numba_ch)
-                if self.measurement_frequency != None:
-                    self.channels /= self.measurement_frequency
+            with self.profiler.stage("process") as stage:
+                if self.jit:
+                    numba_rc = np.array(self.rawchannels,float)
+                    numba_bg = np.array(self.bg[:len(numba_rc)],float)
+                    numba_ch = np.zeros((len(numba_rc),len(self.t)))
+                    self.channels = self.hk_process_data(sec_idx,numba_rc,numba_bg,numba_ch)
+                    if self.measurement_frequency != None:
+                        self.channels /= self.measurement_frequency
+                    else:
+                        self.channels /= np.bincount(sec_idx,minlength=len(self.t))
                 else:
-                    m_f = np.array([np.count_nonzero(~np.isnan(np.where(self.rawtime == s,self.rawchannels[0],np.nan))) for s in secs])
-                    self.channels /= m_f
-            else:
-                if self.measurement_frequency == None:
-                    self.measurement_frequency = 100
-                self.channels = np.array([[0 for j in range(len(self.t))] for i in range(len(self.rawchannels))],float)
-                for t in range(len(self.t)):
-                    for channel in range(len(self.rawchannels)):
-                        
-                        counter = 0
-                        for val in range(len(self.rawchannels[channel])):
-                            if self.rawchannels[channel][val] > self.bg[channel] and self.rawtime[val] == self.t[t]:
-                                counter += 1
-                        self.channels[channel][t] = counter / self.measurement_frequency
+                    if self.measurement_frequency == None:
+                        self.measurement_frequency = 100
+                    rc = np.array(self.rawchannels)
+                    exceeded = rc > np.array(self.bg[:len(rc)])[:,None]
+                    keys = (np.arange(len(rc))[:,None] * len(self.t) + sec_idx)[exceeded]
+                    self.channels = np.bincount(keys,minlength=len(rc)*len(self.t)).reshape(len(rc),len(self.t)) / self.measurement_frequency
+                stage["rows"] = len(sec_idx)
                     
         elif filetype == "fspec":
                 
-            with open(file,"rb") as openfile:
-                ip = pickle.load(openfile)
+            self.hk_kwargs(kwargs, "profile", False)
+            self.profiler = Profiler("NewFData",self.profile)
+            with self.profiler.stage("load cache"):
+                ip = loadcache(file)
             
             self.hk_kwargs(ip,"sigma",1)
             self.hk_kwargs(ip,"measurement_frequency", 100)
@@ -621,29 +533,15 @@ class NewFData:
             self.hk_kwargs(ip,"rawchannels", "null")
             self.hk_kwargs(ip,"t", "null")
             self.hk_kwargs(ip,"channels","null")
+            self.hk_kwargs(ip,"rejectedrows",{})
             
             self.hk_kwargs(kwargs, "start", "none")
             self.hk_kwargs(kwargs, "end", "none")
             
             #crop
-            t_start = 0
-            t_end = len(self.t)
-            if self.start != "none":
-                tcounter = -1
-                for element in self.t:
-                    tcounter += 1
-                    if str(element)[11:19] == self.start:
-                        t_start = tcounter
-                
-            if self.end != "none":
-                tcounter = -1
-                for element in self.t:
-                    tcounter += 1
-                    if str(element)[11:19] == self.end:
-                        t_end = tcounter
-            
-            self.t = self.t[t_start:t_end]
-            self.channels = np.array([channel[t_start:t_end] for channel in self.channels])
+            sl = crop(self.t,None if self.start == "none" else self.start,None if self.end == "none" else self.end)
+            self.t = self.t[sl]
+            self.channels = np.asarray(self.channels)[:,sl]
             
         else:
             raise IllegalFileFormat(filetype, "csv-file or .fspec", file)
@@ -652,7 +550,7 @@ class NewFData:
     
     def save(self,filename,**kwargs):
         """
-        Saves the obj in a preprocessed .fspec file
+        Saves the obj in a preprocessed .fspec file (columnar cache folder, see cachefile.py)
 
         Parameters
         ----------
@@ -675,47 +573,28 @@ class NewFData:
         for key,default in zip(defaults.keys(),defaults.values()):
             kwargs[key] = self.hk_func_kwargs(kwargs,key,default)
         self.hk_errorhandling(kwargs, defaults.keys(), "NewFData.save()")
+        if filename[-6:] != ".fspec":
+            filename += ".fspec"
+        
+        #arrays memory-mapped from the .fspec file, which is overwritten, are copied into memory first
+        for name in ["t","channels","rawtime","rawchannels","bg"]:
+            if hasattr(self,name):
+                setattr(self,name,release(getattr(self,name),filename))
 
         
         #crop
-        t_start = 0
-        t_end = len(self.t)
-        if kwargs["start"] != "none":
-            tcounter = -1
-            for element in self.t:
-                tcounter += 1
-                if str(element)[11:19] == kwargs["start"]:
-                    t_start = tcounter
-            
-        if kwargs["end"] != "none":
-            tcounter = -1
-            for element in self.t:
-                tcounter += 1
-                if str(element)[11:19] == kwargs["end"]:
-                    t_end = tcounter
-                    
-        raw_start = 0
-        raw_end = len(self.rawtime)
-        if kwargs["start"] != "none":
-            tcounter = -1
-            for element in self.rawtime:
-                tcounter += 1
-                if str(element)[11:19] == kwargs["start"]:
-                    raw_start = tcounter
-            
-        if kwargs["end"] != "none":
-            tcounter = -1
-            for element in self.rawtime:
-                tcounter += 1
-                if str(element)[11:19] == kwargs["end"]:
-                    raw_end = tcounter
+        start = None if kwargs["start"] == "none" else kwargs["start"]
+        end = None if kwargs["end"] == "none" else kwargs["end"]
+        sl = crop(self.t,start,end)
+        raw_sl = crop(self.rawtime,start,end)
         
-        save_t = self.t[t_start:t_end]
-        save_channels = [channel[t_start:t_end] for channel in self.channels]
+        save_t = self.t[sl]
+        save_channels = [channel[sl] for channel in self.channels]
         
         #create background params
-        bg_means = np.array([np.mean(channel) for channel in self.rawchannels[raw_start:raw_end]])
-        bg_stds = np.array([np.std(channel) for channel in self.rawchannels[raw_start:raw_end]])
+        rawchannels = np.asarray(self.rawchannels)[:,raw_sl]
+        bg_means = np.mean(rawchannels,axis=1)
+        bg_stds = np.std(rawchannels,axis=1)
         
         op = {"sigma" : self.sigma,
               "measurement_frequency" : self.measurement_frequency,
@@ -725,13 +604,11 @@ class NewFData:
               "t" : save_t,
               "channels" : save_channels,
               "bg_means" : bg_means,
-              "bg_stds" : bg_stds}
-        
-        if filename[-6:] != ".fspec":
-            filename += ".fspec"
+              "bg_stds" : bg_stds,
+              "rejectedrows" : self.rejectedrows}
         
-        with open(filename,"wb") as writefile:
-            pickle.dump(op,writefile,4)
+        with self.profiler.stage("save cache","save"):
+            savecache(filename,op)
         
         
     def quickplot(self,channelno):
@@ -781,7 +658,7 @@ class NewFData:
         
         _,ax = plt.subplots()
         
-        im = ax.pcolormesh(xx,yy,heatmap_data,cmap="RdYlBu_r",norm=LogNorm(),shading="nearest")
+        im = ax.pcolormesh(xx,yy,heatmap_data,cmap="RdYlBu_r",norm=mcolors.LogNorm(),shading="nearest")
         ax.xaxis.set_major_formatter(md.DateFormatter('%H:%M'))
         ax.set_ylabel("Channels")
         ax.set_xlabel("CET")
@@ -815,6 +692,8 @@ class NewFData:
             Determines which color the quake-lines should have. The default is "tab:purple"
         color : str, optional
             Changes the color of the plot. The default is "tab:green"
+        decimate : bool or str, optional
+            If True or "minmax", only the first, min, max and last value of every pixel column of ax are drawn ("lttb": one value per pixel column, see decimation.fitpixels), which speeds up plots of long series. The default is False.
 
         Returns
         -------
@@ -826,7 +705,8 @@ class NewFData:
         defaults = {"quakes" : [],
                     "quakeslabel" : "no label",
                     "quakecolor" : "tab:purple",
-                    "color" : "tab:green"}
+                    "color" : "tab:green",
+                    "decimate" : False}
         for key,default in zip(defaults.keys(),defaults.values()):
             kwargs[key] = self.hk_func_kwargs(kwargs,key,default)
         self.hk_errorhandling(kwargs, defaults.keys(), "NewFData.plot()")
@@ -836,7 +716,7 @@ class NewFData:
         channelno -= 1
         
         #draw plot
-        ax.plot(self.t,self.channels[channelno],label=channelname,color=kwargs["color"])
+        ax.plot(*fitpixels(ax,self.t,self.channels[channelno],kwargs["decimate"]),label=channelname,color=kwargs["color"])
         ax.set_ylabel("fluorescence index (channel " + str(channelno+1) + ")")
         ax.xaxis.set_major_formatter(md.DateFormatter('%H:%M'))
         if len(kwargs["quakes"]) != 0:
@@ -867,6 +747,8 @@ class NewFData:
             Changes the color of the plot. The default is "tab:green"
         rolling : int, optional
             If a positive int is given, the rolling average of 'rolling' values is plotted. The default is 0.
+        decimate : bool or str, optional
+            If True or "minmax", only the first, min, max and last value of every pixel column of ax are drawn ("lttb": one value per pixel column, see decimation.fitpixels), which speeds up plots of long series. The default is False.
 
         Returns
         -------
@@ -881,7 +763,8 @@ class NewFData:
                     "quakeslabel" : "no label",
                     "quakecolor" : "tab:purple",
                     "color" : "tab:green",
-                    "rolling" : 0}
+                    "rolling" : 0,
+                    "decimate" : False}
         for key,default in zip(defaults.keys(),defaults.values()):
             kwargs[key] = self.hk_func_kwargs(kwargs,key,default)
         self.hk_errorhandling(kwargs, defaults.keys(), "NewFData.meanplot()")
@@ -895,7 +778,7 @@ class NewFData:
                 
         #draw plot
         label = f"mean of channels {kwargs['min_ch']+1} - {kwargs['max_ch']}"
-        ax.plot(self.t,meanchannel,label=label,color=kwargs["color"])
+        ax.plot(*fitpixels(ax,self.t,meanchannel,kwargs["decimate"]),label=label,color=kwargs["color"])
         ax.xaxis.set_major_formatter(md.DateFormatter('%H:%M'))
         ax.set_ylabel(f"Fluorescence Index ({label})")
         if len(kwargs["quakes"]) != 0:
@@ -948,9 +831,9 @@ class NewFData:
         
         #draw
         if kwargs["smooth"]:
-            im = ax.pcolormesh(xx,yy,heatmap_data,cmap=kwargs["cmap"],norm=LogNorm(),shading="gouraud")
+            im = ax.pcolormesh(xx,yy,heatmap_data,cmap=kwargs["cmap"],norm=mcolors.LogNorm(),shading="gouraud")
         else:
-            im = ax.pcolormesh(xx,yy,heatmap_data,cmap=kwargs["cmap"],norm=LogNorm(),shading="nearest")
+            im = ax.pcolormesh(xx,yy,heatmap_data,cmap=kwargs["cmap"],norm=mcolors.LogNorm(),shading="nearest")
         ax.xaxis.set_major_formatter(md.DateFormatter('%H:%M'))
         ax.set_ylabel("Channels")
         ax.set_xlabel("CET")
@@ -964,31 +847,38 @@ class NewFData:
             plt.colorbar(im,ax=ax,label="Fluorescence Index",pad=kwargs["pad"])
             
             
-    def returndata(self):
+    def returndata(self,agg="first"):
         """
         Returns a tuple containing all data in a standardized form. Important for communication with DroneWrapper objs.
 
+        Parameters
+        ----------
+        agg : str, optional
+            Decides which value is used if a second contains more than one measurement ("first", "last" or "mean"). The default is "first".
+
         Returns
         -------
         op : dict {str : np.array}
-            This dict contains all data in the form of np.arrays indexed by their name.
+            This dict contains all data on a 1 second grid in the form of np.arrays indexed by their name.
         op_details : dict {str : [str,str]}
             This dict contains a description and a unit for all the data saved in op.
 
         """        
         op = {}
         op_details = {}
-        op_t = np.array([t.replace(microsecond=0) for t in self.t])
-        for i,ch in enumerate(self.channels):
+        with self.profiler.stage("regrid","returndata") as stage:
+            op_t,channels = regrid(self.t,self.channels,agg)
+            stage["rows"] = len(op_t)
+        for i,ch in enumerate(channels):
             name = f"ch{i+1}"
             op[name] = ch
-        op["meanchannel"] = np.mean(self.channels,axis=0)
+        op["meanchannel"] = np.mean(channels,axis=0)
         for key in op:
             if key[-1] != "l":
                 op_details[key] = [f"Channel {key[2:]}","Fluorescence Index"]
             else:
                 op_details[key] = ["Mean Channel","Fluorescence Index"]
-        op["t"] = op_t
+        op["t"] = op_t.astype(object)
         
         return op,op_details
         
@@ -1036,16 +926,26 @@ class NewFData:
                 raise IllegalArgument(key,funcname,legallist)
     
     
+    def hk_secondindex(self,rawtime):
+        """Returns the unique seconds of rawtime (ordered by first occurrence) and maps every raw sample to the index of its second"""
+        
+        secs = np.asarray(rawtime,dtype="datetime64[us]").astype("datetime64[s]")
+        _,first,inverse = np.unique(secs,return_index=True,return_inverse=True)
+        order = np.argsort(first)
+        rank = np.empty(len(first),np.int64)
+        rank[order] = np.arange(len(first))
+        return secs[first[order]].astype("datetime64[us]"),rank[inverse.ravel()]
+    
+    
     @staticmethod
-    @njit(float64[:,:](float64[:],float64[:,:],float64[:],float64[:],float64[:,:]))
-    def hk_process_data(tt,rc,bg,rt,channels):
-        """Numba compiled method to calculate fluorescence indices"""
-
-        for t in prange(len(tt)):
-            for channel in prange(len(rc)):
-                for val in prange(len(rc[channel])):
-                    if rc[channel][val] > bg[channel] and rt[val] == tt[t]:
-                        channels[channel][t] += 1
+    @lazyjit("float64[:,:](int64[:],float64[:,:],float64[:],float64[:,:])")
+    def hk_process_data(sec_idx,rc,bg,channels):
+        """Numba compiled method (compiled on first use) to count threshold exceedances per second in a single pass over the raw data"""
+
+        for val in range(rc.shape[1]):
+            sec = sec_idx[val]
+            for channel in range(rc.shape[0]):
+                if rc[channel][val] > bg[channel]:
+                    channels[channel][sec] += 1
              
         return channels
-      
\ No newline at end of file
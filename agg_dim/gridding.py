@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Shared spatial binning of georeferenced data onto regular lat/long grids (used by DroneWrapper.advancedflightmap(bettermap=True))
+"""
+
+import numpy as np
+
+from .ErrorHandler import IllegalValue
+
+stats = ["mean","median","max","min","sum","count","std"]
+
+
+def bingrid(lat,long,values,res=15,stat="mean",mincounts=0,cellsize=None):
+    """
+    Bins values by their position onto a regular grid and aggregates every cell with one grouped reduction
+
+    Parameters
+    ----------
+    lat : array-like of float
+        Latitudes of the values.
+    long : array-like of float
+        Longitudes of the values.
+    values : array-like of float
+        Values which should be aggregated (same length as lat and long).
+    res : int or tuple of int, optional
+        Number of cells in lat- and long-direction (an int is used for both) spread over the extent of the data. Ignored if a cellsize is given. The default is 15.
+    stat : str, optional
+        Statistic of every cell ("mean", "median", "max", "min", "sum", "count" or "std"). The default is "mean".
+    mincounts : int, optional
+        Cells with less values than mincounts are set to nan. The default is 0.
+    cellsize : int, float or None, optional
+        If a cellsize is given, the cells are cellsize x cellsize meters (converted to degrees at the mean latitude of the data, so the grid stays aligned with lat and long) instead of a res x res grid. The default is None.
+
+    Returns
+    -------
+    grid : np.array of float with shape (len(lat_edges)-1,len(long_edges)-1)
+        Contains the statistic of every cell (row 0 is the southernmost row, empty cells are nan).
+    counts : np.array of int with the shape of grid
+        Contains the number of values in every cell.
+    lat_edges : np.array of float
+        Contains the latitudes of the cell borders (ascending).
+    long_edges : np.array of float
+        Contains the longitudes of the cell borders (ascending).
+
+    """
+
+    if stat not in stats:
+        raise IllegalValue("stat","bingrid()",stats)
+    lat = np.asarray(lat,dtype=float)
+    long = np.asarray(long,dtype=float)
+    values = np.asarray(values,dtype=float)
+    if len(lat) == 0:
+        raise ValueError("bingrid() needs at least one value")
+
+    #cell borders
+    if cellsize is None:
+        nlat,nlong = (res,res) if np.ndim(res) == 0 else res
+        lat_edges = hk_edges(lat,nlat,None)
+        long_edges = hk_edges(long,nlong,None)
+    else:
+        phi = np.radians(np.mean(lat))
+        lat_edges = hk_edges(lat,None,cellsize / (111132.954 - 559.822*np.cos(2*phi) + 1.175*np.cos(4*phi)))
+        long_edges = hk_edges(long,None,cellsize / (111412.84*np.cos(phi) - 93.5*np.cos(3*phi)))
+    shape = (len(lat_edges)-1,len(long_edges)-1)
+
+    #flat cell index of every value (values on the outer border go into the last cell)
+    i = np.clip(((lat - lat_edges[0]) / (lat_edges[-1] - lat_edges[0]) * shape[0]).astype(np.int64),0,shape[0]-1)
+    j = np.clip(((long - long_edges[0]) / (long_edges[-1] - long_edges[0]) * shape[1]).astype(np.int64),0,shape[1]-1)
+    cell = i*shape[1] + j
+    ncells = shape[0]*shape[1]
+    counts = np.bincount(cell,minlength=ncells)
+    filled = counts > 0
+
+    grid = np.full(ncells,np.nan)
+    match stat:
+        case "count":
+            grid = counts.astype(float)
+        case "sum":
+            grid[filled] = np.bincount(cell,weights=values,minlength=ncells)[filled]
+        case "mean" | "std":
+            grid[filled] = np.bincount(cell,weights=values,minlength=ncells)[filled] / counts[filled]
+            if stat == "std":
+                grid[filled] = np.sqrt(np.bincount(cell,weights=(values - grid[cell])**2,minlength=ncells)[filled] / counts[filled])
+        case "median" | "max" | "min":
+            #sort by cell and value, every cell is a contiguous block of the sorted values
+            ordered = values[np.lexsort((values,cell))]
+            ends = np.cumsum(counts)[filled]
+            n = counts[filled]
+            starts = ends - n
+            match stat:
+                case "min":
+                    grid[filled] = ordered[starts]
+                case "max":
+                    grid[filled] = ordered[ends-1]
+                case "median":
+                    grid[filled] = (ordered[starts + (n-1)//2] + ordered[starts + n//2]) / 2
+
+    grid[counts < max(mincounts,1)] = np.nan
+    return grid.reshape(shape),counts.reshape(shape),lat_edges,long_edges
+
+
+#housekeeping funcs
+
+def hk_edges(coords,n,step):
+    """Returns n+1 equally spaced borders over the extent of coords (or borders every step degrees, starting at the minimum)"""
+
+    lo,hi = np.min(coords),np.max(coords)
+    if hi == lo:
+        #all values in one row/column
+        half = step/2 if step is not None else 5e-7
+        lo,hi = lo-half,hi+half
+    if step is not None:
+        n = max(int(np.ceil((hi - lo) / step)),1)
+        return lo + step*np.arange(n+1)
+    return np.linspace(lo,hi,n+1)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Lazy loading of heavy backends (matplotlib, folium, branca, PIL, utm, h5py, numba), so that every instrument class only pays for the dependencies it actually uses,
+and of data columns, which are only read from their files when they are accessed
+"""
+
+from collections.abc import MutableMapping
+import functools
+import importlib
+
+
+class LazyModule:
+    """
+    Placeholder for a module, which is imported on first attribute access (eg. plt = LazyModule("matplotlib.pyplot"))
+
+    Variables
+    ---------
+    LazyModule.name : str
+        Contains the full name of the module
+    LazyModule.module : module or None
+        Contains the module after it was imported
+    """
+
+    def __init__(self,name):
+        self.name = name
+        self.module = None
+
+
+    def __getattr__(self,attr):
+        if self.module is None:
+            self.module = importlib.import_module(self.name)
+        return getattr(self.module,attr)
+
+
+    def __repr__(self):
+        state = "loaded" if self.module is not None else "not loaded"
+        return f"<LazyModule '{self.name}' ({state})>"
+
+
+def lazyjit(signature):
+    """
+    Decorator, which compiles a function with numba.njit on its first call instead of at import time.
+    Compiled kernels are cached on disk, so later processes only load them.
+
+    Parameters
+    ----------
+    signature : str
+        numba signature of the function (eg. "float64[:](float64[:])").
+
+    Returns
+    -------
+    decorator : func
+        Wraps the function. The uncompiled function is still available as func.py_func.
+
+    """
+
+    def decorator(func):
+        compiled = []
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            if not compiled:
+                from numba import njit
+                compiled.append(njit(signature,cache=True)(func))
+            return compiled[0](*args)
+
+        wrapper.py_func = func
+        return wrapper
+
+    return decorator
+
+
+class LazyColumns(MutableMapping):
+    """
+    dict, whose keys can be registered with a loader, which is only called when one of its keys is accessed the first time
+    (eg. OPC.data: the columns of the M and dM files are only read if they are needed)
+
+    Variables
+    ---------
+    LazyColumns.keyorder : dict {str : None}
+        Contains all keys (loaded or not) in the order they were added (used as an ordered set)
+    LazyColumns.loaded : dict
+        Contains all values that were already loaded or set
+    LazyColumns.loaders : dict {str : func}
+        Contains the loader of every key, which has not been loaded yet
+    """
+
+    def __init__(self):
+        self.keyorder = {}
+        self.loaded = {}
+        self.loaders = {}
+
+
+    def addloader(self,keys,loader):
+        """
+        Registers a loader for keys
+
+        Parameters
+        ----------
+        keys : list of str
+            Keys the loader returns.
+        loader : func
+            Function without arguments, which returns a dict containing all keys.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        for key in keys:
+            self.keyorder[key] = None
+            self.loaded.pop(key,None)
+            self.loaders[key] = loader
+
+
+    def __getitem__(self,key):
+        if key in self.loaders:
+            loader = self.loaders[key]
+            values = loader()
+            for other in [other for other,func in self.loaders.items() if func is loader]:
+                del self.loaders[other]
+                self.loaded[other] = values[other]
+        return self.loaded[key]
+
+
+    def __setitem__(self,key,value):
+        self.keyorder[key] = None
+        self.loaders.pop(key,None)
+        self.loaded[key] = value
+
+
+    def __delitem__(self,key):
+        del self.keyorder[key]
+        self.loaders.pop(key,None)
+        self.loaded.pop(key,None)
+
+
+    def __contains__(self,key):
+        #without calling a loader (Mapping.__contains__ would call __getitem__)
+        return key in self.keyorder
+
+
+    def __iter__(self):
+        return iter(self.keyorder)
+
+
+    def __len__(self):
+        return len(self.keyorder)
+
+
+    def __repr__(self):
+        return f"LazyColumns(loaded: {list(self.loaded)}, not loaded: {list(self.loaders)})"
@@ -6,11 +6,15 @@ Created on Wed Feb 26 15:52:29 2025
 """
 import csv
 import datetime as dt
-import math
 import numpy as np
-import matplotlib.dates as md
-import matplotlib.pyplot as plt
-from .ErrorHandler import IllegalArgument
+from .ErrorHandler import IllegalArgument,NotRefreshable
+from .decimation import fitpixels
+from .filereaders import readcolumns,appendcolumns,TailReader
+from .lazyloading import LazyModule
+from .timetools import parsetime,unwrapdays,regrid,crop,cropborders,resample
+
+md = LazyModule("matplotlib.dates")
+plt = LazyModule("matplotlib.pyplot")
 
 
 class CCS811:
@@ -52,10 +56,10 @@ class CCS811:
         #read data from csv to list
         with open(file) as f:
             data = csv.reader(f,delimiter=",")
-        data = list(data)
+            data = list(data)
         
         #extract x and y values from list
-        self.t = [dt.datetime.strptime(data[i][1],"%H:%M:%S") for i in range(1,len(data))]
+        self.t = unwrapdays([dt.datetime.strptime(data[i][1],"%H:%M:%S") for i in range(1,len(data))]).astype(object).tolist()
         
         self.finder = {"tvoc" : 0,
                        "co2": 1}
@@ -64,25 +68,10 @@ class CCS811:
                   [[float(data[i][3]) for i in range(1,len(data))],r"$CO_2$","ppm"]]
         
         #crop
-        if start != "none":
-            indices = []
-            for i in range(len(self.t)):
-                if dt.datetime.strptime(start,"%H:%M:%S") <= self.t[i]:
-                    indices.append(i)
-            start_i = indices[0]
-        else: start_i = 0
-        
-        if end != "none":
-            indices = []
-            for i in range(len(self.t)):
-                if dt.datetime.strptime(end,"%H:%M:%S") <= self.t[i]:
-                    indices.append(i)
-            end_i = indices[0]
-        else: end_i = len(self.t)-1
-        
-        self.t = [self.t[i] for i in range(start_i,end_i)]
+        sl = crop(self.t,None if start == "none" else start,None if end == "none" else end)
+        self.t = self.t[sl]
         for i in range(len(self.y)):
-            self.y[i][0] = [self.y[i][0][j] for j in range(start_i,end_i)]
+            self.y[i][0] = self.y[i][0][sl]
             
         #express data as relative from mean
         if deviate:
@@ -178,9 +167,18 @@ class CCS811:
         return yy
     
     
-    def average(self):
+    def average(self,window="1min",agg="mean",label="center"):
         """
-        Averages all data minutewise
+        Averages all data over time windows (minutewise by default)
+
+        Parameters
+        ----------
+        window : int, float or str, optional
+            Length of the windows in seconds or as a str like '10s', '1min' or '15min'. The default is '1min'.
+        agg : str, optional
+            Aggregation of every window ("mean", "median", "sum", "min", "max", "count" or "std"). The default is "mean".
+        label : str, optional
+            Decides which timestamp is used for a window ("left": start, "center": middle, "right": end of the window). The default is "center".
 
         Returns
         -------
@@ -188,34 +186,10 @@ class CCS811:
 
         """
         
-        meant,meany = [],[]
-        
-        for i in range(len(self.y)):
-            meany.append([])
-        
-        for_checker = True
-        
-        for i in range(len(self.t)):
-            
-            if for_checker:
-                now = self.t[i].minute
-                minute_vals = []
-                
-            for_checker = False
-            
-            minute_vals.append(i)
-            
-            if self.t[i].minute != now:
-                
-                meant.append(self.t[minute_vals[math.ceil(len(minute_vals)/2)]])
-                for j in range(len(self.y)):
-                    meany[j].append(np.mean([self.y[j][0][k] for k in minute_vals]))
-                    
-                for_checker = True
-                
-        self.t = meant
+        t,op = resample(self.t,[element[0] for element in self.y],window,agg,label)
+        self.t = t.tolist()
         for i in range(len(self.y)):
-            self.y[i][0] = meany[i]
+            self.y[i][0] = op[i]
             
     
     def deviatefrommean(self):
@@ -277,11 +251,11 @@ class SEN55:
         #read data from csv to list
         with open(file) as f:
             data = csv.reader(f,delimiter=",")
-        data = list(data)
+            data = list(data)
         
         
         #extract x and y values from list
-        self.t = [dt.datetime.strptime(data[i][1],"%H:%M:%S") for i in range(1,len(data)-2)]
+        self.t = unwrapdays([dt.datetime.strptime(data[i][1],"%H:%M:%S") for i in range(1,len(data)-2)]).astype(object).tolist()
         
         self.finder = {
             "pm1" : 0,
@@ -300,25 +274,10 @@ class SEN55:
         
         
         #crop
-        if start != "none":
-            indices = []
-            for i in range(len(self.t)):
-                if dt.datetime.strptime(start,"%H:%M:%S") <= self.t[i]:
-                    indices.append(i)
-            start_i = indices[0]
-        else: start_i = 0
-        
-        if end != "none":
-            indices = []
-            for i in range(len(self.t)):
-                if dt.datetime.strptime(end,"%H:%M:%S") <= self.t[i]:
-                    indices.append(i)
-            end_i = indices[0]
-        else: end_i = len(self.t)-1
-        
-        self.t = [self.t[i] for i in range(start_i,end_i)]
+        sl = crop(self.t,None if start == "none" else start,None if end == "none" else end)
+        self.t = self.t[sl]
         for i in range(len(self.y)):
-            self.y[i][0] = [self.y[i][0][j] for j in range(start_i,end_i)]
+            self.y[i][0] = self.y[i][0][sl]
             
             
         #express data as relative from mean
@@ -431,9 +390,18 @@ class SEN55:
         return yy
     
     
-    def average(self):
+    def average(self,window="1min",agg="mean",label="center"):
         """
-        Averages the data minutewise
+        Averages all data over time windows (minutewise by default)
+
+        Parameters
+        ----------
+        window : int, float or str, optional
+            Length of the windows in seconds or as a str like '10s', '1min' or '15min'. The default is '1min'.
+        agg : str, optional
+            Aggregation of every window ("mean", "median", "sum", "min", "max", "count" or "std"). The default is "mean".
+        label : str, optional
+            Decides which timestamp is used for a window ("left": start, "center": middle, "right": end of the window). The default is "center".
 
         Returns
         -------
@@ -441,36 +409,12 @@ class SEN55:
 
         """
         
-        meant,meany = [],[]
-        
-        for i in range(len(self.y)):
-            meany.append([])
-        
-        for_checker = True
-        
-        for i in range(len(self.t)):
-            
-            if for_checker:
-                now = self.t[i].minute
-                minute_vals = []
-                
-            for_checker = False
-            
-            minute_vals.append(i)
-            
-            if self.t[i].minute != now:
-                
-                meant.append(self.t[minute_vals[math.ceil(len(minute_vals)/2)]])
-                for j in range(len(self.y)):
-                    meany[j].append(np.mean([self.y[j][0][k] for k in minute_vals]))
-                    
-                for_checker = True
-                
-        self.t = meant
+        t,op = resample(self.t,[element[0] for element in self.y],window,agg,label)
+        self.t = t.tolist()
         for i in range(len(self.y)):
-            self.y[i][0] = meany[i]
+            self.y[i][0] = op[i]
             
-                
+    
     def deviatefrommean(self):
         """
         Changes all data to be expressed relative to mean.
@@ -507,6 +451,8 @@ class FlyingFlo_USB:
         takes a str and uses it as a title for quickplots. The default is "no title".
     deviate : bool, optional
         takes a bool to decide if the data should be expressed relative to mean. The default is False.
+    follow : bool, optional
+        If True, the file is followed while the logger appends to it and FlyingFlo_USB.refresh() parses only the new lines. The default is False.
 
     Variables
     ---------
@@ -520,10 +466,12 @@ class FlyingFlo_USB:
         Contains the timestamps of all datapoints.
     FlyingFlo_USB.y : {str : np.array}
         Contains all data in the form of a dict.
+    FlyingFlo_USB.tail : TailReader
+        Remembers the byte offset and the incomplete last line of the file (used by FlyingFlo_USB.refresh()).
 
     """
     
-    def __init__(self,file,start="none",end="none",title="no title",deviate=False):
+    def __init__(self,file,start="none",end="none",title="no title",deviate=False,follow=False):
         """
         inits FlyingFlo_USB object
 
@@ -539,6 +487,8 @@ class FlyingFlo_USB:
             takes a str and uses it as a title for quickplots. The default is "no title".
         deviate : bool, optional
             takes a bool to decide if the data should be expressed relative to mean. The default is False.
+        follow : bool, optional
+            If True, the file is followed while the logger appends to it and FlyingFlo_USB.refresh() parses only the new lines. The default is False.
 
         Returns
         -------
@@ -548,55 +498,45 @@ class FlyingFlo_USB:
         
         #init
         self.title = title
+        self.start = start
+        self.end = end
+        self.follow = follow
         self.deviated = False
         self.averaged = False 
-        
-        #read data from csv to list
-        with open(file) as f:
-            data = csv.reader(f,delimiter=",")
-        data = list(data)
-              
-        #extract x and y values from list
-        self.t = np.array([dt.datetime.strptime(data[i][1],"%H:%M:%S.%f") for i in range(1,len(data)-2)])
-        
-        self.y = {
-            "pm1" : [np.array([float(data[i][8]) for i in range(1,len(data)-2)]),"PM1",r'$\mu$g/$m^3$'],
-            "pm25" : [np.array([float(data[i][9]) for i in range(1,len(data)-2)]),"PM2.5","$\mu$g/$m^3$"],
-            "pm4" : [np.array([float(data[i][10]) for i in range(1,len(data)-2)]),"PM4","$\mu$g/$m^3$"],
-            "pm10" : [np.array([float(data[i][11]) for i in range(1,len(data)-2)]),"PM10","$\mu$g/$m^3$"],
-            "tempbme" : [np.array([float(data[i][4]) for i in range(1,len(data)-2)]),"temperature","°C"],
-            "humbme" : [np.array([float(data[i][6]) for i in range(1,len(data)-2)]),"humidity","%"],
-            "gas" : [np.array([float(data[i][5]) for i in range(1,len(data)-2)]),"gas resistance","$\Omega$"],
-            "co2" : [np.array([float(data[i][2]) for i in range(1,len(data)-2)]),r"$CO_2$","ppm"],
-            "tvoc" : [np.array([float(data[i][3]) for i in range(1,len(data)-2)]),"TVOC","ppb"],
-            "press" : [np.array([float(data[i][7]) for i in range(1,len(data)-2)]),"ambient pressure","hPa"],
-            "humsen" : [np.array([float(data[i][12]) for i in range(1,len(data)-2)]),"humidity","%"],
-            "tempsen" : [np.array([float(data[i][13]) for i in range(1,len(data)-2)]),"temperature","°C"],
-            "vocsen" : [np.array([float(data[i][14]) for i in range(1,len(data)-2)]),"VOC-Index","a.u"],
-            "nox" : [np.array([float(data[i][15]) for i in range(1,len(data)-2)]),r"$NO_X$-Index","a.u."]
+        self.hk_skiprows = 1
+        self.hk_commas = None
+        self.hk_borders = None
+        self.hk_last = None
+        self.hk_buffers = {}
+        
+        #columns of the csv and descriptions of all data
+        self.hk_columns = {
+            "pm1" : [8,"PM1",r'$\mu$g/$m^3$'],
+            "pm25" : [9,"PM2.5",r"$\mu$g/$m^3$"],
+            "pm4" : [10,"PM4",r"$\mu$g/$m^3$"],
+            "pm10" : [11,"PM10",r"$\mu$g/$m^3$"],
+            "tempbme" : [4,"temperature","°C"],
+            "humbme" : [6,"humidity","%"],
+            "gas" : [5,"gas resistance",r"$\Omega$"],
+            "co2" : [2,r"$CO_2$","ppm"],
+            "tvoc" : [3,"TVOC","ppb"],
+            "press" : [7,"ambient pressure","hPa"],
+            "humsen" : [12,"humidity","%"],
+            "tempsen" : [13,"temperature","°C"],
+            "vocsen" : [14,"VOC-Index","a.u"],
+            "nox" : [15,r"$NO_X$-Index","a.u."]
             }
+        
+        #read all complete lines of the csv (the last line stays in the buffer of the TailReader if it hasnt been written completely)
+        self.tail = TailReader(file)
+        lines = self.tail.read()
+        if not follow:
+            lines += self.tail.flush()
               
-        #crop
-        if start != "none":
-            indices = []
-            for i in range(len(self.t)):
-                if dt.datetime.strptime(start,"%H:%M:%S") <= self.t[i]:
-                    indices.append(i)
-            start_i = indices[0]
-        else: start_i = 0
-        
-        if end != "none":
-            indices = []
-            for i in range(len(self.t)):
-                if dt.datetime.strptime(end,"%H:%M:%S") <= self.t[i]:
-                    indices.append(i)
-            end_i = indices[0]
-        else: end_i = len(self.t)-1
-        
-        self.t = [self.t[i] for i in range(start_i,end_i)]
-        for key in self.y:
-            self.y[key][0] = [self.y[key][0][j] for j in range(start_i,end_i)]
-            
+        #extract x and y values from columns
+        t,values = self.hk_readlines(lines)
+        self.t = t.astype(object)
+        self.y = {key : [val,col[1],col[2]] for (key,col),val in zip(self.hk_columns.items(),values)}
             
         #express data as relative from mean
         if deviate:
@@ -655,6 +595,8 @@ class FlyingFlo_USB:
             changes the color of the plot. The default is "tab:brown".
         secondary : bool, optional
             determines which y-axis should be colored (False-left axis/True-right axis). The default is False.
+        decimate : bool or str, optional
+            if True or "minmax", only the first, min, max and last value of every pixel column of ax are drawn ("lttb": one value per pixel column, see decimation.fitpixels), which speeds up plots of long series. The default is False.
 
         Raises
         ------
@@ -668,7 +610,8 @@ class FlyingFlo_USB:
         """
         #kwargs
         defaults = {"color" : "tab:brown",
-                    "secondary" : False
+                    "secondary" : False,
+                    "decimate" : False
             }
         for key,default in zip(defaults.keys(),defaults.values()):
             kwargs[key] = self.hk_func_kwargs(kwargs,key,default)
@@ -681,7 +624,7 @@ class FlyingFlo_USB:
             raise ValueError(f"{y} cant be plotted! Plottable data: {', '.join(list(self.y))}") from exc
         
         #draw plot
-        ax.plot(self.t,yy[0],color=kwargs["color"])
+        ax.plot(*fitpixels(ax,self.t,yy[0],kwargs["decimate"]),color=kwargs["color"])
         if self.deviated:
             ax.set_ylabel(yy[1] + " in % deviation from mean")
         else:
@@ -695,9 +638,18 @@ class FlyingFlo_USB:
             ax.spines["right"].set_color(kwargs["color"])
             ax.spines["left"].set_alpha(0)
             
-    def average(self):
+    def average(self,**kwargs):
         """
-        averages all the data minutewise
+        averages all the data over time windows (minutewise by default)
+
+        Parameters
+        ----------
+        window : int, float or str, optional
+            Length of the windows in seconds or as a str like '10s', '1min' or '15min'. The default is '1min'.
+        agg : str, optional
+            Aggregation of every window ("mean", "median", "sum", "min", "max", "count" or "std"). The default is "mean".
+        label : str, optional
+            Decides which timestamp is used for a window ("left": start, "center": middle, "right": end of the window). The default is "left".
 
         Returns
         -------
@@ -705,32 +657,18 @@ class FlyingFlo_USB:
 
         """
         
-        minutes = np.array([timestamp.minute for timestamp in self.t])
-        hours = np.array([timestamp.hour for timestamp in self.t])
+        #import kwargs
+        defaults = {"window" : "1min",
+                    "agg" : "mean",
+                    "label" : "left"}
+        for key,def_val in zip(defaults.keys(),defaults.values()):
+            kwargs[key] = self.hk_func_kwargs(kwargs,key,def_val)
+        self.hk_errorhandling(kwargs, defaults.keys(), "FlyingFlo_USB.average()")
         
-        for key in self.y:
-            new_array = []
-            minute = None
-            for m,h in zip(minutes,hours):
-                if minute == None:
-                    minute = m
-                    checker = [mm==minute and hh==h for mm,hh in zip(minutes,hours)]
-                    appender = np.where(checker,self.y[key][0],minutes*np.NaN)
-                    appender = appender[~np.isnan(appender)]
-                    new_array.append(np.mean(appender))
-                elif minute != m:
-                    minute = None
-            self.y[key][0] = np.array(new_array.copy())
-            
-        new_array = []
-        minute = None
-        for timestamp in self.t:
-            if minute == None:
-                minute = timestamp.minute
-                new_array.append(timestamp.replace(second=0))
-            elif minute != timestamp.minute:
-                minute = None
-        self.t = np.array(new_array)
+        t,op = resample(self.t,[val[0] for val in self.y.values()],kwargs["window"],kwargs["agg"],kwargs["label"])
+        self.t = t.astype(object)
+        for key,y_op in zip(self.y,op):
+            self.y[key][0] = y_op
         self.averaged = True
             
     def deviatefrommean(self):
@@ -756,46 +694,94 @@ class FlyingFlo_USB:
                 
         self.deviated = True
         
-    def returndata(self):
+    def returndata(self,agg="first"):
         """
         Returns a dict of all data (important for use with DroneWrapper)
 
+        Parameters
+        ----------
+        agg : str, optional
+            Decides which value is used if a second contains more than one measurement ("first", "last" or "mean"). The default is "first".
+
         Returns
         -------
         op : dict(str:np.array)
-            dict containing data of all 'y's.
+            dict containing data of all 'y's on a 1 second grid.
         op_details : dict(str:str)
             Contains metadata for all 'y's.
 
         """
         
-        op_t = []
-        new_t = self.t[0].replace(microsecond=0)
-        while new_t < self.t[-1]:
-            op_t.append(new_t)
-            new_t += dt.timedelta(seconds=1)
-        op_t = np.array(op_t)
-        
-        mask = []
-        compare_t = [i.replace(microsecond=0) for i in self.t]
-        for i in op_t:
-            if i in compare_t:
-                mask.append(compare_t.index(i))
-            else:
-                mask.append(np.nan)
-        op = {"t" : op_t}
+        op_t,values = regrid(self.t,[val[0] for val in self.y.values()],agg)
+        op = {"t" : op_t.astype(object)}
         op_details = {}
-        for key,val in self.y.items():
-            y_op = np.array([val[0][i] if not np.isnan(i) else np.nan for i in mask])
+        for (key,val),y_op in zip(self.y.items(),values):
             op[key] = y_op
             op_details[key] = [val[1],val[2]]
             
         return op,op_details
         
         
+    def refresh(self):
+        """
+        Parses only the lines which were appended to the file since the init or the last refresh and appends them to the data (only in follow mode)
+
+        Raises
+        ------
+        NotRefreshable
+            The obj isnt in follow mode or its data has been averaged or expressed relative to its mean.
+
+        Returns
+        -------
+        int
+            Number of new datapoints.
+
+        """
+        
+        if not self.follow:
+            raise NotRefreshable("it wasnt initialised with follow=True","FlyingFlo_USB")
+        if self.averaged or self.deviated:
+            raise NotRefreshable("its data has been averaged or expressed relative to the mean","FlyingFlo_USB")
+        
+        t,values = self.hk_readlines(self.tail.read())
+        if len(t) == 0:
+            return 0
+        
+        #append in amortized O(new datapoints)
+        self.t,self.hk_buffers["t"] = appendcolumns(self.t,t.astype(object),self.hk_buffers.get("t"))
+        for key,val in zip(self.y,values):
+            self.y[key][0],self.hk_buffers[key] = appendcolumns(self.y[key][0],val,self.hk_buffers.get(key))
+            
+        return len(t)
+        
+        
         
     #Housekeeping funcs
     
+    def hk_readlines(self,lines):
+        """Parses csv-lines into np.arrays of the timestamps and of all data (one row per key of FlyingFlo_USB.y) and crops them"""
+        
+        #the header is skipped, rows with another number of fields than the first data row (eg. empty rows or a row cut off by a logger crash) are rejected
+        skip = min(self.hk_skiprows,len(lines))
+        lines = lines[skip:]
+        self.hk_skiprows -= skip
+        if self.hk_commas is None:
+            self.hk_commas = next((line.count(",") for line in lines if line.strip()),None)
+        lines = [line for line in lines if line.count(",") == self.hk_commas]
+        
+        #times of day after midnight are put on the following days (continuing after the last chunk in follow mode)
+        t = unwrapdays(parsetime(readcolumns(lines,[1],dtype=str)[0],fmt="%H:%M:%S.%f"),self.hk_last)
+        if len(t) != 0:
+            self.hk_last = t[-1]
+        values = readcolumns(lines,[col[0] for col in self.hk_columns.values()])
+        
+        #crop (the borders are fixed at the first timestamp of the file, so that they stay the same for every refresh)
+        if self.hk_borders is None and len(t) != 0:
+            self.hk_borders = cropborders(t,None if self.start == "none" else self.start,None if self.end == "none" else self.end,self.follow)
+        sl = crop(t,*self.hk_borders) if len(t) != 0 else slice(0,0)
+        return t[sl],values[:,sl]
+    
+    
     def hk_kwargs(self,kwargs,key,default):
         """Turns kwargs into attributes"""
         
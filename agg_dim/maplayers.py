@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Shared rendering of flight tracks and grids onto folium maps as one compact layer (instead of one folium object per datapoint or cell)
+"""
+
+import base64
+import io
+import json
+import numpy as np
+
+from .lazyloading import LazyModule
+
+element = LazyModule("branca.element")
+folium = LazyModule("folium")
+Image = LazyModule("PIL.Image")
+
+template = """
+{% macro script(this, kwargs) %}
+    (function() {
+        var renderer = L.canvas();
+        var lat = {{ this.lat }};
+        var long = {{ this.long }};
+        var color = {{ this.color }};
+        var palette = {{ this.palette }};
+        var layer = L.layerGroup();
+        for (var i = 0; i < lat.length; i++) {
+            L.circleMarker([lat[i],long[i]],{renderer : renderer, radius : {{ this.radius }}, stroke : false, fillColor : palette[color[i]], fillOpacity : 1}).addTo(layer);
+        }
+        layer.addTo({{ this._parent.get_name() }});
+    })();
+{% endmacro %}
+"""
+
+
+def colorize(values,cmap,ncolors=256):
+    """
+    Maps values onto a colormap in one vectorized pass
+
+    Parameters
+    ----------
+    values : array-like of float
+        Values which should be colored.
+    cmap : branca.colormap.LinearColormap
+        Colormap (its vmin and vmax are used as limits).
+    ncolors : int, optional
+        Number of colors the colormap is sampled at (max 256). The default is 256.
+
+    Returns
+    -------
+    palette : list of str
+        Contains the sampled colors as hex str.
+    index : np.array of np.uint8
+        Contains the index of the color of every value in palette.
+
+    """
+
+    palette = [cmap(x) for x in np.linspace(cmap.vmin,cmap.vmax,ncolors)]
+    span = cmap.vmax - cmap.vmin
+    if span == 0:
+        return palette,np.zeros(len(values),dtype=np.uint8)
+    index = np.rint((np.asarray(values,dtype=float) - cmap.vmin) / span * (ncolors-1))
+    return palette,np.clip(index,0,ncolors-1).astype(np.uint8)
+
+
+def decimate(lat,long,mindistance=None,maxpoints=None):
+    """
+    Returns the indices of the points, which are kept when a track is thinned out
+
+    Parameters
+    ----------
+    lat : array-like of float
+        Latitudes of the track.
+    long : array-like of float
+        Longitudes of the track.
+    mindistance : int, float or None, optional
+        If given, consecutive points inside the same mindistance x mindistance meter cell are dropped (only the first one is kept). The default is None.
+    maxpoints : int or None, optional
+        If given, only every n-th of the remaining points is kept, so that at most maxpoints points are left. The default is None.
+
+    Returns
+    -------
+    np.array of int
+        Contains the indices of the kept points (ascending).
+
+    """
+
+    lat = np.asarray(lat,dtype=float)
+    long = np.asarray(long,dtype=float)
+    keep = np.arange(len(lat))
+    if mindistance is not None and len(lat) > 0:
+        phi = np.radians(np.mean(lat))
+        i = np.floor(lat * (111132.954 - 559.822*np.cos(2*phi)) / mindistance)
+        j = np.floor(long * (111412.84*np.cos(phi)) / mindistance)
+        keep = keep[np.concatenate([[True],(np.diff(i) != 0) | (np.diff(j) != 0)])]
+    if maxpoints is not None and len(keep) > maxpoints:
+        keep = keep[::int(np.ceil(len(keep) / maxpoints))]
+    return keep
+
+
+def pointlayer(lat,long,values,cmap,radius=2,ncolors=256):
+    """
+    Builds one canvas-rendered layer of colored points, which can be added to a folium.Map
+
+    The coordinates and palette indices are written into the html as plain arrays (a few bytes per point) and drawn by a single loop in the browser.
+
+    Parameters
+    ----------
+    lat : array-like of float
+        Latitudes of the points.
+    long : array-like of float
+        Longitudes of the points.
+    values : array-like of float
+        Values which decide the color of every point.
+    cmap : branca.colormap.LinearColormap
+        Colormap of the values.
+    radius : int or float, optional
+        Radius of the points in pixels. The default is 2.
+    ncolors : int, optional
+        Number of colors the colormap is sampled at (max 256). The default is 256.
+
+    Returns
+    -------
+    branca.element.MacroElement
+        Layer, add it with layer.add_to(map).
+
+    """
+
+    palette,index = colorize(values,cmap,ncolors)
+    layer = element.MacroElement()
+    layer._name = "PointLayer"
+    layer._template = element.Template(template)
+    layer.lat = "[" + ",".join(np.char.mod("%.7f",np.asarray(lat,dtype=float))) + "]"
+    layer.long = "[" + ",".join(np.char.mod("%.7f",np.asarray(long,dtype=float))) + "]"
+    layer.color = "[" + ",".join(index.astype(str)) + "]"
+    layer.palette = json.dumps(palette)
+    layer.radius = radius
+    return layer
+
+
+def gridlayer(grid,lat_edges,long_edges,cmap,opacity=1,pixels=512):
+    """
+    Renders a grid (eg. from gridding.bingrid) once into an RGBA png and returns it as a single image overlay
+
+    Parameters
+    ----------
+    grid : np.array of float with shape (len(lat_edges)-1,len(long_edges)-1)
+        Values of the cells (row 0 is the southernmost row). nan cells are transparent.
+    lat_edges : np.array of float
+        Latitudes of the cell borders (ascending).
+    long_edges : np.array of float
+        Longitudes of the cell borders (ascending).
+    cmap : branca.colormap.LinearColormap
+        Colormap of the values.
+    opacity : float, optional
+        Opacity of the overlay. The default is 1.
+    pixels : int, optional
+        Cells are drawn as blocks of pixels, so that the longer side of the image has about this many pixels (keeps cell borders sharp when the browser scales the image). The default is 512.
+
+    Returns
+    -------
+    folium.raster_layers.ImageOverlay
+        Layer, add it with layer.add_to(map).
+
+    """
+
+    grid = np.asarray(grid,dtype=float)
+    filled = np.isfinite(grid)
+    palette,index = colorize(grid[filled],cmap)
+    rgba = np.zeros(grid.shape + (4,),dtype=np.uint8)
+    colors = np.frombuffer(bytes.fromhex("".join(color[1:9].ljust(8,"f") for color in palette)),dtype=np.uint8).reshape(-1,4)
+    rgba[filled] = colors[index]
+    block = max(pixels // max(grid.shape),1)
+    rgba = np.repeat(np.repeat(rgba[::-1],block,axis=0),block,axis=1) #north up
+
+    png = io.BytesIO()
+    Image.fromarray(rgba).save(png,format="PNG")
+    url = "data:image/png;base64," + base64.b64encode(png.getvalue()).decode()
+    return folium.raster_layers.ImageOverlay(url,[[lat_edges[0],long_edges[0]],[lat_edges[-1],long_edges[-1]]],opacity=opacity)
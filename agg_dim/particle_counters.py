@@ -1,14 +1,21 @@
 from copy import copy
-import csv
 import datetime as dt
+from functools import partial
 import math
-import matplotlib.pyplot as plt
-import matplotlib.dates as md
-from matplotlib.colors import LogNorm
+import os
 import numpy as np
-import pickle
 
-from .ErrorHandler import IllegalArgument,SensorNotMounted,IllegalFileFormat,IllegalValue,UnknownLayoutError
+from .ErrorHandler import IllegalArgument,SensorNotMounted,IllegalFileFormat,IllegalValue,UnknownLayoutError,NotRefreshable
+from .cachefile import loadcache,savecache
+from .decimation import fitpixels
+from .filereaders import readcolumns,readdat,appendcolumns,TailReader
+from .lazyloading import LazyModule,LazyColumns
+from .profiling import Profiler
+from .timetools import parsetime,fromseconds,unwrapdays,regrid,crop,cropborders,resample
+
+plt = LazyModule("matplotlib.pyplot")
+md = LazyModule("matplotlib.dates")
+mcolors = LazyModule("matplotlib.colors")
 
 class Pops:    
     """full documentation see https://github.com/matrup01/data_import_modules
@@ -33,15 +40,33 @@ class Pops:
         If True, all values are expressed as relative values to the mean. The default is False
     layout : dict or str
         Makes sure, the data is read correctly from the .csv-file. Legal strings are "desktopmode", "box_pallnsdorfer" and "FlyingFlo2.0". For custom dicts see documentation. The default is "FlyingFlo2.0".
+    dtype : str, optional
+        Datatype of the stored data ("float64" or "float32"). The default is "float64".
+    follow : bool, optional
+        If True, the file is followed while a logger appends to it and Pops.refresh() parses only the new lines. The default is False.
+    profile : bool or str, optional
+        If True, time, peak memory and rows of every stage are recorded in Pops.profiler ("time": without peak memory, which is measured with tracemalloc and slows down parsing). The default is False.
         
     Variables
     ---------
     Pops.filename : str
         Contains the file path
+    Pops.pops_bins : np.array
+        Contains the particle concentration of every bin (one row per bin)
+    Pops.ydata2 : np.array
+        Contains the data measured by POPS (one row per entry of plottypes2)
+    Pops.ydata : np.array or str
+        Contains the data of the peripheral sensors (one row per entry of plottypes), "NULL" if they arent mounted
     Pops.relative : bool
         True if the data is expressed relatively to another obj
     Pops.deviated : bool
         True if the data is expressed relative to the mean
+    Pops.averaged : bool
+        True if the data has been averaged over time windows (through Pops.average())
+    Pops.tail : TailReader
+        Remembers the byte offset and the incomplete last line of the file (used by Pops.refresh())
+    Pops.profiler : Profiler
+        Contains the report of the profiled stages (see profiling.py)
     Pops.d_categories : list of float
         Contains the bin borders in nanometers
     Pops.plottypes : list of lists of str
@@ -74,6 +99,12 @@ class Pops:
             If True, all values are expressed as relative values to the mean. The default is False
         layout : dict or str
             Makes sure, the data is read correctly from the .csv-file. Legal strings are "desktopmode", "box_pallnsdorfer" and "FlyingFlo2.0". For custom dicts see documentation. The default is "FlyingFlo2.0".
+        dtype : str, optional
+            Datatype of the stored data ("float64" or "float32"). The default is "float64".
+        follow : bool, optional
+            If True, the file is followed while a logger appends to it and Pops.refresh() parses only the new lines. The default is False.
+        profile : bool or str, optional
+            If True, time, peak memory and rows of every stage are recorded in Pops.profiler ("time": without peak memory, which is measured with tracemalloc and slows down parsing). The default is False.
 
         Returns
         -------
@@ -85,6 +116,7 @@ class Pops:
         self.filename = file
         self.relative = False
         self.deviated = False
+        self.averaged = False
         self.d_categories = [element * 1000 for element in [0.115,
                                                             0.125,
                                                             0.135,
@@ -131,10 +163,17 @@ class Pops:
                     "relobj" : "none",
                     "deviate" : False,
                     "wintertime" : False,
-                    "layout" : "FlyingFlo2.0"}
+                    "layout" : "FlyingFlo2.0",
+                    "dtype" : "float64",
+                    "follow" : False,
+                    "profile" : False}
         for key,value in zip(defaults.keys(),defaults.values()):
             self.hk_kwargs(kwargs, key, value)
         self.hk_errorhandling(kwargs, defaults.keys(), "Pops")
+        self.profiler = Profiler("Pops",self.profile)
+        if np.dtype(self.dtype).name not in ["float64","float32"]:
+            raise IllegalValue(self.dtype, "Pops", ["float64","float32"])
+        self.dtype = np.dtype(self.dtype).name
         
         #fix layout
         if isinstance(self.layout,str):
@@ -154,7 +193,7 @@ class Pops:
                                    "t" : 1,
                                    "flow" : 38}
                 case "FlyingFlo2.0":
-                    self.layout = {"bins" : list((36,52)),
+                    self.layout = {"bins" : list(range(36,52)),
                                    "ydata" : "NULL",
                                    "ydata2" : [8,23,14],
                                    "popstime" : 3,
@@ -164,96 +203,27 @@ class Pops:
                     raise UnknownLayoutError(self.layout, ["desktopmode","box_pallnsdorfer","FlyingFlo2.0"], "POPS")
         
         
-        #reads data from csv to list
-        with open(file) as openfile:
-            data = csv.reader(openfile,delimiter=",")
-        data = list(data)
-        newdata = []
-        for dat in data:
-            if dat[0][0] == "2": #only works for the next 975 years
-                newdata.append(dat)
-        data = newdata
-        
-        #deletes last row if it hasnt been written completely
-        if len(data[0]) > len(data[-1]):
-            data = [data[i] for i in range(len(data)-1)]
-            
-        #init wintertime-correction
-        wt_corr = dt.timedelta(0,3600) if self.wintertime else dt.timedelta(0,7200)
-        
-        #extract x and y values from list
-        self.popstime = [dt.datetime.strptime("00:00:00","%H:%M:%S")-dt.timedelta(0,self.timecorr)+wt_corr+dt.timedelta(0,float(data[i][self.layout["popstime"]])) for i in range(1,len(data))]
-        if self.layout["t"] < 0:
-            self.t = self.popstime
-        else:
-            self.t = [dt.datetime.strptime(data[i][self.layout["t"]],"%H:%M:%S") for i in range(1,len(data))]
-        self.pops_bins_raw = [[float(data[i][j]) for i in range(1,len(data))]for j in self.layout["bins"]]
-        self.pops_bins = [[self.pops_bins_raw[j][i] / float(data[i+1][self.layout["flow"]]) for i in range(len(data)-1)] for j in range(len(self.pops_bins_raw))]
-        if isinstance(self.layout["ydata"],str):
-            self.ydata = "NULL"
-        else:
-            self.ydata = [[float(data[i][j]) for i in range(1,len(data))]for j in self.layout["ydata"]]
-        self.ydata2 = [[float(data[i][j]) for i in range(1,len(data))] for j in self.layout["ydata2"]]
-        #ydata-Syntax: [temp_bm680,rf_bm680,temp_sen55,rf_sen55,press,gas,pm1,pm25,pm4,pm10,voc,nox,co2,tvoc]
-        #ydata2-Syntax: [total,popstemp,boardtemp,pops_pm25,pops_underpm25]
-        self.ydata2.append([np.sum([self.pops_bins[i][j] for i in range(8,15)]) for j in range(len(self.pops_bins[0]))])
-        self.ydata2.append([np.sum([self.pops_bins[i][j] for i in range(8)]) for j in range(len(self.pops_bins[0]))])
-        
-        #crop
-        if self.start != "none":
-            tcounter = -1
-            for element in [data[i][self.layout["t"]] for i in range(1,len(data))]:
-                tcounter += 1
-                if self.start == element:
-                    t_start = tcounter
-            popscounter = -1
-            unixstart = str(int(self.start[0:2])*3600+int(self.start[3:5])*60+int(self.start[6:8])-7200 + self.timecorr)
-            for element in [data[i][self.layout["popstime"]][0:5] for i in range(1,len(data))]:
-                popscounter += 1
-                if unixstart == element:
-                    pops_start = popscounter
-        else:
-            t_start = 0
-            pops_start = 0
-            
-        if self.end != "none":
-            tcounter = -1
-            for element in [data[i][self.layout["t"]] for i in range(1,len(data))]:
-                tcounter += 1
-                if self.end == element:
-                    t_end = tcounter
-            popscounter = -1
-            unixend = str(int(self.end[0:2])*3600+int(self.end[3:5])*60+int(self.end[6:8])-7200 + self.timecorr)
-            for element in [data[i][self.layout["popstime"]][0:5] for i in range(1,len(data))]:
-                popscounter += 1
-                if unixend == element:
-                    pops_end = popscounter
-        else:
-            t_end = len(data)-1
-            pops_end = len(data)-1
-            
-        self.t = [self.t[i] for i in range(t_start,t_end)]
-        self.popstime = [self.popstime[i] for i in range(pops_start,pops_end)]
-        for i in range(len(self.ydata2)):
-            self.ydata2[i] = [self.ydata2[i][j] for j in range(pops_start,pops_end)]
-        if not isinstance(self.ydata,str):
-            for i in range(len(self.ydata)):
-                self.ydata[i] = [self.ydata[i][j] for j in range(t_start,t_end)]
-        for i in range(len(self.pops_bins)):
-            self.pops_bins[i] = [self.pops_bins[i][j] for j in range(pops_start,pops_end)]
-            
-        #correctbg
-        if isinstance(self.bgobj,Pops):
-            self.importbg(self.bgobj.exportbg())
-            
-        #make values relative
-        if isinstance(self.relobj,Pops):
-            self.relativevals(self.relobj)
-            self.relative = True
+        #reads all complete lines of the csv (the last line stays in the buffer of the TailReader if it hasnt been written completely)
+        with self.profiler.stage("read") as stage:
+            self.tail = TailReader(file)
+            lines = self.tail.read(prefix="2") #only works for the next 975 years
+            if not self.follow:
+                lines += self.tail.flush(prefix="2")
+            stage["rows"] = len(lines)
+        self.hk_skiprows = 1
+        self.hk_commas = None
+        self.hk_borders = None
+        self.hk_last = {"t" : None, "popstime" : None}
+        self.hk_buffers = {}
+        self.hk_dndlogdp = None
+        with self.profiler.stage("parse") as stage:
+            self.hk_readlines(lines)
+            stage["rows"] = len(self.t)
             
         #make values relative to mean
         if self.deviate:
-            self.deviatefrommean()
+            with self.profiler.stage("deviate"):
+                self.deviatefrommean()
             self.deviated = True
             
             
@@ -269,9 +239,8 @@ class Pops:
 
         """
         
-        bins = np.array(self.pops_bins)
-        bg = np.array([np.mean(element) for element in bins])
-        totalbg = np.mean(np.array(self.ydata2[0]))
+        bg = np.mean(self.pops_bins,axis=1)
+        totalbg = np.mean(self.ydata2[0])
         return [bg,totalbg]
     
     
@@ -291,9 +260,9 @@ class Pops:
 
         """
         
-        for i in range(len(self.pops_bins)):
-            self.pops_bins[i] = [self.pops_bins[i][j]-bg[0][i] for j in range(len(self.pops_bins[i]))]
-        self.ydata2[0] = [self.ydata2[0][i] - bg[1] for i in range(len(self.ydata2[0]))]
+        self.pops_bins -= np.asarray(bg[0])[:,np.newaxis]
+        self.ydata2[0] -= bg[1]
+        self.hk_resetcache()
         
         
     def quickplot(self,y,**kwargs):
@@ -324,8 +293,8 @@ class Pops:
         
         #find plotdata
         plotx,ploty,label,ylabel = self.hk_findplottype(y)
-        plotx = [plotx[i] for i in range(kwargs["startcrop"],len(plotx)-kwargs["endcrop"])]
-        ploty = [ploty[i] for i in range(kwargs["startcrop"],len(ploty)-kwargs["endcrop"])]
+        plotx = plotx[kwargs["startcrop"]:len(plotx)-kwargs["endcrop"]]
+        ploty = ploty[kwargs["startcrop"]:len(ploty)-kwargs["endcrop"]]
             
         #draw plot
         _,ax = plt.subplots()
@@ -369,6 +338,8 @@ class Pops:
             This string is used as a label for the plot, if a legend is created. The default is "no label"
         usepopstime : bool, optional
             If True, popstime is used instead of Raspi-time. Should only used if layout="box_pallnsdorfer". The default is False.
+        decimate : bool or str, optional
+            If True or "minmax", only the first, min, max and last value of every pixel column of ax are drawn ("lttb": one value per pixel column, see decimation.fitpixels), which speeds up plots of long series. The default is False.
 
         Returns
         -------
@@ -387,7 +358,8 @@ class Pops:
                     "printstats" : False,
                     "secondary" : False,
                     "plotlabel" : "none",
-                    "usepopstime" : False}
+                    "usepopstime" : False,
+                    "decimate" : False}
         for key,default in zip(defaults.keys(),defaults.values()):
             kwargs[key] = self.hk_func_kwargs(kwargs,key,default)
         self.hk_errorhandling(kwargs, defaults.keys(), "Pops.plot()")
@@ -396,8 +368,8 @@ class Pops:
         plotx,ploty,label,ylabel = self.hk_findplottype(y)
         if kwargs["usepopstime"]:
             plotx = self.popstime
-        plotx = [plotx[i] for i in range(kwargs["startcrop"],len(plotx)-kwargs["endcrop"])]
-        ploty = [ploty[i] for i in range(kwargs["startcrop"],len(ploty)-kwargs["endcrop"])]
+        plotx = plotx[kwargs["startcrop"]:len(plotx)-kwargs["endcrop"]]
+        ploty = ploty[kwargs["startcrop"]:len(ploty)-kwargs["endcrop"]]
         
         #change label
         if kwargs["plotlabel"] != "none":
@@ -405,7 +377,7 @@ class Pops:
         else: legendlabel = label
         
         #draw plot
-        ax.plot(plotx,ploty,label=legendlabel,color=kwargs["color"])
+        ax.plot(*fitpixels(ax,plotx,ploty,kwargs["decimate"]),label=legendlabel,color=kwargs["color"])
         ax.set_ylabel(label + " in " + ylabel)
         ax.axes.xaxis.set_visible(kwargs["togglexticks"])
         ax.axes.yaxis.label.set_color(kwargs["color"])
@@ -439,13 +411,12 @@ class Pops:
         """
         
         #convert to heatmapdata
-        heatmapdata = [[self.pops_bins[j][i] / (math.log10(self.d_categories[j+1])-math.log10(self.d_categories[j])) for i in range(len(self.pops_bins[0])-1)] for j in range(len(self.pops_bins))]
-        heatmapdata = self.hk_replacezeros(heatmapdata)
-        xx,yy = np.meshgrid(self.popstime,self.d_categories)
+        heatmapdata = self.dndlogdpdata(masked=True)[:,:-1]
+        xx,yy = np.meshgrid(np.asarray(self.popstime,dtype="datetime64[us]"),self.d_categories)
         
         #draw plot
         _,ax = plt.subplots()
-        im = ax.pcolormesh(xx,yy,heatmapdata,cmap="RdYlBu_r",norm=LogNorm())
+        im = ax.pcolormesh(xx,yy,heatmapdata,cmap="RdYlBu_r",norm=mcolors.LogNorm())
         ax.xaxis.set_major_formatter(md.DateFormatter('%H:%M'))
         ax.set_yscale("log")
         ax.set_ylabel("Durchmesser in nm")
@@ -487,18 +458,12 @@ class Pops:
             kwargs[key] = self.hk_func_kwargs(kwargs,key,default)
         self.hk_errorhandling(kwargs, defaults.keys(), "Pops.heatmap()")
         
-        #convert to heatmapdata
-        heatmapdata = [[self.pops_bins[j][i] / (math.log10(self.d_categories[j+1])-math.log10(self.d_categories[j])) for i in range(len(self.pops_bins[0])-1)] for j in range(len(self.pops_bins))]
-        heatmapdata = self.hk_replacezeros(heatmapdata)
-        xx,yy = np.meshgrid(self.popstime,self.d_categories)
-        
-        mask = np.array([[xx[i][j] for j in range(len(xx[i])-1)] for i in range(len(xx)-1)])
-        
-        heatmapdata = np.ma.masked_array(heatmapdata,mask<min(self.popstime))
-        heatmapdata = np.ma.masked_array(heatmapdata,mask>max(self.popstime))
+        #convert to heatmapdata (zeros and negative values are nan and stay blank on the log scale)
+        heatmapdata = np.ma.masked_invalid(self.dndlogdpdata(masked=True)[:,:-1])
+        xx,yy = np.meshgrid(np.asarray(self.popstime,dtype="datetime64[us]"),self.d_categories)
         
         #draw plot
-        im = ax.pcolormesh(xx,yy,heatmapdata,cmap="RdYlBu_r",norm=LogNorm(vmin=1,vmax=10000))
+        im = ax.pcolormesh(xx,yy,heatmapdata,cmap="RdYlBu_r",norm=mcolors.LogNorm(vmin=1,vmax=10000))
         ax.set_yscale("log")
         ax.set_ylabel("optical diameter $D_p$ in $\mu$m")
         ax.set_xlabel("CET")
@@ -540,13 +505,12 @@ class Pops:
             kwargs[key] = self.hk_func_kwargs(kwargs,key,default)
         self.hk_errorhandling(kwargs, defaults.keys(), "Pops.newheatmap()")
         
-        heatmapdata = [[self.pops_bins[j][i] / (math.log10(self.d_categories[j+1])-math.log10(self.d_categories[j])) for i in range(len(self.pops_bins[0])-1)] for j in range(len(self.pops_bins))]
-        heatmapdata = self.hk_replacezeros(heatmapdata)
+        heatmapdata = self.dndlogdpdata(masked=True)[:,:-1]
         
         xlims = [self.t[0],self.t[-1]]
         xlims = md.date2num(xlims)
         
-        im = ax.imshow(heatmapdata,aspect="auto",cmap="RdYlBu_r",norm=LogNorm(vmin=1,vmax=10000),extent=[xlims[0],xlims[1],0,len(self.d_categories)-1],origin="lower",interpolation="none")
+        im = ax.imshow(heatmapdata,aspect="auto",cmap="RdYlBu_r",norm=mcolors.LogNorm(vmin=1,vmax=10000),extent=[xlims[0],xlims[1],0,len(self.d_categories)-1],origin="lower",interpolation="none")
         labels = [math.sqrt(self.d_categories[i]*self.d_categories[i+1]) for i in range(len(self.d_categories)-1)]
         labels = [str(round(labels[i]/1000,2)) for i in range(len(labels))]
         ticks = list(range(len(self.d_categories)-1))
@@ -561,6 +525,34 @@ class Pops:
         ax.set_xlabel("CET")
         ax.set_ylabel("optical diameter $D_p$ in $\mu$m")
         
+    def dndlogdpdata(self,masked=False):
+        """
+        Returns dN/dlogDp of every bin and datapoint (computed once and cached until the data is cropped, averaged, appended or changed by a background)
+
+        Parameters
+        ----------
+        masked : bool, optional
+            If True, zeros and negative values are replaced by nan (for logarithmic color scales). The default is False.
+
+        Returns
+        -------
+        np.array of float with the shape of Pops.pops_bins
+            Contains dN/dlogDp of every bin (one row per bin). Dont change it in place, it is shared with later calls.
+
+        """
+        
+        key = "masked" if masked else "raw"
+        if self.hk_dndlogdp is None or self.hk_dndlogdp["pops_bins"] is not self.pops_bins:
+            self.hk_dndlogdp = {"pops_bins" : self.pops_bins}
+        if key not in self.hk_dndlogdp:
+            if "raw" not in self.hk_dndlogdp:
+                dlogdp = np.diff(np.log10(self.d_categories))[:len(self.pops_bins)]
+                self.hk_dndlogdp["raw"] = self.pops_bins / dlogdp[:,np.newaxis]
+            if masked:
+                self.hk_dndlogdp["masked"] = self.hk_replacezeros(self.hk_dndlogdp["raw"])
+        return self.hk_dndlogdp[key]
+    
+    
     def dndlogdp(self,ax):
         """
         Draws a dndlogdp number size distribution histogram over an existing mpl axis
@@ -577,9 +569,8 @@ class Pops:
         """
         
         #calculate needed values
-        means = np.array([np.mean(self.pops_bins[i]) for i in range(len(self.pops_bins))])
-        dndlogdp = [means[i]/(math.log10(self.d_categories[i+1])-math.log10(self.d_categories[i])) for i in range(len(means))]
-        xvals = [self.d_categories[i] for i in range(len(means))]
+        dndlogdp = np.mean(self.dndlogdpdata(),axis=1)
+        xvals = [self.d_categories[i] for i in range(len(dndlogdp))]
         widths = [self.d_categories[i+1]-self.d_categories[i] for i in range(len(xvals))]
         
         #draw plot
@@ -601,9 +592,8 @@ class Pops:
         """
         
         #calculate needed values
-        means = np.array([np.mean(self.pops_bins[i]) for i in range(len(self.pops_bins))])
-        dndlogdp = [means[i]/(math.log10(self.d_categories[i+1]-math.log10(self.d_categories[i]))) for i in range(len(means))]
-        xvals = [self.d_categories[i] for i in range(len(means))]
+        dndlogdp = np.mean(self.dndlogdpdata(),axis=1)
+        xvals = [self.d_categories[i] for i in range(len(dndlogdp))]
         widths = [self.d_categories[i+1]-self.d_categories[i] for i in range(len(xvals))]
         
         print(self.title)
@@ -632,7 +622,7 @@ class Pops:
         """
         
         #calculate needed values
-        means = np.array([np.mean(self.pops_bins[i]) for i in range(len(self.pops_bins))])
+        means = np.mean(self.pops_bins,axis=1)
         cparticles = np.sum(means)
         print(self.title + ": " + str(cparticles) + " counts/cm3 (cumulative)")
         
@@ -656,16 +646,14 @@ class Pops:
         None.
 
         """
-        length = len(self.t)
-        self.t = [self.t[i] for i in range(startcrop,length-endcrop)]
-        self.popstime = [self.popstime[i] for i in range(startcrop,length-endcrop)]
-        for i in range(len(self.ydata)):
-            self.ydata[i] = [self.ydata[i][j] for j in range(startcrop,length-endcrop)]
-        for i in range(len(self.pops_bins)):
-            self.pops_bins[i] = [self.pops_bins[i][j] for j in range(startcrop,length-endcrop)]
-        for i in range(len(self.ydata2)):
-            self.ydata2[i] = [self.ydata2[i][j] for j in range(startcrop,length-endcrop)]
-        
+        sl = slice(startcrop,len(self.t)-endcrop)
+        self.t = self.t[sl]
+        self.popstime = self.popstime[sl]
+        if not isinstance(self.ydata,str):
+            self.ydata = self.ydata[:,sl].copy()
+        self.pops_bins = self.pops_bins[:,sl].copy()
+        self.ydata2 = self.ydata2[:,sl].copy()
+        self.hk_resetcache()
         
         
     def stats(self,y):
@@ -716,8 +704,27 @@ class Pops:
         var = np.var(data,ddof=1)
         
         return mean,std,var
-    
-    
+
+
+    def column(self,y):
+        """
+        Returns the data of y (a view into the stored arrays, no copy)
+
+        Parameters
+        ----------
+        y : str
+            Name of the data (eg. "total", "pm25" or "b3").
+
+        Returns
+        -------
+        np.array
+            Contains the data of y.
+
+        """
+
+        return self.hk_findplottype(y)[1]
+
+
     def append(self,obj):
         """
         Takes another Pops obj and appends its data to this one
@@ -733,20 +740,14 @@ class Pops:
 
         """
         
-        self.popstime += obj.popstime
-        self.t += obj.t
-            
-        if not isinstance(self.ydata,str) and not isinstance(obj.ydata,str):
-            for i in range(len(self.ydata)):
-                self.ydata[i] += obj.ydata[i]
-        elif isinstance(self.ydata,str) and not isinstance(obj.ydata,str):
-            self.ydata = obj.ydata
-                
-        for i in range(len(self.ydata2)):
-            self.ydata2 += obj.ydata2
-                
-        for i in range(len(self.pops_bins)):
-            self.pops_bins += obj.pops_bins
+        #missing peripheral data is filled with nan
+        if not isinstance(self.ydata,str) or not isinstance(obj.ydata,str):
+            self.ydata = np.hstack([self.hk_ydataornan(self),self.hk_ydataornan(obj)]).astype(self.dtype)
+        self.ydata2 = np.hstack([self.ydata2,obj.ydata2]).astype(self.dtype)
+        self.pops_bins = np.hstack([self.pops_bins,obj.pops_bins]).astype(self.dtype)
+        self.popstime = self.popstime + obj.popstime
+        self.t = self.t + obj.t
+        self.hk_resetcache()
                 
                 
     def add(self,obj):
@@ -765,23 +766,10 @@ class Pops:
 
         """
                     
-        newpops = Pops(file=self.filename)
-        newpops.t = copy(self.t) + obj.t
-        newpops.popstime = copy(self.popstime) + obj.popstime
-        newpops.ydata = copy(self.ydata)
-        newpops.ydata2 = copy(self.ydata2)
-            
-        if not isinstance(newpops.ydata,str) and not isinstance(obj.ydata,str):
-            for i in range(len(newpops.ydata)):
-                newpops.ydata[i] += obj.ydata[i]
-        elif isinstance(newpops.ydata,str) and not isinstance(obj.ydata,str):
-            newpops.ydata = obj.ydata
-                
-        for i in range(len(newpops.ydata2)):
-            newpops.ydata2 += obj.ydata2
-                
-        for i in range(len(newpops.pops_bins)):
-            newpops.pops_bins += obj.pops_bins
+        newpops = copy(self)
+        newpops.hk_buffers = {}
+        newpops.profiler = Profiler("Pops",self.profile)
+        newpops.append(obj)
                 
         return newpops
     
@@ -796,27 +784,14 @@ class Pops:
 
         """
         
-        for element in self.ydata:
-            
-            mean = np.mean(element)
-            
-            for i in range(len(element)):
-                element[i] = ((element[i] / mean) - 1)*100
-                
-        for element in self.ydata2:
-            
-            mean = np.mean(element)
-            
-            for i in range(len(element)):
-                element[i] = ((element[i] / mean) - 1)*100
-                
-        for element in self.pops_bins:
-            
-            mean = np.mean(element)
-            
-            for i in range(len(element)):
-                element[i] = ((element[i] / mean) - 1)*100
+        for data in [self.ydata,self.ydata2,self.pops_bins]:
+            if isinstance(data,str):
+                continue
+            data /= np.mean(data,axis=1,keepdims=True)
+            data -= 1
+            data *= 100
                 
+        self.hk_resetcache()
         self.deviated = True
     
     
@@ -835,49 +810,32 @@ class Pops:
 
         """
 
-        bgydata = [bgobj.returnstats(bgobj.plottypes[i][0])[0] for i in range(len(bgobj.plottypes))]            
-        bgydata2 = [bgobj.returnstats(bgobj.plottypes2[i][0])[0] for i in range(len(bgobj.plottypes2))]
-        bgpops_bins = [bgobj.returnstats(str(i))[0] for i in range(len(bgobj.pops_bins))]
-        
-        for j in range(len(self.ydata)):
-            newdata = []
-            if bgydata[j] > 0.0:
-                for i in range(len(self.ydata[j])):
-                    newdata.append(((self.ydata[j][i] / bgydata[j])-1)*100)
-                self.ydata[j] = copy(newdata)
-            else:
-                for i in range(len(self.ydata[j])):
-                    newdata.append((((self.ydata[j][i]) / (bgydata[j]+1))-1)*100)
-                self.ydata[j] = copy(newdata)
-            
-        for j in range(len(self.ydata2)):
-            newdata = []
-            if bgydata2[j] > 0.0:
-                for i in range(len(self.ydata2[j])):
-                    newdata.append(((self.ydata2[j][i] / bgydata2[j])-1)*100)
-                self.ydata2[j] = copy(newdata)
-            else:
-                for i in range(len(self.ydata2[j])):
-                    newdata.append((((self.ydata2[j][i]) / (bgydata2[j]+1))-1)*100)
-                self.ydata2[j] = copy(newdata)
-            
-        for j in range(len(self.pops_bins)):
-            newdata = []
-            if bgpops_bins[j] > 0.0:
-                for i in range(len(self.pops_bins[j])):
-                    newdata.append(((self.pops_bins[j][i] / bgpops_bins[j])-1)*100)
-                self.pops_bins[j] = copy(newdata)
-            else:
-                for i in range(len(self.pops_bins[j])):
-                    newdata.append((((self.pops_bins[j][i]) / (bgpops_bins[j])+1)-1)*100)
-                self.pops_bins[j] = copy(newdata)
+        pairs = [(self.ydata2,bgobj.ydata2),(self.pops_bins,bgobj.pops_bins)]
+        if not isinstance(self.ydata,str) and not isinstance(bgobj.ydata,str):
+            pairs.append((self.ydata,bgobj.ydata))
+        for data,bgdata in pairs:
+            bg = np.mean(bgdata,axis=1)
+            bg = np.where(bg > 0.0,bg,bg+1)
+            data /= bg[:,np.newaxis]
+            data -= 1
+            data *= 100
             
+        self.hk_resetcache()
         self.relative = True
     
     
-    def average(self):
+    def average(self,**kwargs):
         """
-        Averages all data minutewise
+        Averages all data over time windows (minutewise by default)
+
+        Parameters
+        ----------
+        window : int, float or str, optional
+            Length of the windows in seconds or as a str like '10s', '1min' or '15min'. The default is '1min'.
+        agg : str, optional
+            Aggregation of every window ("mean", "median", "sum", "min", "max", "count" or "std"). The default is "mean".
+        label : str, optional
+            Decides which timestamp is used for a window ("left": start, "center": middle, "right": end of the window). The default is "center".
 
         Returns
         -------
@@ -885,95 +843,181 @@ class Pops:
 
         """
         
-        meant,meanydata,meanpopst,meanydata2,meanpopsbins = [],[],[],[],[]
-        
-        if not isinstance(self.ydata,str):
-            for i in range(len(self.ydata)):
-                meanydata.append([])
-        for i in range(len(self.ydata2)):
-            meanydata2.append([])
-        for i in range(len(self.pops_bins)):
-            meanpopsbins.append([])
-            
-        for_checker = True
-            
-        for i in range(len(self.t)):
-            
-            if for_checker:
-                now = self.t[i].minute
-                minute_vals = []
-                
-            for_checker = False
-            
-            minute_vals.append(i)
-            
-            if self.t[i].minute != now:
-                
-                meant.append(self.t[minute_vals[math.ceil(len(minute_vals)/2)]])
-                meanpopst.append(self.popstime[minute_vals[math.ceil(len(minute_vals)/2)]])
-                if not isinstance(self.ydata,str):
-                    for j in range(len(self.ydata)):
-                        meanydata[j].append(np.mean([self.ydata[j][k] for k in minute_vals]))
-                for j in range(len(self.ydata2)):
-                    meanydata2[j].append(np.mean([self.ydata2[j][k] for k in minute_vals]))
-                for j in range(len(self.pops_bins)):
-                    meanpopsbins[j].append(np.mean([self.pops_bins[j][k] for k in minute_vals]))
-                    
-                for_checker = True
-                
-        self.t = meant
-        self.popstime = meanpopst
-        self.ydata = meanydata
-        self.ydata2 = meanydata2
-        self.pops_bins = meanpopsbins
-        
-        
-    def returndata(self):
+        #import kwargs
+        defaults = {"window" : "1min",
+                    "agg" : "mean",
+                    "label" : "center"}
+        for key,def_val in zip(defaults.keys(),defaults.values()):
+            kwargs[key] = self.hk_func_kwargs(kwargs,key,def_val)
+        self.hk_errorhandling(kwargs, defaults.keys(), "Pops.average()")
+        
+        mounted = not isinstance(self.ydata,str)
+        with self.profiler.stage("resample","average") as stage:
+            series = np.vstack([self.ydata2,self.pops_bins] + ([self.ydata] if mounted else []))
+            t,op = resample(self.t,series,kwargs["window"],kwargs["agg"],kwargs["label"])
+            popstime = np.asarray(self.popstime,dtype="datetime64[us]").astype(np.int64)
+            _,popstime = resample(self.t,popstime,kwargs["window"],"mean")
+            stage["rows"] = len(self.t)
+        
+        ny2,nbins = len(self.ydata2),len(self.pops_bins)
+        self.t = t.tolist()
+        self.popstime = np.round(popstime).astype(np.int64).astype("datetime64[us]").tolist()
+        op = op.astype(self.dtype)
+        self.ydata2 = op[:ny2]
+        self.pops_bins = op[ny2:ny2+nbins]
+        if mounted:
+            self.ydata = op[ny2+nbins:]
+        self.hk_resetcache()
+        self.averaged = True
+        
+        
+    def returndata(self,agg="first"):
         """
         Returns a tuple containing all data in a standardized form. Important for communication with DroneWrapper objs.
 
+        Parameters
+        ----------
+        agg : str, optional
+            Decides which value is used if a second contains more than one measurement ("first", "last" or "mean"). The default is "first".
+
         Returns
         -------
         op : dict {str : np.array}
-            This dict contains all data in the form of np.arrays indexed by their name.
+            This dict contains all data on a 1 second grid in the form of np.arrays indexed by their name.
         op_details : dict {str : [str,str]}
             This dict contains a description and a unit for all the data saved in op.
 
         """
         
-        y = {}
+        keys = []
         op_details = {}
         for i in range(len(self.plottypes2)):
-            y[self.plottypes2[i][0]] = self.ydata2[i]
+            keys.append(self.plottypes2[i][0])
             op_details[self.plottypes2[i][0]] = [self.plottypes2[i][1],self.plottypes2[i][2]]
         for i in range(16):
-            y[f"b{i}"] = self.pops_bins[i]
+            keys.append(f"b{i}")
             op_details[f"b{i}"] = [f"Bin {i}",r"Counts/$cm^3$"]
             
-        op_t = []
-        new_t = self.t[0].replace(microsecond=0)
-        while new_t < self.t[-1]:
-            op_t.append(new_t)
-            new_t += dt.timedelta(seconds=1)
-        op_t = np.array(op_t)
-        
-        mask = []
-        compare_t = [i.replace(microsecond=0) for i in self.t]
-        for i in op_t:
-            if i in compare_t:
-                mask.append(compare_t.index(i))
-            else:
-                mask.append(np.nan)
-                
-        op = {"t" : op_t}
-        for key,val in y.items():
-            y_op = np.array([val[i] if not np.isnan(i) else np.nan for i in mask])
-            op[key] = y_op
+        with self.profiler.stage("regrid","returndata") as stage:
+            op_t,values = regrid(self.t,np.vstack([self.ydata2,self.pops_bins]),agg)
+            stage["rows"] = len(op_t)
+        op = {"t" : op_t.astype(object)}
+        for key,val in zip(keys,values):
+            op[key] = val
             
         return op,op_details
         
         
+    def refresh(self):
+        """
+        Parses only the lines which were appended to the file since the init or the last refresh and appends them to the data (only in follow mode)
+
+        Raises
+        ------
+        NotRefreshable
+            The obj isnt in follow mode or its data has been averaged or expressed relative to its mean.
+
+        Returns
+        -------
+        int
+            Number of new datapoints.
+
+        """
+        
+        if not self.follow:
+            raise NotRefreshable("it wasnt initialised with follow=True","Pops")
+        if self.averaged or self.deviated:
+            raise NotRefreshable("its data has been averaged or expressed relative to the mean","Pops")
+        
+        #parse the new lines into a shallow copy, so that bgobj and relobj are applied the same way as in init
+        new = copy(self)
+        with self.profiler.stage("read","refresh") as stage:
+            lines = self.tail.read(prefix="2")
+            stage["rows"] = len(lines)
+        with self.profiler.stage("parse","refresh") as stage:
+            new.hk_readlines(lines)
+            stage["rows"] = len(new.t)
+        self.hk_skiprows = new.hk_skiprows
+        self.hk_commas = new.hk_commas
+        self.hk_borders = new.hk_borders
+        self.hk_last = new.hk_last
+        if len(new.t) == 0:
+            return 0
+        
+        #append in amortized O(new datapoints)
+        with self.profiler.stage("append","refresh"):
+            self.t.extend(new.t)
+            self.popstime.extend(new.popstime)
+            names = ["pops_bins_raw","pops_bins","ydata2"] + ([] if isinstance(self.ydata,str) else ["ydata"])
+            for name in names:
+                data,self.hk_buffers[name] = appendcolumns(getattr(self,name),getattr(new,name),self.hk_buffers.get(name))
+                setattr(self,name,data)
+        self.hk_resetcache()
+            
+        return len(new.t)
+        
+        
     #housekeeping funcs    
+    def hk_readlines(self,lines):
+        """Parses the columns named in the layout from csv-lines to np.arrays, crops them and applies bgobj and relobj"""
+        
+        #rows with another number of fields than the first row of the file (eg. a row cut off by a logger crash) are rejected, the first row is skipped
+        if self.hk_commas is None:
+            self.hk_commas = next((line.count(",") for line in lines if line.strip()),None)
+        skip = min(self.hk_skiprows,len(lines))
+        lines = [line for line in lines[skip:] if line.count(",") == self.hk_commas]
+        self.hk_skiprows -= skip
+            
+        #init wintertime-correction
+        wt_corr = dt.timedelta(0,3600) if self.wintertime else dt.timedelta(0,7200)
+        
+        #extract x and y values from columns
+        mounted = not isinstance(self.layout["ydata"],str)
+        bincols = list(self.layout["bins"])
+        ydatacols = list(self.layout["ydata"]) if mounted else []
+        ydata2cols = list(self.layout["ydata2"])
+        numdata = readcolumns(lines,bincols + ydata2cols + ydatacols + [self.layout["flow"],self.layout["popstime"]])
+        
+        nbins,ny2 = len(bincols),len(ydata2cols)
+        pops_bins_raw = numdata[:nbins]
+        flow = numdata[-2]
+        #times of day after midnight are put on the following days (continuing after the last chunk in follow mode)
+        popstime = unwrapdays(fromseconds(numdata[-1],dt.datetime.strptime("00:00:00","%H:%M:%S")-dt.timedelta(0,self.timecorr)+wt_corr),self.hk_last["popstime"])
+        t = popstime if self.layout["t"] < 0 else unwrapdays(parsetime(readcolumns(lines,[self.layout["t"]],dtype=str)[0]),self.hk_last["t"])
+        if len(t) != 0:
+            self.hk_last = {"t" : t[-1], "popstime" : popstime[-1]}
+        pops_bins = pops_bins_raw / flow
+        #ydata-Syntax: [temp_bm680,rf_bm680,temp_sen55,rf_sen55,press,gas,pm1,pm25,pm4,pm10,voc,nox,co2,tvoc]
+        #ydata2-Syntax: [total,popstemp,boardtemp,pops_pm25,pops_underpm25]
+        ydata2 = np.vstack([numdata[nbins:nbins+ny2],
+                            np.sum(pops_bins[8:15],axis=0),
+                            np.sum(pops_bins[:8],axis=0)])
+        ydata = numdata[nbins+ny2:-2]
+        
+        #crop (the borders are fixed at the first timestamp of the file, so that they stay the same for every refresh)
+        if self.hk_borders is None and len(t) != 0:
+            self.hk_borders = cropborders(t,None if self.start == "none" else self.start,None if self.end == "none" else self.end,self.follow)
+        sl = crop(t,*self.hk_borders) if len(t) != 0 else slice(0,0)
+            
+        #data is stored as one 2d-array per group (rows are the series), times stay lists of datetimes
+        self.pops_bins_raw = pops_bins_raw[:,sl]
+        self.t = t[sl].tolist()
+        self.popstime = popstime[sl].tolist()
+        self.ydata2 = np.ascontiguousarray(ydata2[:,sl],dtype=self.dtype)
+        self.ydata = np.ascontiguousarray(ydata[:,sl],dtype=self.dtype) if mounted else "NULL"
+        self.pops_bins = np.ascontiguousarray(pops_bins[:,sl],dtype=self.dtype)
+        self.hk_resetcache()
+            
+        #correctbg
+        if isinstance(self.bgobj,Pops):
+            self.importbg(self.bgobj.exportbg())
+            
+        #make values relative
+        if isinstance(self.relobj,Pops):
+            self.relativevals(self.relobj)
+            self.relative = True
+        
+        
     def hk_kwargs(self,kwargs,key,default):
         """Turns kwargs into attributes"""
         
@@ -1048,19 +1092,24 @@ class Pops:
         raise ValueError(output)
         
         
+    def hk_ydataornan(self,obj):
+        """Returns ydata of obj or a nan-filled array of the same shape if no peripheral sensors are mounted"""
+        
+        if not isinstance(obj.ydata,str):
+            return obj.ydata
+        return np.full((len(obj.plottypes),len(obj.t)),np.nan)
+    
+    
     def hk_replacezeros(self,data):
-        """replaces zeros for a logarithmic scale"""
-        
-        smallest = 10000
-        for element in data:
-            for i in range(len(element)):
-                if element[i] < smallest and element[i] > 0:
-                    smallest = element[i]
-        for element in data:
-            for i in range(len(element)):
-                if element[i] <= 0:
-                    element[i] = np.nan
-        return data
+        """replaces zeros and negative values by nan for a logarithmic scale (returns a new array)"""
+        
+        return np.where(data > 0,data,np.nan)
+    
+    
+    def hk_resetcache(self):
+        """Drops the cached dN/dlogDp data (called whenever Pops.pops_bins is changed)"""
+        
+        self.hk_dndlogdp = None
  
 
 
@@ -1131,88 +1180,48 @@ class OPC:
         self.hk_errorhandling(kwargs, defaults.keys(), "OPC")
         
         if file[-4:] == ".dat":
-            cfile = file
             
-            self.data = {}
+            self.data = LazyColumns()
             self.details = {}
             
             #import cfile
-            with open(cfile) as f:
-                cdata = list(f)[14:]
-                chelper = cdata[0].replace(",",".").split("\t")
-                cdata = cdata[1:]
-            for i,row in enumerate(cdata):
-                cdata[i] = row.replace(",",".").split("\t")
-                cdata[i][0] = dt.datetime.strptime(cdata[i][0],"%d.%m.%Y %H:%M:%S")
-            cdata = np.array(cdata).transpose()
-            self.data["t"] = cdata[0]
+            chelper,t,cdata = readdat(file)
+            sl = crop(t,self.start,self.end)
+            t = t[sl].astype(object)
+            cdata = cdata[:,sl] / 1000 #convert from #/l to #/ccm
+            self.data["t"] = t
             self.details["t"] = ["time","CET"]
-            self.data["t_noday"] = np.array([cdata[0][i].time() for i in range(len(cdata[0]))])
+            self.data["t_noday"] = np.array([stamp.time() for stamp in t])
             self.details["t_noday"] = ["time","CET"]
-            cdata = cdata[1:].astype(float) / 1000 #convert from #/l to #/ccm
             self.data["totalpartconc"] = np.sum(cdata,axis=0)
             self.details["totalpartconc"] = ["Part.Conc. over all channels","counts/cm${}^3$"]
             for i,d in enumerate(cdata):
                 self.data[f"b{i}partconc"] = d
                 self.details[f"b{i}partconc"] = [f"Bin{i} ({chelper[i+1]})","counts/cm${}^3$"]
                 
-            #import mfile
-            try:
-                with open(self.mfile) as f:
-                    mdata = list(f)[14:]
-                    mhelper = mdata[0].replace(",",".").split("\t")[1:]
-                    mdata = mdata[1:]
-            except Exception as exc:
-                raise FileNotFoundError(f"File {self.mfile} not found. If it has been renamed or moved, pass the new name/path as 'mfile' to OPC.__init__()") from exc
-            for i,row in enumerate(mdata):
-                mdata[i] = row.replace(",",".").split("\t")[1:]
-            mdata = np.array(mdata).transpose().astype(float)
-            for key,val in zip(mhelper,mdata):
-                key = key[:-8]
-                self.data[key.lower()] = val
+            #mfile and dmfile are only read when one of their keys is accessed the first time
+            for path,arg in [(self.mfile,"mfile"),(self.dmfile,"dmfile")]:
+                if not os.path.isfile(path):
+                    raise FileNotFoundError(f"File {path} not found. If it has been renamed or moved, pass the new name/path as '{arg}' to OPC.__init__()")
+            mhelper = [key[:-8] for key in readdat(self.mfile,headeronly=True)[0][1:]]
+            for key in mhelper:
                 self.details[key.lower()] = [key,"$\mu$g/m${}^3$"]
-                
-            #import dmfile
-            try:
-                with open(self.dmfile) as f:
-                    dmdata = list(f)[14:]
-                    dmdata = dmdata[1:]
-            except Exception as exc:
-                raise FileNotFoundError(f"File {self.dmfile} not found. If it has been renamed or moved, pass the new name/path as 'dmfile' to OPC.__init__()") from exc
-            for i,row in enumerate(dmdata):
-                dmdata[i] = row.replace(",",".").split("\t")[1:]
-            dmdata = np.array(dmdata).transpose().astype(float)
-            self.data["totalmassconc"] = np.sum(cdata,axis=0)
+            self.data.addloader([key.lower() for key in mhelper],partial(self.hk_readmfile,self.mfile,sl))
+            
             self.details["totalmassconc"] = ["Mass Conc. over all channels","$\mu$g/m${}^3$"]
-            for i,d in enumerate(cdata):
-                self.data[f"b{i}massconc"] = d
+            for i in range(len(cdata)):
                 self.details[f"b{i}massconc"] = [f"Bin{i} ({chelper[i+1]})","$\mu$g/m${}^3$"]
-                
-            #crop
-            m = np.full(len(self.data["t_noday"]),True)
-            if self.start != None:
-                tstart = dt.datetime.strptime(self.start,"%H:%M:%S").time()
-                m = np.where(tstart < self.data["t_noday"],m,False)
-            if self.end != None:
-                tend = dt.datetime.strptime(self.end,"%H:%M:%S").time()
-                m = np.where(tend > self.data["t_noday"],m,False)
-            for key in self.data:
-                self.data[key] = self.data[key][m]
+            self.data.addloader(["totalmassconc"] + [f"b{i}massconc" for i in range(len(cdata))],partial(self.hk_readdmfile,self.dmfile,sl))
                 
         elif file[-4:] == ".opc":
-            with open(file,"rb") as openfile:
-                self.data,self.details = pickle.load(openfile)
+            ip = loadcache(file,legacykeys=["data","details"])
+            self.data,self.details = ip["data"],ip["details"]
             
             #crop
-            m = np.full(len(self.data["t_noday"]),True)
-            if self.start != None:
-                tstart = dt.datetime.strptime(self.start,"%H:%M:%S")
-                m = np.where(tstart < self.data["t_noday"],m,False)
-            if self.end != None:
-                tend = dt.datetime.strptime(self.end,"%H:%M:%S")
-                m = np.where(tend > self.data["t_noday"],m,False)
-            for key in self.data:
-                self.data[key] = self.data[key][m]
+            if self.start != None or self.end != None:
+                sl = crop(self.data["t"],self.start,self.end)
+                for key in self.data:
+                    self.data[key] = self.data[key][sl]
                 
         else:
             raise IllegalFileFormat(file.split(".")[1], "dat or .opc", "'file' argument in OPC.__init__()")
@@ -1221,7 +1230,7 @@ class OPC:
                 
     def save(self,name):
         """
-        Saves the OPC object to an .opc file
+        Saves the OPC object to an .opc file (columnar cache folder, see cachefile.py)
 
         Parameters
         ----------
@@ -1236,9 +1245,10 @@ class OPC:
         
         if name[-4:] != ".opc":
             name += ".opc"
-        op = [self.data,self.details]
+        op = {"data" : self.data,
+              "details" : self.details}
         
-        pickle.dump(op,open(name,"wb"),4)
+        savecache(name,op)
         
         
     def plot(self,ax,y,**kwargs):
@@ -1463,3 +1473,18 @@ class OPC:
                 raise IllegalArgument(key,funcname,legallist)
                 
                 
+    def hk_readmfile(self,mfile,sl):
+        """Reads the mass concentrations of the M file (cropped by the slice sl of the C file)"""
+        
+        mhelper,t,mdata = readdat(mfile)
+        return {key[:-8].lower() : val[sl] for key,val in zip(mhelper[1:],mdata)}
+    
+    
+    def hk_readdmfile(self,dmfile,sl):
+        """Reads the mass concentration of every bin from the dM file (cropped by the slice sl of the C file)"""
+        
+        dmdata = readdat(dmfile)[2][:,sl]
+        op = {"totalmassconc" : np.sum(dmdata,axis=0)}
+        for i,d in enumerate(dmdata):
+            op[f"b{i}massconc"] = d
+        return op
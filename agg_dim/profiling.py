@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in profiling of named stages of the instrument classes (wall time, peak memory and rows/particles per stage)
+
+Either pass profile=True to a class (eg. WIBS(...,profile=True)) or create objects inside 'with profile() as profilers:'.
+The report is available as obj.profiler.report, obj.profiler.summary() formats it as a table.
+Peak memory is measured with tracemalloc, which slows down stages creating many python objects (eg. parsing), profile="time" only measures time and rows.
+"""
+
+from contextlib import contextmanager
+import time
+import tracemalloc
+
+from .ErrorHandler import IllegalValue
+
+sessions = []
+
+
+@contextmanager
+def profile(mode=True):
+    """
+    Turns on profiling for every obj created inside the with-block
+
+    Parameters
+    ----------
+    mode : bool or str, optional
+        True: time, peak memory and rows, "time": only time and rows. The default is True.
+
+    Yields
+    ------
+    list of Profiler
+        Contains the Profiler of every obj created inside the with-block.
+
+    """
+
+    session = []
+    entry = (session,mode)
+    sessions.append(entry)
+    try:
+        yield session
+    finally:
+        sessions[:] = [other for other in sessions if other is not entry]
+
+
+class Profiler:
+    """
+    Records wall time, peak memory and rows of named stages
+
+    Stages with the same method and name (eg. one per chunk) are summed up into one entry of the report.
+    Stages can be nested, the peak memory of the outer stage includes the inner ones.
+    Peak memory is measured with tracemalloc, which slows down allocations while a stage is running (use mode "time" for undistorted times).
+
+    Variables
+    ---------
+    Profiler.owner : str
+        Name of the profiled class
+    Profiler.enabled : bool
+        If False, stage() does nothing
+    Profiler.memory : bool
+        If False, peak memory isn't measured
+    Profiler.report : list of dict
+        Contains one dict {"method", "stage", "depth", "calls", "time", "peakmemory", "rows"} per stage in the order they were first entered.
+        time is in seconds, peakmemory in bytes above the memory at the start of the stage (None if memory is False) and rows is None if the stage doesn't count rows.
+    """
+
+    def __init__(self,owner,mode=False):
+        """
+        Inits a Profiler
+
+        Parameters
+        ----------
+        owner : str
+            Name of the profiled class.
+        mode : bool or str, optional
+            False: disabled (unless a profile() block is active), True: time, peak memory and rows, "time": only time and rows. The default is False.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if mode not in [False,True,"time"]:
+            raise IllegalValue("profile",owner,["False","True","time"])
+        modes = [mode] + [sessionmode for session,sessionmode in sessions]
+        self.owner = owner
+        self.enabled = any(m not in [False,None] for m in modes)
+        self.memory = any(m is True for m in modes)
+        self.report = []
+        self.stack = []
+        for session,sessionmode in sessions:
+            session.append(self)
+
+
+    @contextmanager
+    def stage(self,name,method="__init__"):
+        """
+        Measures the code inside the with-block as one stage
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage (eg. "parse").
+        method : str, optional
+            Name of the method the stage belongs to. The default is "__init__".
+
+        Yields
+        ------
+        dict
+            Set "rows" of this dict to the number of rows/particles the stage handled (it is added up over repeated stages).
+
+        """
+
+        if not self.enabled:
+            yield {}
+            return
+
+        started = self.memory and not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        current = 0
+        if self.memory:
+            current,peak = tracemalloc.get_traced_memory()
+            for outer in self.stack:
+                outer["peak"] = max(outer["peak"],peak)
+            tracemalloc.reset_peak()
+        entry = self.hk_entry(method,name,len(self.stack))
+        counter = {"rows" : None}
+        frame = {"base" : current, "peak" : current}
+        self.stack.append(frame)
+        t = time.perf_counter()
+        try:
+            yield counter
+        finally:
+            t = time.perf_counter() - t
+            self.stack.pop()
+            if self.memory:
+                peak = max(frame["peak"],tracemalloc.get_traced_memory()[1])
+                for outer in self.stack:
+                    outer["peak"] = max(outer["peak"],peak)
+                entry["peakmemory"] = max(entry["peakmemory"],peak-frame["base"])
+            if started:
+                tracemalloc.stop()
+            entry["calls"] += 1
+            entry["time"] += t
+            if counter["rows"] is not None:
+                entry["rows"] = (entry["rows"] or 0) + counter["rows"]
+
+
+    def summary(self):
+        """
+        Formats the report as a table
+
+        Returns
+        -------
+        str
+            One line per stage with method, stage (indented by depth), calls, time, peak memory and rows.
+
+        """
+
+        lines = [f"{self.owner}: {'method':<12}{'stage':<24}{'calls':>6}{'time [s]':>11}{'peak [MB]':>11}{'rows':>12}"]
+        for entry in self.report:
+            stage = "  "*entry["depth"] + entry["stage"]
+            rows = "" if entry["rows"] is None else entry["rows"]
+            peak = "" if entry["peakmemory"] is None else f"{entry['peakmemory']/1e6:.2f}"
+            lines.append(f"{'':<{len(self.owner)+2}}{entry['method']:<12}{stage:<24}{entry['calls']:>6}{entry['time']:>11.4f}{peak:>11}{rows:>12}")
+        return "\n".join(lines)
+
+
+    def __getstate__(self):
+        #pickled copies (eg. objs sent to worker processes) don't profile
+        return {"owner" : self.owner, "enabled" : False, "memory" : False, "report" : [], "stack" : []}
+
+
+    def __repr__(self):
+        state = f"{len(self.report)} stages" if self.enabled else "disabled"
+        return f"<Profiler of {self.owner} ({state})>"
+
+
+    #housekeeping funcs
+
+    def hk_entry(self,method,name,depth):
+        """Returns the report entry of a stage (a new one when the stage is entered the first time)"""
+
+        for entry in self.report:
+            if entry["method"] == method and entry["stage"] == name:
+                return entry
+        entry = {"method" : method,
+                 "stage" : name,
+                 "depth" : depth,
+                 "calls" : 0,
+                 "time" : 0.0,
+                 "peakmemory" : 0 if self.memory else None,
+                 "rows" : None}
+        self.report.append(entry)
+        return entry
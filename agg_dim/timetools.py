@@ -0,0 +1,469 @@
+# -*- coding: utf-8 -*-
+"""
+Shared time handling for all instrument classes (parsing, alignment, regridding, cropping and resampling of timestamps as np.datetime64)
+"""
+
+import datetime as dt
+import numpy as np
+
+from .ErrorHandler import IllegalValue
+
+
+def parsetime(strings,date="1900-01-01",fmt="%H:%M:%S"):
+    """
+    Parses an array of time strings in the form 'hh:mm:ss' or 'hh:mm:ss.ffffff' into np.datetime64
+
+    Parameters
+    ----------
+    strings : array-like of str
+        Contains the time strings.
+    date : str, optional
+        Date (str format: 'yyyy-mm-dd') the times are put on. The default is '1900-01-01' which matches dt.datetime.strptime().
+    fmt : str, optional
+        strptime-format which is used as a fallback, if the strings are not zero-padded. The default is '%H:%M:%S'.
+
+    Returns
+    -------
+    np.array of np.datetime64[us]
+        Contains the parsed timestamps.
+
+    """
+
+    strings = np.asarray(strings,dtype=str)
+    if strings.size == 0:
+        return np.array([],dtype="datetime64[us]")
+    try:
+        raw = strings.astype("S")
+    except UnicodeEncodeError:
+        raw = None
+    width = raw.dtype.itemsize if raw is not None else 0
+
+    if width >= 8:
+        chars = np.frombuffer(raw.tobytes(),np.uint8).reshape(-1,width).astype(np.int64)
+        digits = chars - 48
+        clock = digits[:,[0,1,3,4,6,7]]
+        valid = np.all((clock >= 0) & (clock <= 9)) and np.all(chars[:,[2,5]] == 58)
+        if width > 8:
+            frac = digits[:,9:15]
+            frac = np.where(chars[:,9:15] == 0,0,frac) #zero-padding of shorter strings
+            valid = valid and np.all((chars[:,8] == 46) | (chars[:,8] == 0)) and np.all((frac >= 0) & (frac <= 9))
+        if valid:
+            secs = (clock[:,0]*10+clock[:,1])*3600 + (clock[:,2]*10+clock[:,3])*60 + clock[:,4]*10+clock[:,5]
+            us = secs * 1000000
+            if width > 8:
+                us += frac @ (10**np.arange(5,5-frac.shape[1],-1))
+            return np.datetime64(date,"us") + us.astype("timedelta64[us]")
+
+    #fallback for irregular strings
+    base = dt.datetime.strptime(date,"%Y-%m-%d")
+    return np.array([dt.datetime.strptime(s,fmt).replace(year=base.year,month=base.month,day=base.day) for s in strings],dtype="datetime64[us]")
+
+
+def parsedatetime(strings,fmt="%d.%m.%Y %H:%M:%S"):
+    """
+    Parses an array of timestamps in the form 'dd.mm.yyyy hh:mm:ss' or 'yyyy.mm.dd hh:mm:ss' (both optionally with '.ffffff') into np.datetime64
+
+    Parameters
+    ----------
+    strings : array-like of str
+        Contains the timestamps.
+    fmt : str, optional
+        strptime-format which is used as a fallback, if the strings are not zero-padded. The default is '%d.%m.%Y %H:%M:%S'.
+
+    Returns
+    -------
+    np.array of np.datetime64[us]
+        Contains the parsed timestamps.
+
+    """
+
+    strings = np.asarray(strings,dtype=str)
+    if strings.size == 0:
+        return np.array([],dtype="datetime64[us]")
+    try:
+        raw = strings.astype("S")
+    except UnicodeEncodeError:
+        raw = None
+    width = raw.dtype.itemsize if raw is not None else 0
+
+    if width >= 19:
+        chars = np.frombuffer(raw.tobytes(),np.uint8).reshape(-1,width)
+        iso = None
+        if np.all(chars[:,[2,5]] == 46) and np.all(chars[:,10] == 32):
+            #reorder 'dd.mm.yyyy' to 'yyyy-mm-dd', which numpy parses in C
+            iso = chars[:,[6,7,8,9,5,3,4,2,0,1]].copy()
+        elif np.all(chars[:,[4,7]] == 46) and np.all(chars[:,10] == 32):
+            iso = chars[:,:10].copy()
+        if iso is not None:
+            iso[:,[4,7]] = 45
+            try:
+                days = iso.view("S10").ravel().astype("datetime64[D]")
+            except ValueError:
+                days = None
+            if days is not None:
+                clock = parsetime(np.ascontiguousarray(chars[:,11:]).view(f"S{width-11}").ravel().astype(str),date="1970-01-01",fmt=fmt.split(" ",1)[-1])
+                return days.astype("datetime64[us]") + (clock - np.datetime64("1970-01-01","us"))
+
+    #fallback for irregular strings
+    return np.array([dt.datetime.strptime(s,fmt) for s in strings],dtype="datetime64[us]")
+
+
+def fromseconds(seconds,base):
+    """
+    Converts an array of (float) seconds into np.datetime64 relative to a base timestamp
+
+    Parameters
+    ----------
+    seconds : array-like of float
+        Seconds after base.
+    base : dt.datetime or np.datetime64
+        Timestamp which corresponds to 0 seconds.
+
+    Returns
+    -------
+    np.array of np.datetime64[us]
+        Contains the timestamps (rounded to microseconds like dt.timedelta).
+
+    """
+
+    us = np.round(np.asarray(seconds,dtype=float)*1e6).astype(np.int64)
+    return np.datetime64(base,"us") + us.astype("timedelta64[us]")
+
+
+def unwrapdays(t,last=None):
+    """
+    Adds one day to every timestamp after a step back of more than 12 hours, so that times of day which pass midnight stay sorted
+
+    Parameters
+    ----------
+    t : array-like of dt.datetime or np.datetime64
+        Timestamps (eg. times of day on the default date 01.01.1900).
+    last : np.datetime64 or None, optional
+        Last timestamp of the data t is appended to (eg. in follow mode). If given, t is moved by whole days, so that it continues after last. The default is None.
+
+    Returns
+    -------
+    np.array of np.datetime64[us]
+        Contains the sorted timestamps.
+
+    """
+
+    t = np.asarray(t,dtype="datetime64[us]")
+    if len(t) == 0:
+        return t
+    day = 86400 * 1000000
+    half = np.timedelta64(12,"h")
+    days = np.concatenate([[0],np.cumsum(np.diff(t) < -half)])
+    if last is not None:
+        behind = int((np.datetime64(last,"us") - half - t[0]).astype(np.int64))
+        days += max(-(-behind // day),0)
+    if not days.any():
+        return t
+    return t + days.astype("timedelta64[D]")
+
+
+def alignkeys(t1,t2):
+    """
+    Converts two time series into comparable int64 keys (microseconds)
+
+    If one of the series only contains times of day (it starts on the default date 01.01.1900), both are compared by their offset
+    from the midnight of their first day instead of their full timestamps. Series with real dates are always compared by their full timestamps.
+
+    Parameters
+    ----------
+    t1 : array-like of dt.datetime or np.datetime64
+        First time series.
+    t2 : array-like of dt.datetime or np.datetime64
+        Second time series.
+
+    Returns
+    -------
+    k1, k2 : np.array of int64
+        Keys of t1 and t2.
+
+    """
+
+    k1 = np.asarray(t1,dtype="datetime64[us]").astype(np.int64)
+    k2 = np.asarray(t2,dtype="datetime64[us]").astype(np.int64)
+    if len(k1) == 0 or len(k2) == 0:
+        return k1,k2
+    day = 86400 * 1000000
+    placeholder = np.datetime64("1900-01-01","us").astype(np.int64)
+    if placeholder <= k1[0] < placeholder + day or placeholder <= k2[0] < placeholder + day:
+        k1 = k1 - (k1[0] // day) * day
+        k2 = k2 - (k2[0] // day) * day
+    return k1,k2
+
+
+def align(t1,t2,how="inner",tolerance=0):
+    """
+    Joins two time series and returns the indices of all matched pairs in O(n log n)
+
+    Parameters
+    ----------
+    t1 : array-like of dt.datetime or np.datetime64
+        Left time series. Every element is matched at most once.
+    t2 : array-like of dt.datetime or np.datetime64
+        Right time series. Does not need to be sorted or contiguous.
+    how : str, optional
+        "inner" matches every element of t1 with the nearest element of t2, "asof" matches it with the last element of t2 that is not later. The default is "inner".
+    tolerance : float or None, optional
+        Maximum distance in seconds between matched timestamps. None means no limit. The default is 0 (only exact matches).
+
+    Returns
+    -------
+    i1, i2 : np.array of int
+        Indices into t1 and t2 of the matched pairs, sorted by i1.
+
+    """
+
+    if how not in ["inner","asof"]:
+        raise IllegalValue("how","align()",["inner","asof"])
+    k1,k2 = alignkeys(t1,t2)
+    if len(k1) == 0 or len(k2) == 0:
+        return np.array([],dtype=np.int64),np.array([],dtype=np.int64)
+    order = np.argsort(k2,kind="stable")
+    k2 = k2[order]
+    
+    if how == "inner":
+        pos = np.searchsorted(k2,k1,side="left")
+        right = np.minimum(pos,len(k2)-1)
+        left = np.maximum(pos-1,0)
+        best = np.where(np.abs(k2[right]-k1) < np.abs(k1-k2[left]),right,left)
+        diff = np.abs(k2[best]-k1)
+        m = np.full(len(k1),True)
+    else:
+        best = np.searchsorted(k2,k1,side="right") - 1
+        m = best >= 0
+        best = np.maximum(best,0)
+        diff = k1 - k2[best]
+        
+    if tolerance is not None:
+        m &= diff <= round(tolerance*1000000)
+    i1 = np.flatnonzero(m)
+    return i1,order[best[m]]
+
+
+def regrid(t,values,agg="first"):
+    """
+    Snaps a time series to integer seconds and scatters its values onto a contiguous 1 second grid in O(n)
+
+    Parameters
+    ----------
+    t : array-like of dt.datetime or np.datetime64
+        Timestamps of the values.
+    values : array-like with shape (n,) or (m,n)
+        Contains one row per series with one value per timestamp.
+    agg : str, optional
+        Decides which value is used if a second contains more than one timestamp ("first", "last" or "mean"). The default is "first".
+
+    Returns
+    -------
+    grid : np.array of np.datetime64[us]
+        Contains every second from the first to the last timestamp.
+    op : np.array of float with shape (len(grid),) or (m,len(grid))
+        Contains the regridded values. Seconds without data are np.nan.
+
+    """
+
+    if agg not in ["first","last","mean"]:
+        raise IllegalValue("agg","regrid()",["first","last","mean"])
+    secs = np.asarray(t,dtype="datetime64[us]").astype("datetime64[s]")
+    values = np.asarray(values,dtype=float)
+    flat = values.ndim == 1
+    values = np.atleast_2d(values)
+    if len(secs) == 0:
+        grid = np.array([],dtype="datetime64[us]")
+        op = np.empty((len(values),0))
+        return grid,op[0] if flat else op
+    
+    start = secs.min()
+    idx = (secs - start).astype(np.int64)
+    n = int(idx.max()) + 1
+    grid = (start + np.arange(n).astype("timedelta64[s]")).astype("datetime64[us]")
+    op = np.full((len(values),n),np.nan)
+    if agg == "mean":
+        counts = np.bincount(idx,minlength=n)
+        keys = (np.arange(len(values))[:,None]*n + idx).ravel()
+        sums = np.bincount(keys,weights=values.ravel(),minlength=len(values)*n).reshape(len(values),n)
+        filled = counts > 0
+        op[:,filled] = sums[:,filled] / counts[filled]
+    else:
+        if agg == "first":
+            filled,pos = np.unique(idx,return_index=True)
+        else:
+            filled,pos = np.unique(idx[::-1],return_index=True)
+            pos = len(idx) - 1 - pos
+        op[:,filled] = values[:,pos]
+    return grid,op[0] if flat else op
+
+
+def crop(t,start=None,end=None):
+    """
+    Finds the part of a sorted time series between start and end with a binary search in O(log n)
+
+    Parameters
+    ----------
+    t : array-like of dt.datetime or np.datetime64
+        Sorted timestamps.
+    start : str, dt.datetime or np.datetime64, optional
+        First timestamp that is kept. Strings ('hh:mm:ss' or 'hh:mm:ss.ffffff') are times of day on the day of the first timestamp (or on the next day, if they lie before the first timestamp and the data reaches the next midnight). The default is None (no lower border).
+    end : str, dt.datetime or np.datetime64, optional
+        All timestamps from end on are removed. Strings are times of day on the day of start (or the first timestamp), or on the next day, if they lie before start and the data reaches the next midnight (so an end before start on data of a single day keeps nothing). The default is None (no upper border).
+
+    Returns
+    -------
+    slice
+        Can be used to get views of all arrays that belong to t (eg. arr[...,sl]).
+
+    """
+
+    t = np.asarray(t,dtype="datetime64[us]")
+    if len(t) == 0:
+        return slice(0,0)
+    
+    lo,hi = 0,len(t)
+    start,end = cropborders(t,start,end)
+    if start is not None:
+        lo = int(np.searchsorted(t,start,side="left"))
+    if end is not None:
+        hi = int(np.searchsorted(t,end,side="left"))
+    return slice(lo,max(lo,hi))
+
+
+def cropborders(t,start=None,end=None,follow=False):
+    """
+    Turns the borders of crop() into absolute timestamps (anchored at the first timestamp of t), so that they can be reused for data appended later
+
+    Parameters
+    ----------
+    t : array-like of dt.datetime or np.datetime64
+        Sorted timestamps (at least one).
+    start : str, dt.datetime or np.datetime64, optional
+        Lower border (see crop()). The default is None.
+    end : str, dt.datetime or np.datetime64, optional
+        Upper border (see crop()). The default is None.
+    follow : bool, optional
+        If True, times of day before the first timestamp (or before start) always lie on the next day, because the data of a followed file can still reach it. Otherwise only if t reaches the next midnight. The default is False.
+
+    Returns
+    -------
+    start : np.datetime64[us] or None
+        Contains the lower border.
+    end : np.datetime64[us] or None
+        Contains the upper border.
+
+    """
+
+    t = np.asarray(t,dtype="datetime64[us]")
+    last = None if follow else t[-1]
+    ref = t[0]
+    if start is not None:
+        start = ref = hk_border(start,ref,last)
+    if end is not None:
+        end = hk_border(end,ref,last)
+    return start,end
+
+
+def resample(t,values,window=60,agg="mean",label="left"):
+    """
+    Aggregates a time series into fixed time windows with one grouped reduction over all series
+
+    Parameters
+    ----------
+    t : array-like of dt.datetime or np.datetime64
+        Timestamps of the values (sorted).
+    values : array-like with shape (n,) or (m,n)
+        Contains one row per series with one value per timestamp.
+    window : int, float or str, optional
+        Length of the windows in seconds or as a str like '10s', '1min', '15min' or '1h'. Windows start at multiples of the window length (eg. full minutes). The default is 60.
+    agg : str, optional
+        Aggregation of every window ("mean", "median", "sum", "min", "max", "count" or "std"). The default is "mean".
+    label : str, optional
+        Decides which timestamp is used for a window ("left": start, "center": middle, "right": end of the window). The default is "left".
+
+    Returns
+    -------
+    t_op : np.array of np.datetime64[us]
+        Contains the label of every window that contains data (the last window can be partial).
+    op : np.array of float with shape (len(t_op),) or (m,len(t_op))
+        Contains the aggregated values.
+
+    """
+
+    aggs = ["mean","median","sum","min","max","count","std"]
+    if agg not in aggs:
+        raise IllegalValue("agg","resample()",aggs)
+    if label not in ["left","center","right"]:
+        raise IllegalValue("label","resample()",["left","center","right"])
+    w = hk_window(window)
+    t = np.asarray(t,dtype="datetime64[us]")
+    values = np.asarray(values,dtype=float)
+    flat = values.ndim == 1
+    values = np.atleast_2d(values)
+    if len(t) == 0:
+        op = np.empty((len(values),0))
+        return np.array([],dtype="datetime64[us]"),op[0] if flat else op
+
+    #group consecutive timestamps by window
+    keys = t.astype(np.int64) // w
+    starts = np.concatenate([[0],np.flatnonzero(np.diff(keys)) + 1])
+    n = np.diff(np.append(starts,len(keys)))
+    gid = np.repeat(np.arange(len(starts)),n)
+    
+    match agg:
+        case "sum":
+            op = np.add.reduceat(values,starts,axis=1)
+        case "count":
+            op = np.tile(n.astype(float),(len(values),1))
+        case "min":
+            op = np.minimum.reduceat(values,starts,axis=1)
+        case "max":
+            op = np.maximum.reduceat(values,starts,axis=1)
+        case "mean" | "std":
+            op = np.add.reduceat(values,starts,axis=1) / n
+            if agg == "std":
+                op = np.sqrt(np.add.reduceat((values - op[:,gid])**2,starts,axis=1) / n)
+        case "median":
+            #pad every window to the same length, sort all of them at once and pick the middle
+            pos = np.arange(len(keys)) - starts[gid]
+            padded = np.full((len(values),len(starts),n.max()),np.inf)
+            padded[:,gid,pos] = values
+            padded.sort(axis=2)
+            groups = np.arange(len(starts))
+            op = (padded[:,groups,(n-1)//2] + padded[:,groups,n//2]) / 2
+                
+    offset = {"left" : 0, "center" : w // 2, "right" : w}[label]
+    t_op = (keys[starts] * w + offset).astype("datetime64[us]")
+    return t_op,op[0] if flat else op
+
+
+#housekeeping funcs
+
+def hk_border(border,ref,last):
+    """Turns a crop border into np.datetime64 (time of day strings are put on the day of ref, or the day after if they lie before ref and last reaches the next midnight)"""
+
+    if not isinstance(border,str):
+        return np.datetime64(border,"us")
+    day = ref.astype("datetime64[D]")
+    op = parsetime([border],date=str(day))[0]
+    if op < ref and (last is None or last >= (day + np.timedelta64(1,"D")).astype("datetime64[us]")):
+        op = op + np.timedelta64(1,"D")
+    return op
+
+
+def hk_window(window):
+    """Turns a window length (seconds or str like '10s', '1min', '15min', '1h') into microseconds"""
+
+    units = {"us" : 1, "ms" : 1000, "s" : 1000000, "min" : 60000000, "h" : 3600000000, "d" : 86400000000}
+    if isinstance(window,str):
+        number = window.rstrip("abcdefghijklmnopqrstuvwxyz")
+        unit = window[len(number):]
+        if unit not in units:
+            raise IllegalValue("window unit","resample()",list(units))
+        op = round(float(number or 1) * units[unit])
+    else:
+        op = round(window * 1000000)
+    if op <= 0:
+        raise ValueError(f"window has to be positive (got {window})")
+    return op
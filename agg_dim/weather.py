@@ -7,9 +7,11 @@ Created on Mon Sep  8 15:02:42 2025
 
 import csv
 import datetime as dt
-import matplotlib.dates as md
 import numpy as np
 from .ErrorHandler import IllegalFileFormat, IllegalArgument
+from .lazyloading import LazyModule
+
+md = LazyModule("matplotlib.dates")
 
 class WeatherData:
     """
@@ -48,7 +50,7 @@ class WeatherData:
             raise IllegalFileFormat(file.split(".")[1], "csv","WeatherData argument")
         with open(file) as f:
             data = csv.reader(f,delimiter=",")
-        data = list(data)
+            data = list(data)
         
         self.data = {
             "t" : np.array([dt.datetime.strptime(data[i][0],"%Y/%m/%d %H:%M") for i in range(1,len(data))]),
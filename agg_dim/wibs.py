@@ -5,15 +5,20 @@ Created on Tue Nov 26 08:26:00 2024
 @author: mrupp
 """
 
+from concurrent.futures import ProcessPoolExecutor
 import math
-import pickle
 from datetime import datetime,timezone
-import h5py
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.dates as md
 
 from .ErrorHandler import IllegalValue,IllegalArgument
+from .cachefile import loadcache,savecache
+from .decimation import fitpixels
+from .lazyloading import LazyModule
+from .profiling import Profiler
+
+h5py = LazyModule("h5py")
+plt = LazyModule("matplotlib.pyplot")
+md = LazyModule("matplotlib.dates")
 
 class WIBS:
     """
@@ -41,6 +46,16 @@ class WIBS:
         String in the form 'hh:mm:ss'. If end is given, all data acquired after this timestamp will be ignored.
     FT_date : str, optional
         Sets the FT_time to be this date (str format: 'dd.mm.yyyy'), only relevant if the data is going to be compared with other data. The default is '01.01.2000'
+    channels : list of str, optional
+        Decides which channels should be processed. All channels are counted in the same single pass over the particles (one histogram over second, bin and fluorescence code), fewer channels only reduce the number of series in WIBS.data. The default is  ["a","b","c","ab","ac","bc","abc"].
+    chunksize : int, optional
+        Number of particles, which are read from the .h5 files at once. The default is 1000000.
+    keeprawdata : bool, optional
+        If False, WIBS.rawdata stays empty, so that any number of files can be processed in constant memory. The default is True.
+    workers : int, optional
+        If given, the .h5 files are processed in parallel by this many processes (scripts using it need an 'if __name__ == "__main__":' guard on Windows). The default is None (serial).
+    profile : bool or str, optional
+        If True, time, peak memory and particles of every stage are recorded in WIBS.profiler ("time": without peak memory, which is measured with tracemalloc and slows down parsing). Stages inside worker processes are not recorded. The default is False.
 
     Variables
     ---------
@@ -53,13 +68,15 @@ class WIBS:
     WIBS.details : {str : [str, str]}
         contains a description and the unit to each data array
     WIBS.rawdata : {str : 1D numpy array}
-        conains all the raw data used for data processing
+        conains all the raw data used for data processing (empty if keeprawdata=False)
     WIBS.fl1_FTbg : float
         Contains the fluorescence of the chamber for fl1, calculated from the forced trigger.
     WIBS.fl2_FTbg : float
         Contains the fluorescence of the chamber for fl2, calculated from the forced trigger.
     WIBS.fl3_FTbg : float
         Contains the fluorescence of the chamber for fl3, calculated from the forced trigger.
+    WIBS.profiler : Profiler
+        Contains the report of the profiled stages (see profiling.py)
     """
     
     def __init__(self,file,FT_file="",FT_time="hh:mm:ss",**kwargs):
@@ -89,17 +106,27 @@ class WIBS:
         FT_date : str, optional
             Sets the FT_time to be this date (str format: 'dd.mm.yyyy'), only relevant if the data is going to be compared with other data. The default is '01.01.2000'
         channels : list of str, optional
-            Decides which channels should be processed, by default all channels are processed, but it can be reduced for large files. The default is  ["a","b","c","ab","ac","bc","abc"].
+            Decides which channels should be processed. All channels are counted in the same single pass over the particles (one histogram over second, bin and fluorescence code), fewer channels only reduce the number of series in WIBS.data. The default is  ["a","b","c","ab","ac","bc","abc"].
+        chunksize : int, optional
+            Number of particles, which are read from the .h5 files at once. The default is 1000000.
+        keeprawdata : bool, optional
+            If False, WIBS.rawdata stays empty, so that any number of files can be processed in constant memory. The default is True.
+        workers : int, optional
+            If given, the .h5 files are processed in parallel by this many processes (scripts using it need an 'if __name__ == "__main__":' guard on Windows). The default is None (serial).
+        profile : bool or str, optional
+            If True, time, peak memory and particles of every stage are recorded in WIBS.profiler ("time": without peak memory, which is measured with tracemalloc and slows down parsing). Stages inside worker processes are not recorded. The default is False.
 
         """
         
         if file[-5:] == ".wibs":
             
-            with open(file,"rb") as openfile:
-                ip = pickle.load(openfile)
+            self.hk_kwargs(kwargs, "profile", False)
+            self.profiler = Profiler("WIBS",self.profile)
+            with self.profiler.stage("load cache"):
+                ip = loadcache(file)
             
-            for arg in ip.keys():
-                exec(f"self.{arg} = ip[arg]")
+            for arg,val in ip.items():
+                setattr(self,arg,val)
                 
         else:
         
@@ -112,11 +139,16 @@ class WIBS:
                 "start" : None,
                 "end" : None,
                 "FT_date" : "01.01.2000",
-                "channels" :  ["a","b","c","ab","ac","bc","abc"]
+                "channels" :  ["a","b","c","ab","ac","bc","abc"],
+                "chunksize" : 1000000,
+                "keeprawdata" : True,
+                "workers" : None,
+                "profile" : False
                 }
             for key,value in defaults.items():
                 self.hk_kwargs(kwargs, key, value)
             self.hk_errorhandling(kwargs, defaults.keys(), "WIBS")
+            self.profiler = Profiler("WIBS",self.profile)
             
             #setup variables
             self.bins = len(self.bin_borders)-1
@@ -134,210 +166,86 @@ class WIBS:
             if FT_file == "":
                 raise KeyError("WIBS needs a FT_file unless preprocessed data (.wibs-file) is used")
     
-            try:
-                ft = h5py.File(FT_file,"r")
-            except Exception as exc:
-                raise FileNotFoundError("Cant find FT_file at given path") from exc
-            ft2 = ft["NEO"]
-            ft3 = ft2["ParticleData"]
-            
-            ft_xe1 = np.transpose(list(ft3["Xe1_FluorPeak"]))
-            ft_xe2 = np.transpose(list(ft3["Xe2_FluorPeak"]))
-            self.start_FT = datetime.fromtimestamp(list(ft3["Seconds"])[0],tz=timezone.utc).replace(year=int(self.FT_date[-4:]),month=int(self.FT_date[3:5]),day=int(self.FT_date[:2]))
+            with self.profiler.stage("read FT") as stage:
+                try:
+                    ft = h5py.File(FT_file,"r")
+                except Exception as exc:
+                    raise FileNotFoundError("Cant find FT_file at given path") from exc
+                with ft:
+                    ft3 = ft["NEO"]["ParticleData"]
+                    ft_xe1 = ft3["Xe1_FluorPeak"][:].T
+                    ft_xe2 = ft3["Xe2_FluorPeak"][:].T
+                    ft_start = ft3["Seconds"][0]
+                stage["rows"] = ft_xe1.shape[1]
+            self.start_FT = datetime.fromtimestamp(ft_start,tz=timezone.utc).replace(year=int(self.FT_date[-4:]),month=int(self.FT_date[3:5]),day=int(self.FT_date[:2]))
             
             
             FT_time = datetime.strptime(f"{self.FT_date}-{FT_time}/+0000","%d.%m.%Y-%H:%M:%S/%z")
             timecorr = FT_time - self.start_FT
             
             if self.fixed == None:
-                self.fl1_FTbg = np.nanmean(ft_xe1[0]) + self.FT_sigma * np.nanstd(ft_xe1[0])
-                self.fl2_FTbg = np.nanmean(ft_xe1[1]) + self.FT_sigma * np.nanstd(ft_xe1[1])
-                self.fl3_FTbg = np.nanmean(ft_xe2[1]) + self.FT_sigma * np.nanstd(ft_xe2[1])
+                with self.profiler.stage("FT threshold"):
+                    self.fl1_FTbg = np.nanmean(ft_xe1[0]) + self.FT_sigma * np.nanstd(ft_xe1[0])
+                    self.fl2_FTbg = np.nanmean(ft_xe1[1]) + self.FT_sigma * np.nanstd(ft_xe1[1])
+                    self.fl3_FTbg = np.nanmean(ft_xe2[1]) + self.FT_sigma * np.nanstd(ft_xe2[1])
             
             
-            #load file
-            if isinstance(file,str):
-                try:
-                    f = h5py.File(file,"r")
-                except Exception as exc:
-                    raise FileNotFoundError("Cant find file at given path") from exc
-                f2 = f["NEO"]
-                f3 = f2['ParticleData']
-                
-                wibstime = list(f3["Seconds"])
-                self.timehandler = np.array(wibstime).astype(np.uint32)
-                
-                xe1 = np.transpose(list(f3["Xe1_FluorPeak"]))
-                xe2 = np.transpose(list(f3["Xe2_FluorPeak"]))
-                
-                self.rawdata["size"] = np.array(list(f3["Size_um"]))
-                self.rawdata["excited"] = np.array(list(f3["Flag_Excited"])).astype(bool)
-                self.rawdata["Fl1"] = np.where(xe1[0] >= self.fl1_FTbg, True, False)
-                self.rawdata["Fl2"] = np.where(xe1[1] >= self.fl2_FTbg, True, False)
-                self.rawdata["Fl3"] = np.where(xe2[1] >= self.fl3_FTbg, True, False)
-                
-    
-            #load files
-            elif isinstance(file,list):
-    
-                firstfile = True
-                
-                for ff in file:
-                    f = h5py.File(ff,"r")
-                    f2 = f["NEO"]
-                    f3 = f2['ParticleData']
-                    
-                    filetime = list(f3["Seconds"])
-                    th = np.array(filetime).astype(np.uint32)
-                    
-                    xe1 = np.transpose(list(f3["Xe1_FluorPeak"]))
-                    xe2 = np.transpose(list(f3["Xe2_FluorPeak"]))
-                    if len(xe1) == 0 or len(xe2) == 0:
-                        continue
-                    
-                    filecounts = np.array(list(f3["Size_um"]))
-                    file_excited = np.array(list(f3["Flag_Excited"])).astype(bool)
-                    filefl1 = np.where(xe1[0] >= self.fl1_FTbg, True, False)
-                    filefl2 = np.where(xe1[1] >= self.fl2_FTbg, True, False)
-                    filefl3 = np.where(xe2[1] >= self.fl3_FTbg, True, False)
-                    
-                    if firstfile:
-                        self.timehandler = th.astype(np.uint32)
-                        self.rawdata["size"] = filecounts
-                        self.rawdata["excited"] = file_excited
-                        self.rawdata["Fl1"] = filefl1
-                        self.rawdata["Fl2"] = filefl2
-                        self.rawdata["Fl3"] = filefl3
-                        firstfile = False
-                    else:
-                        self.timehandler = np.append(self.timehandler,th).astype(np.uint32)
-                        self.rawdata["size"] = np.append(self.rawdata["size"],filecounts)
-                        self.rawdata["excited"] = np.append(self.rawdata["excited"],file_excited)
-                        self.rawdata["Fl1"] = np.append(self.rawdata["Fl1"],filefl1)
-                        self.rawdata["Fl2"] = np.append(self.rawdata["Fl2"],filefl2)
-                        self.rawdata["Fl3"] = np.append(self.rawdata["Fl3"],filefl3)
-               
-             
+            #crop borders in uncorrected wibs seconds
+            corr = int(timecorr.total_seconds())
+            lower,upper = None,None
             if isinstance(self.start,str):
                 starttime = datetime.strptime(f"{self.FT_date}-{self.start}/+0000","%d.%m.%Y-%H:%M:%S/%z")
-                starttime = int(starttime.replace(year=int(self.FT_date[-4:])).timestamp())
-                if int(timecorr.total_seconds()) >= 0:
-                    start_m = np.where((self.timehandler + int(timecorr.total_seconds())) > starttime, True, False)
-                else:
-                    offset = abs(int(timecorr.total_seconds()))
-                    start_m = np.where((self.timehandler - offset) > starttime, True, False)
-                self.timehandler = self.timehandler[start_m]
-                self.rawdata["size"] = self.rawdata["size"][start_m]
-                self.rawdata["excited"] = self.rawdata["excited"][start_m]
-                self.rawdata["Fl1"] = self.rawdata["Fl1"][start_m]
-                self.rawdata["Fl2"] = self.rawdata["Fl2"][start_m]
-                self.rawdata["Fl3"] = self.rawdata["Fl3"][start_m]
-                del start_m
+                lower = int(starttime.replace(year=int(self.FT_date[-4:])).timestamp()) - corr
             if isinstance(self.end,str):
                 endtime = datetime.strptime(f"{self.FT_date}-{self.end}/+0000","%d.%m.%Y-%H:%M:%S/%z")
-                endtime = int(endtime.replace(year=int(self.FT_date[-4:])).timestamp())
-                if int(timecorr.total_seconds()) >= 0:
-                    end_m = np.where((self.timehandler + int(timecorr.total_seconds())) < endtime,True,False)
-                else:
-                    offset = abs(int(timecorr.total_seconds()))
-                    end_m = np.where((self.timehandler - offset) < endtime,True,False)
-                    print(self.timehandler[0] - offset)
-                    print(endtime)
-                self.timehandler = self.timehandler[end_m] 
-                self.rawdata["size"] = self.rawdata["size"][end_m]
-                self.rawdata["excited"] = self.rawdata["excited"][end_m]
-                self.rawdata["Fl1"] = self.rawdata["Fl1"][end_m]
-                self.rawdata["Fl2"] = self.rawdata["Fl2"][end_m]
-                self.rawdata["Fl3"] = self.rawdata["Fl3"][end_m]
-                del end_m
-    
-                
-            #process data
-            self.data["t"] = np.array([datetime.utcfromtimestamp(timestamp) for timestamp in range(self.timehandler[0],self.timehandler[-1])]) + timecorr
-            self.date = [self.data["t"][0].day,self.data["t"][0].month,self.data["t"][0].year]
-            time_mask = np.array([np.where(self.timehandler==i,True,False) for i in range(self.timehandler[0],self.timehandler[-1])])
-                    
-            #part_conc & #/s
-            for bin_no in range(self.bins):
-                m = np.where(self.bin_borders[bin_no] < self.rawdata["size"],True,False)
-                m = np.where(self.bin_borders[bin_no+1] > self.rawdata["size"],m,False)
-                bin_handler = time_mask & m
-                self.data[f"bin{bin_no}_cps"] = np.array([np.count_nonzero(arr) for arr in bin_handler])
-                del bin_handler
-                self.data[f"bin{bin_no}_partconc"] = self.data[f"bin{bin_no}_cps"] / self.flow
-                self.details[f"bin{bin_no}_partconc"] = [f"Particle Conc. (bin{bin_no}) ","#/cm${}^3$"]
-                self.details[f"bin{bin_no}_cps"] = [f"Particle Counts (Bin{bin_no})","#/s"]
-                
-            #dndlogdp
-            for bin_no in range(self.bins):
-                log_binwidth = np.log10(self.bin_borders[bin_no+1])-np.log10(self.bin_borders[bin_no])
-                self.data[f"bin{bin_no}_dndlogdp"] = self.data[f"bin{bin_no}_partconc"] / log_binwidth
-                self.details[f"bin{bin_no}_dndlogdp"] = [f"dN/dlog$D_P$ (Bin{bin_no})","$\mu$m${}^{-1}$"]
-                
-            #total
-            self.data["total_cps"] = np.array([np.count_nonzero(arr) for arr in time_mask])
-            self.data["total_partconc"] = self.data["total_cps"] / self.flow
-            self.details["total_cps"] = ["Particle Counts","#/s"]
-            self.details["total_partconc"] = ["Particle Conc.","#/cm${}^3$"]
-            
+                upper = int(endtime.replace(year=int(self.FT_date[-4:])).timestamp()) - corr
+            files = [file] if isinstance(file,str) else file
             
-            #excited
-            ex_handler = time_mask & self.rawdata["excited"]
-            self.data["excited"] = np.array([np.count_nonzero(arr) for arr in ex_handler])
-            del ex_handler
-            self.data["excited_fraction"] = np.divide(self.data["excited"],self.data["total_cps"],out=np.ones(self.data["excited"].shape,dtype=float),where=self.data["total_cps"]!=0)
-            self.details["excited"] = ["Particle Counts (excited)","#/s"]
-            self.details["excited_fraction"] = ["Fraction of excited Particles", "No Unit"]
+            #first pass (only 'Seconds'): first and last second of the measurement and seconds covered by every file
+            with self.profiler.stage("time range"):
+                t0,t_last = None,None
+                fileranges = []
+                for ff in files:
+                    lo,hi = None,None
+                    for chunk in self.hk_readchunks([ff],lower,upper,[],"read seconds"):
+                        th = chunk["Seconds"]
+                        if len(th) > 0:
+                            if t0 is None:
+                                t0 = int(th[0])
+                            t_last = int(th[-1])
+                            lo = int(th.min()) if lo is None else min(lo,int(th.min()))
+                            hi = int(th.max()) if hi is None else max(hi,int(th.max()))
+                    fileranges.append((lo,hi))
+                if t0 is None:
+                    raise ValueError(f"No particles between start ({self.start}) and end ({self.end}) in {files}")
+                n_secs = t_last - t0
+                windows = [(max(lo-t0,0),max(min(hi-t0+1,n_secs),0)) if lo is not None else (0,0) for lo,hi in fileranges]
             
-            
-            #fluorescence channels
-            fl1_handler = time_mask & self.rawdata["Fl1"]
-            fl2_handler = time_mask & self.rawdata["Fl2"]
-            fl3_handler = time_mask & self.rawdata["Fl3"]
-            
-            self.data["fl1"] = np.array([np.count_nonzero(arr) for arr in fl1_handler])/self.data["excited_fraction"]
-            self.data["fl2"] = np.array([np.count_nonzero(arr) for arr in fl2_handler])/self.data["excited_fraction"]
-            self.data["fl3"] = np.array([np.count_nonzero(arr) for arr in fl3_handler])/self.data["excited_fraction"]
-            self.data["fl1_fraction"] = np.divide(self.data["fl1"],self.data["total_cps"],out=np.zeros(self.data["fl1"].shape,dtype=float),where=self.data["total_cps"]!=0)
-            self.data["fl2_fraction"] = np.divide(self.data["fl2"],self.data["total_cps"],out=np.zeros(self.data["fl2"].shape,dtype=float),where=self.data["total_cps"]!=0)
-            self.data["fl3_fraction"] = np.divide(self.data["fl3"],self.data["total_cps"],out=np.zeros(self.data["fl3"].shape,dtype=float),where=self.data["total_cps"]!=0)
-            for i in [1,2,3]:
-                self.details[f"fl{i}"] = [f"Particle Counts (Fl{i})","#/s"]
-                self.details[f"fl{i}_fraction"] = [f"Fluorescent Fraction (Fl{i})", "No Unit"]
-            
-            def createmask(a,b,c,string):
-                a = a if "a" in string else ~a
-                b = b if "b" in string else ~b
-                c = c if "c" in string else ~c
+            #second pass: count every file into per-second aggregates of its own window (in worker processes if workers is given) and merge them
+            args = [files,[t0+a for a,b in windows],[max(b-a,0) for a,b in windows],[lower]*len(files),[upper]*len(files)]
+            with self.profiler.stage("count files") as stage:
+                counts = self.hk_countparticles(np.empty(0,np.int64),n_secs,self.hk_emptyrawdata())
+                rawparts = []
+                if self.workers is None:
+                    results = map(self.hk_loadfile,*args)
+                    self.hk_mergecounts(counts,rawparts,windows,results)
+                else:
+                    with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                        results = pool.map(self.hk_loadfile,*args)
+                        self.hk_mergecounts(counts,rawparts,windows,results)
+                if self.keeprawdata:
+                    for key in self.hk_emptyrawdata():
+                        self.rawdata[key] = np.concatenate([part[key] for part in rawparts])
+                    del rawparts
+                stage["rows"] = int(counts["codes"].sum())
                 
-                op = a&b
-                return op&c
-            
-            for channel in self.channels:
-                channel_mask = createmask(fl1_handler,fl2_handler,fl3_handler,channel)
-                for bin_no in range(self.bins):
-                    m =np.where(self.bin_borders[bin_no] < self.rawdata["size"],True,False)
-                    m = np.where(self.bin_borders[bin_no+1] > self.rawdata["size"],m,False)
-                    m = channel_mask & m
-                    self.data[f"{channel}_bin{bin_no}_cps"] = np.array([np.count_nonzero(arr) for arr in m])
-                    del m
-                    self.data[f"{channel}_bin{bin_no}_partconc"] = self.data[f"{channel}_bin{bin_no}_cps"] / self.flow
-                    self.details[f"{channel}_bin{bin_no}_partconc"] = [f"Particle Conc. of {channel}-Particles (bin{bin_no}) ","#/cm${}^3$"]
-                    self.details[f"{channel}_bin{bin_no}_cps"] = [f"Particle Counts of {channel}-Particles (Bin{bin_no})","#/s"]
-                    
-                    log_binwidth = np.log10(self.bin_borders[bin_no+1])-np.log10(self.bin_borders[bin_no])
-                    self.data[f"{channel}_bin{bin_no}_dndlogdp"] = self.data[f"{channel}_bin{bin_no}_partconc"] / log_binwidth
-                    self.details[f"{channel}_bin{bin_no}_dndlogdp"] = [f"dN/dlog$D_P$ of {channel}-Particles (Bin{bin_no})","$\mu$m${}^{-1}$"]
-                   
-                del channel_mask
-                self.data[f"{channel}_total_cps"] = np.sum([self.data[f"{channel}_bin{i}_cps"] for i in range(self.bins)],axis=0)
-                self.data[f"{channel}_total_partconc"] = self.data[f"{channel}_total_cps"] / self.flow
-                self.data[f"{channel}_fraction"] = np.divide(self.data[f"{channel}_total_cps"],self.data["total_cps"],out=np.zeros(self.data[f"{channel}_total_cps"].shape,dtype=float),where=self.data["total_cps"]!=0)
-                self.details[f"{channel}_total_cps"] = [f"Particle Counts of {channel}-Particles","#/s"]
-                self.details[f"{channel}_total_partconc"] = [f"Particle Conc. of {channel}-Particles","#/cm${}^3$"]
-                self.details[f"{channel}_fraction"] = [f"Fluorescent Fraction ({channel})", "No Unit"]
+            #process data
+            with self.profiler.stage("process") as stage:
+                self.data["t"] = (np.arange(t0,t0+n_secs).astype("datetime64[s]") + np.timedelta64(timecorr)).astype(object)
+                self.date = [self.data["t"][0].day,self.data["t"][0].month,self.data["t"][0].year]
+                self.hk_processcounts(counts)
+                stage["rows"] = n_secs
                 
-            del self.timehandler
             del self.start
             del self.end
             del self.FT_date
@@ -497,6 +405,8 @@ class WIBS:
             Changes the color of the plot. The default is 'tab:purple'.
         secondary : bool, optional
             If True, the plot will draw the axis on the right-hand side. Should be used if the given ax is a twinx(). The default is False.
+        decimate : bool or str, optional
+            If True or "minmax", only the first, min, max and last value of every pixel column of ax are drawn ("lttb": one value per pixel column, see decimation.fitpixels), which speeds up plots of long series. The default is False.
         
         Returns
         -------
@@ -506,7 +416,8 @@ class WIBS:
 
         defaults = {"label" : "no label",
                     "color" : "tab:purple",
-                    "secondary" : False}
+                    "secondary" : False,
+                    "decimate" : False}
         for key,default in defaults.items():
             kwargs[key] = self.hk_func_kwargs(kwargs, key, default)
         self.hk_errorhandling(kwargs, defaults.keys(), "WIBS.plot()")
@@ -520,7 +431,7 @@ class WIBS:
         ylabel = f"{self.details[y][0]} in {self.details[y][1]}" if self.details[y][1] != "No Unit" else self.details[y][0]
             
         #draw plot
-        ax.plot(xx,yy,label=kwargs["label"],color=kwargs["color"])
+        ax.plot(*fitpixels(ax,xx,yy,kwargs["decimate"]),label=kwargs["label"],color=kwargs["color"])
         
         ax.set_xlabel("CET")
         ax.set_ylabel(ylabel)
@@ -536,7 +447,7 @@ class WIBS:
             
     def save(self, path):
         """
-        Saves the obj as a preprocessed .wibs file
+        Saves the obj as a preprocessed .wibs file (columnar cache folder, see cachefile.py)
 
         Parameters
         ----------
@@ -563,10 +474,10 @@ class WIBS:
             }
         
         if path[-5:] != ".wibs":
-            path.append(".wibs")
+            path += ".wibs"
           
-        with open(path,"wb") as dumppath:
-            pickle.dump(op,dumppath,4)
+        with self.profiler.stage("save cache","save"):
+            savecache(path,op)
 
     
     #housekeeping funcs
@@ -591,3 +502,183 @@ class WIBS:
         for key in kwargs:
             if key not in legallist:
                 raise IllegalArgument(key,funcname,legallist)
+
+
+
+    def hk_countparticles(self,sec,n_secs,rawdata):
+        """Counts particles per fluorescence code, bin and second in one grouped count (all channels are derived from it in hk_processcounts)"""
+
+        in_range = (sec >= 0) & (sec < n_secs)
+        sec = sec[in_range]
+        size = rawdata["size"][in_range]
+        
+        #bin index of every particle (bin_borders[i] < size < bin_borders[i+1]), particles outside of all bins get the extra index self.bins
+        borders = np.asarray(self.bin_borders,float)
+        bin_idx = np.searchsorted(borders,size,side="left") - 1
+        binned = (bin_idx >= 0) & (bin_idx < self.bins)
+        binned[binned] = size[binned] < borders[bin_idx[binned]+1]
+        bin_idx[~binned] = self.bins
+        
+        #3-bit fluorescence code of every particle
+        code = self.hk_flcode(rawdata["Fl1"][in_range],rawdata["Fl2"][in_range],rawdata["Fl3"][in_range])
+        
+        #one histogram over (code,bin,second)
+        key = (code*(self.bins+1) + bin_idx)*n_secs + sec
+        counts = {"codes" : np.bincount(key,minlength=8*(self.bins+1)*n_secs).reshape(8,self.bins+1,n_secs),
+                  "excited" : np.bincount(sec[rawdata["excited"][in_range]],minlength=n_secs)}
+            
+        return counts
+    
+    
+    def hk_flcode(self,fl1,fl2,fl3):
+        """Packs the fluorescence flags of every particle into one code (Fl1: bit 0, Fl2: bit 1, Fl3: bit 2)"""
+        
+        return fl1.astype(np.int64) | (fl2.astype(np.int64) << 1) | (fl3.astype(np.int64) << 2)
+    
+    
+    def hk_channelcode(self,channel):
+        """Returns the fluorescence code of a channel (eg. "ac": Fl1 and Fl3 but not Fl2)"""
+        
+        return sum(bit for letter,bit in zip("abc",[1,2,4]) if letter in channel)
+    
+    
+    def hk_readchunks(self,files,lower,upper,names,stagename="read h5"):
+        """Reads 'Seconds' and the given datasets of all files in slices of chunksize particles and only keeps particles with lower < Seconds < upper (reading is profiled as stagename)"""
+        
+        for ff in files:
+            try:
+                f = h5py.File(ff,"r")
+            except Exception as exc:
+                raise FileNotFoundError(f"Cant find file at given path ({ff})") from exc
+            with f:
+                f3 = f["NEO"]["ParticleData"]
+                n = len(f3["Seconds"])
+                for a in range(0,n,self.chunksize):
+                    with self.profiler.stage(stagename) as stage:
+                        th = f3["Seconds"][a:a+self.chunksize].astype(np.uint32).astype(np.int64)
+                        m = np.full(len(th),True)
+                        if lower is not None:
+                            m &= th > lower
+                        if upper is not None:
+                            m &= th < upper
+                        chunk = {"Seconds" : th[m]}
+                        for name in names:
+                            chunk[name] = f3[name][a:a+self.chunksize][m]
+                        stage["rows"] = len(th)
+                    yield chunk
+                    
+                    
+    def hk_addcounts(self,counts,sec,n_secs,rawdata):
+        """Counts the particles of one chunk (only over the seconds it covers) and adds them to counts"""
+        
+        sec = np.asarray(sec,np.int64)
+        if len(sec) == 0:
+            return
+        lo = max(int(sec.min()),0)
+        hi = min(int(sec.max())+1,n_secs)
+        if hi <= lo:
+            return
+        chunkcounts = self.hk_countparticles(sec-lo,hi-lo,rawdata)
+        for key,val in chunkcounts.items():
+            counts[key][...,lo:hi] += val
+    
+    
+    def hk_emptyrawdata(self):
+        """Returns empty rawdata arrays with the correct dtypes"""
+        
+        return {"size" : np.empty(0)} | {key : np.empty(0,bool) for key in ["excited","Fl1","Fl2","Fl3"]}
+    
+    
+    def hk_loadfile(self,ff,start,n_secs,lower,upper):
+        """Reads one .h5 file chunk by chunk, applies the FT thresholds and counts all particles into n_secs seconds after start (runs in a worker process if workers is given)"""
+        
+        names = ["Size_um","Flag_Excited","Xe1_FluorPeak","Xe2_FluorPeak"]
+        empty = self.hk_emptyrawdata()
+        counts = self.hk_countparticles(np.empty(0,np.int64),n_secs,empty)
+        rawchunks = []
+        for chunk in self.hk_readchunks([ff],lower,upper,names):
+            with self.profiler.stage("FL threshold") as stage:
+                rawchunk = {"size" : chunk["Size_um"],
+                            "excited" : chunk["Flag_Excited"].astype(bool),
+                            "Fl1" : chunk["Xe1_FluorPeak"][:,0] >= self.fl1_FTbg,
+                            "Fl2" : chunk["Xe1_FluorPeak"][:,1] >= self.fl2_FTbg,
+                            "Fl3" : chunk["Xe2_FluorPeak"][:,1] >= self.fl3_FTbg}
+                stage["rows"] = len(chunk["Seconds"])
+            with self.profiler.stage("channel bins") as stage:
+                self.hk_addcounts(counts,chunk["Seconds"]-start,n_secs,rawchunk)
+                stage["rows"] = len(chunk["Seconds"])
+            if self.keeprawdata:
+                rawchunks.append(rawchunk)
+        rawdata = {key : np.concatenate([val]+[rawchunk[key] for rawchunk in rawchunks]) for key,val in empty.items()} if self.keeprawdata else None
+        return counts,rawdata
+    
+    
+    def hk_mergecounts(self,counts,rawparts,windows,results):
+        """Adds the per-file counts (returned by hk_loadfile) to counts at the window of their file"""
+        
+        for (lo,hi),(filecounts,rawdata) in zip(windows,results):
+            for key,val in filecounts.items():
+                counts[key][...,lo:hi] += val
+            if self.keeprawdata:
+                rawparts.append(rawdata)
+    
+    
+    def hk_processcounts(self,counts):
+        """Calculates all processed data from the counts produced by hk_countparticles"""
+        
+        #every series is a sum over slices of the (code,bin,second) histogram (the last bin holds particles outside of all bins)
+        codes = counts["codes"]
+        binned = codes[:,:self.bins].sum(axis=0)
+        
+        #part_conc & #/s
+        for bin_no in range(self.bins):
+            self.data[f"bin{bin_no}_cps"] = binned[bin_no]
+            self.data[f"bin{bin_no}_partconc"] = self.data[f"bin{bin_no}_cps"] / self.flow
+            self.details[f"bin{bin_no}_partconc"] = [f"Particle Conc. (bin{bin_no}) ","#/cm${}^3$"]
+            self.details[f"bin{bin_no}_cps"] = [f"Particle Counts (Bin{bin_no})","#/s"]
+            
+        #dndlogdp
+        for bin_no in range(self.bins):
+            log_binwidth = np.log10(self.bin_borders[bin_no+1])-np.log10(self.bin_borders[bin_no])
+            self.data[f"bin{bin_no}_dndlogdp"] = self.data[f"bin{bin_no}_partconc"] / log_binwidth
+            self.details[f"bin{bin_no}_dndlogdp"] = [f"dN/dlog$D_P$ (Bin{bin_no})","$\mu$m${}^{-1}$"]
+            
+        #total
+        self.data["total_cps"] = codes.sum(axis=(0,1))
+        self.data["total_partconc"] = self.data["total_cps"] / self.flow
+        self.details["total_cps"] = ["Particle Counts","#/s"]
+        self.details["total_partconc"] = ["Particle Conc.","#/cm${}^3$"]
+        
+        #excited
+        self.data["excited"] = counts["excited"]
+        self.data["excited_fraction"] = np.divide(self.data["excited"],self.data["total_cps"],out=np.ones(self.data["excited"].shape,dtype=float),where=self.data["total_cps"]!=0)
+        self.details["excited"] = ["Particle Counts (excited)","#/s"]
+        self.details["excited_fraction"] = ["Fraction of excited Particles", "No Unit"]
+        
+        #fluorescence channels
+        for i in [1,2,3]:
+            self.data[f"fl{i}"] = codes[[code for code in range(8) if code & 1 << (i-1)]].sum(axis=(0,1))/self.data["excited_fraction"]
+        for i in [1,2,3]:
+            self.data[f"fl{i}_fraction"] = np.divide(self.data[f"fl{i}"],self.data["total_cps"],out=np.zeros(self.data[f"fl{i}"].shape,dtype=float),where=self.data["total_cps"]!=0)
+        for i in [1,2,3]:
+            self.details[f"fl{i}"] = [f"Particle Counts (Fl{i})","#/s"]
+            self.details[f"fl{i}_fraction"] = [f"Fluorescent Fraction (Fl{i})", "No Unit"]
+        
+        for channel in self.channels:
+            channelcounts = codes[self.hk_channelcode(channel),:self.bins]
+            for bin_no in range(self.bins):
+                self.data[f"{channel}_bin{bin_no}_cps"] = channelcounts[bin_no]
+                self.data[f"{channel}_bin{bin_no}_partconc"] = self.data[f"{channel}_bin{bin_no}_cps"] / self.flow
+                self.details[f"{channel}_bin{bin_no}_partconc"] = [f"Particle Conc. of {channel}-Particles (bin{bin_no}) ","#/cm${}^3$"]
+                self.details[f"{channel}_bin{bin_no}_cps"] = [f"Particle Counts of {channel}-Particles (Bin{bin_no})","#/s"]
+                
+                log_binwidth = np.log10(self.bin_borders[bin_no+1])-np.log10(self.bin_borders[bin_no])
+                self.data[f"{channel}_bin{bin_no}_dndlogdp"] = self.data[f"{channel}_bin{bin_no}_partconc"] / log_binwidth
+                self.details[f"{channel}_bin{bin_no}_dndlogdp"] = [f"dN/dlog$D_P$ of {channel}-Particles (Bin{bin_no})","$\mu$m${}^{-1}$"]
+               
+            self.data[f"{channel}_total_cps"] = np.sum(channelcounts,axis=0)
+            self.data[f"{channel}_total_partconc"] = self.data[f"{channel}_total_cps"] / self.flow
+            self.data[f"{channel}_fraction"] = np.divide(self.data[f"{channel}_total_cps"],self.data["total_cps"],out=np.zeros(self.data[f"{channel}_total_cps"].shape,dtype=float),where=self.data["total_cps"]!=0)
+            self.details[f"{channel}_total_cps"] = [f"Particle Counts of {channel}-Particles","#/s"]
+            self.details[f"{channel}_total_partconc"] = [f"Particle Conc. of {channel}-Particles","#/cm${}^3$"]
+            self.details[f"{channel}_fraction"] = [f"Fluorescent Fraction ({channel})", "No Unit"]
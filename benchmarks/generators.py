@@ -0,0 +1,556 @@
+# -*- coding: utf-8 -*-
+"""
+Deterministic generators of synthetic instrument files (same seed and duration -> same file)
+
+Every generator writes a file in the format the corresponding agg_dim class reads and can be scaled
+from minutes to days by its duration. Long files are written in chunks of one hour, so memory stays constant.
+"""
+
+import csv
+import datetime as dt
+import os
+import numpy as np
+
+popslayouts = {"desktopmode" : {"ncols" : 49, "bins" : list(range(33,49)), "ydata" : [], "ydata2" : [5,20,11], "popstime" : 1, "t" : -1, "flow" : 15},
+               "box_pallnsdorfer" : {"ncols" : 72, "bins" : list(range(56,72)), "ydata" : [2,3,11,10,4,5,6,7,8,9,12,13,14,15], "ydata2" : [28,43,34], "popstime" : 23, "t" : 1, "flow" : 38},
+               "FlyingFlo2.0" : {"ncols" : 52, "bins" : list(range(36,52)), "ydata" : [], "ydata2" : [8,23,14], "popstime" : 3, "t" : 1, "flow" : 18}}
+opcbins = [0.253,0.298,0.352,0.414,0.488,0.576,0.679,0.8,0.943,1.112,1.31,1.545,1.821,2.146,2.53,2.982,3.515,4.144,4.884,5.757,6.787,8,9.43,11.12,13.1,15.45,18.21,21.46,25.3,29.82,35.15]
+chunk = 3600
+
+
+def toseconds(duration):
+    """
+    Turns a duration into seconds
+
+    Parameters
+    ----------
+    duration : int, float or str
+        Seconds or a str like '90s', '10min', '2h' or '1d'.
+
+    Returns
+    -------
+    int
+        Duration in seconds.
+
+    """
+
+    units = {"s" : 1, "min" : 60, "h" : 3600, "d" : 86400}
+    if isinstance(duration,str):
+        number = duration.rstrip("abcdefghijklmnopqrstuvwxyz")
+        unit = duration[len(number):] or "s"
+        if unit not in units:
+            raise ValueError(f"unknown unit {unit} (legal units: {', '.join(units)})")
+        return int(round(float(number or 1) * units[unit]))
+    return int(round(duration))
+
+
+def popscsv(path,duration="1h",layout="FlyingFlo2.0",start="2025-06-01 10:00:00",seed=0):
+    """
+    Writes a POPS csv-file (1 Hz) in one of the layouts of Pops
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+    duration : int, float or str, optional
+        Length of the measurement (see toseconds). The default is "1h".
+    layout : str, optional
+        "desktopmode", "box_pallnsdorfer" or "FlyingFlo2.0". The default is "FlyingFlo2.0".
+    start : str, optional
+        Timestamp of the first row (local time). The default is "2025-06-01 10:00:00".
+    seed : int, optional
+        Seed of the random numbers. The default is 0.
+
+    Returns
+    -------
+    int
+        Number of data rows.
+
+    """
+
+    lay = popslayouts[layout]
+    rng = np.random.default_rng(seed)
+    n = toseconds(duration)
+    t0 = np.datetime64(start,"s")
+    utc = t0 - np.timedelta64(2,"h") #popstime is logged in UTC (Pops corrects it by 2 h in summertime)
+    binmeans = 40 * np.exp(-0.35*np.arange(16))
+    with open(path,"w",newline="") as f:
+        f.write(",".join(["DateTime"] + [f"col{i}" for i in range(1,lay["ncols"])]) + "\n")
+        for a in range(0,n,chunk):
+            m = min(chunk,n-a)
+            secs = np.arange(a,a+m)
+            t = t0 + secs.astype("timedelta64[s]")
+            cols = np.zeros((lay["ncols"],m))
+            counts = rng.poisson(binmeans[:,None] * (1 + 0.5*np.sin(secs/900.0))[None,:])
+            cols[lay["bins"]] = counts
+            flow = 3.0 + 0.02*rng.standard_normal(m)
+            cols[lay["flow"]] = flow
+            cols[lay["popstime"]] = (utc + secs.astype("timedelta64[s]")).astype(np.int64) % 86400 + 0.25 #seconds of the day
+            cols[lay["ydata2"]] = np.vstack([counts.sum(axis=0)/flow,
+                                             30 + hk_walk(rng,m,0.01),
+                                             35 + hk_walk(rng,m,0.01)])
+            for col in lay["ydata"]:
+                cols[col] = 20 + hk_walk(rng,m,0.05)
+            text = hk_format(cols,"%.3f")
+            text[0] = np.datetime_as_string(t,unit="s").astype("U19")
+            if lay["t"] >= 0:
+                text[lay["t"]] = hk_timeofday(t,"s")
+            hk_writerows(f,text,",")
+    return n
+
+
+def fspeccsv(path,duration="10min",frequency=100,start="2025-06-01 10:00:00",seed=0,artifacts=True):
+    """
+    Writes a FSpec csv-file (19 fields separated by ';', 16 channels) for FData and NewFData
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+    duration : int, float or str, optional
+        Length of the measurement (see toseconds). The default is "10min".
+    frequency : int, optional
+        Rows per second. The default is 100.
+    start : str, optional
+        Timestamp of the first row. The default is "2025-06-01 10:00:00".
+    seed : int, optional
+        Seed of the random numbers. The default is 0.
+    artifacts : bool, optional
+        If True, NUL-bytes and malformed rows are sprinkled in like in real files. The default is True.
+
+    Returns
+    -------
+    int
+        Number of data rows.
+
+    """
+
+    rng = np.random.default_rng(seed)
+    n = toseconds(duration) * frequency
+    t0 = np.datetime64(start,"us")
+    step = 1000000 // frequency
+    with open(path,"wb") as f:
+        f.write((";".join(["Nr","Time","Info"] + [f"Ch{i}" for i in range(1,17)]) + "\n").encode())
+        for a in range(0,n,chunk*frequency):
+            m = min(chunk*frequency,n-a)
+            idx = np.arange(a,a+m)
+            t = t0 + (idx*step).astype("timedelta64[us]")
+            channels = 1000 + 20 + rng.poisson(5,(16,m))
+            peaks = rng.random(m) < 0.02
+            channels[:,peaks] += rng.poisson(200,(16,int(peaks.sum())))
+            text = np.vstack([idx.astype("U"),hk_timeofday(t,"us"),np.full(m,"0"),channels.astype("U")])
+            lines = [";".join(row) for row in zip(*text)]
+            if artifacts:
+                for i in np.flatnonzero(rng.random(m) < 0.0005):
+                    lines[i] = lines[i].replace(";","\x00;",1) if i % 2 else lines[i].rsplit(";",3)[0]
+            f.write(("\n".join(lines) + "\n").encode())
+    return n
+
+
+def wibsh5(path,ftpath,duration="10min",rate=50,start="2025-06-01 10:00:00",seed=0):
+    """
+    Writes a WIBS .h5 file and its forced trigger file (NEO/ParticleData, needs h5py)
+
+    Parameters
+    ----------
+    path : str
+        Path of the particle file.
+    ftpath : str
+        Path of the forced trigger file (60 s which end 10 s before start).
+    duration : int, float or str, optional
+        Length of the measurement (see toseconds). The default is "10min".
+    rate : float, optional
+        Mean number of particles per second. The default is 50.
+    start : str, optional
+        Timestamp of the first particle (UTC). The default is "2025-06-01 10:00:00".
+    seed : int, optional
+        Seed of the random numbers. The default is 0.
+
+    Returns
+    -------
+    dict
+        Contains the number of particles and the kwargs FT_time and FT_date that belong to the files.
+
+    """
+
+    import h5py
+
+    rng = np.random.default_rng(seed)
+    n = toseconds(duration)
+    t0 = int(np.datetime64(start,"s").astype(np.int64))
+    ft0 = t0 - 70
+    total = 0
+    with h5py.File(ftpath,"w") as f:
+        ftsecs = np.repeat(np.arange(ft0,ft0+60),10).astype(np.uint32)
+        hk_wibsparticles(f,[ftsecs],rng,forcedtrigger=True)
+    with h5py.File(path,"w") as f:
+        def secs():
+            for a in range(0,n,chunk):
+                m = min(chunk,n-a)
+                per = rng.poisson(rate,m)
+                yield np.repeat(np.arange(t0+a,t0+a+m),per).astype(np.uint32)
+        total = hk_wibsparticles(f,secs(),rng)
+    ftstart = dt.datetime.fromtimestamp(ft0,tz=dt.timezone.utc)
+    return {"particles" : total, "FT_time" : ftstart.strftime("%H:%M:%S"), "FT_date" : ftstart.strftime("%d.%m.%Y")}
+
+
+def opcdat(prefix,duration="1h",interval=6,start="2025-06-01 10:00:00",seed=0):
+    """
+    Writes the C, M and dM .dat files of an OPC measurement (prefix-C.dat, prefix-M.dat, prefix-dM.dat)
+
+    Parameters
+    ----------
+    prefix : str
+        Path of the files without '-C.dat'.
+    duration : int, float or str, optional
+        Length of the measurement (see toseconds). The default is "1h".
+    interval : int, optional
+        Seconds between two rows. The default is 6.
+    start : str, optional
+        Timestamp of the first row. The default is "2025-06-01 10:00:00".
+    seed : int, optional
+        Seed of the random numbers. The default is 0.
+
+    Returns
+    -------
+    str
+        Path of the C.dat file (pass it as file to OPC).
+
+    """
+
+    rng = np.random.default_rng(seed)
+    n = toseconds(duration) // interval
+    t0 = np.datetime64(start,"s")
+    bins = np.array(opcbins)
+    massperparticle = np.pi/6 * bins**3 * 1.65e-3 #ug per particle with 1.65 g/cm3
+    files = {kind : open(f"{prefix}-{kind}.dat","w",newline="") for kind in ["C","M","dM"]}
+    headers = {"C" : ["Date/Time"] + [f"{b:.3f} um".replace(".",",") for b in opcbins],
+               "M" : ["Date/Time"] + [f"{pm} [ug/m3]" for pm in ["PM1","PM2.5","PM4","PM10","PMtotal"]],
+               "dM" : ["Date/Time"] + [f"{b:.3f} um".replace(".",",") for b in opcbins]}
+    try:
+        for kind,f in files.items():
+            f.writelines([f"# synthetic OPC file ({kind})\n"] + [f"# header line {i}\n" for i in range(13)])
+            f.write("\t".join(headers[kind]) + "\n")
+        for a in range(0,n,chunk):
+            m = min(chunk,n-a)
+            t = t0 + (np.arange(a,a+m)*interval).astype("timedelta64[s]")
+            stamps = [stamp.strftime("%d.%m.%Y %H:%M:%S") for stamp in t.astype(object)]
+            conc = rng.poisson(1e5 * np.exp(-0.3*np.arange(len(bins)))[:,None] * np.ones(m)).astype(float) #counts/l
+            dmass = conc / 1000 * massperparticle[:,None] * 1e6
+            cumulative = np.cumsum(dmass,axis=0)
+            pms = np.vstack([cumulative[np.searchsorted(bins,d)-1] for d in [1,2.5,4,10]] + [cumulative[-1]])
+            for kind,values in [("C",conc),("M",pms),("dM",dmass)]:
+                text = hk_format(values,"%.2f")
+                text = np.char.replace(text,".",",")
+                hk_writerows(files[kind],np.vstack([stamps,text]),"\t")
+    finally:
+        for f in files.values():
+            f.close()
+    return f"{prefix}-C.dat"
+
+
+def bladescapescsv(path,duration="20min",frequency=10,start="2025-06-01 10:00:00",seed=0):
+    """
+    Writes a BladeScapes drone log (DroneWrapper with dronetype="BladeScapes")
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+    duration : int, float or str, optional
+        Length of the flight (see toseconds). The default is "20min".
+    frequency : int, optional
+        Rows per second. The default is 10.
+    start : str, optional
+        Timestamp of the first row. The default is "2025-06-01 10:00:00".
+    seed : int, optional
+        Seed of the random numbers. The default is 0.
+
+    Returns
+    -------
+    int
+        Number of data rows.
+
+    """
+
+    rng = np.random.default_rng(seed)
+    n = toseconds(duration) * frequency
+    t0 = np.datetime64(start,"ms")
+    step = 1000 // frequency
+    with open(path,"w",newline="") as f:
+        f.write(",".join(["Nr","Timestamp"] + [f"col{i}" for i in range(2,10)] + ["Latitude","Longitude","Altitude"] + [f"col{i}" for i in range(13,16)]) + "\n")
+        for a in range(0,n,chunk*frequency):
+            m = min(chunk*frequency,n-a)
+            idx = np.arange(a,a+m)
+            t = t0 + (idx*step).astype("timedelta64[ms]")
+            stamps = np.char.replace(np.datetime_as_string(t,unit="ms").astype("U23"),"-",".")
+            stamps = np.char.replace(stamps,"T"," ")
+            lat,long,alt = hk_flightpath(idx/frequency,rng)
+            cols = np.zeros((16,m))
+            cols[10],cols[11],cols[12] = lat,long,alt + 350
+            text = hk_format(cols,"%.7f")
+            text[0] = idx.astype("U")
+            text[1] = stamps
+            hk_writerows(f,text,",")
+    return n
+
+
+def owncsv(path,duration="20min",frequency=10,start="2025-06-01 10:00:00",seed=0):
+    """
+    Writes a drone log of the own drone (Dronedata and DroneWrapper with dronetype="Own"; decimal commas, 193 columns)
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+    duration : int, float or str, optional
+        Length of the flight (see toseconds). The default is "20min".
+    frequency : int, optional
+        Rows per second. The default is 10.
+    start : str, optional
+        Timestamp of the first row. The default is "2025-06-01 10:00:00".
+    seed : int, optional
+        Seed of the random numbers. The default is 0.
+
+    Returns
+    -------
+    int
+        Number of data rows.
+
+    """
+
+    rng = np.random.default_rng(seed)
+    n = toseconds(duration) * frequency
+    t0 = np.datetime64(start,"ms")
+    step = 1000 // frequency
+    with open(path,"w",newline="") as f:
+        writer = csv.writer(f,delimiter=",")
+        writer.writerow(["Nr","Time"] + [f"col{i}" for i in range(2,193)])
+        for a in range(0,n,chunk*frequency):
+            m = min(chunk*frequency,n-a)
+            idx = np.arange(a,a+m)
+            t = (t0 + (idx*step).astype("timedelta64[ms]")).astype(object)
+            stamps = [stamp.strftime("%I:%M:%S,") + f"{stamp.microsecond//1000:03d}" + stamp.strftime(" %p") for stamp in t]
+            lat,long,alt = hk_flightpath(idx/frequency,rng)
+            ws = np.abs(10 + hk_walk(rng,m,0.05))
+            text = np.full((193,m),"0",dtype="U16")
+            text[0] = idx.astype("U")
+            text[1] = stamps
+            text[4],text[5],text[6] = [np.char.replace(hk_format(val[None,:],fmt)[0],".",",") for val,fmt in [(lat,"%.7f"),(long,"%.7f"),(alt,"%.2f")]]
+            text[192] = np.char.replace(hk_format(ws[None,:],"%.1f")[0],".",",")
+            text[192][rng.random(m) < 0.01] = "" #gaps in the wind speed
+            writer.writerows(zip(*text))
+    return n
+
+
+def sen55csv(path,duration="1h",start="2025-06-01 10:00:00",seed=0):
+    """
+    Writes a SEN55 csv-file (1 Hz)
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+    duration : int, float or str, optional
+        Length of the measurement (see toseconds). The default is "1h".
+    start : str, optional
+        Timestamp of the first row. The default is "2025-06-01 10:00:00".
+    seed : int, optional
+        Seed of the random numbers. The default is 0.
+
+    Returns
+    -------
+    int
+        Number of data rows.
+
+    """
+
+    header = ["Date","Time","Temp","Hum","VOC","NOx","PM1","PM2.5","PM4","PM10"]
+    def values(rng,m):
+        pm1 = np.abs(5 + hk_walk(rng,m,0.05))
+        return [20 + hk_walk(rng,m,0.01), 50 + hk_walk(rng,m,0.02), 100 + hk_walk(rng,m,0.1), 1 + np.abs(hk_walk(rng,m,0.01)),
+                pm1, pm1*1.2, pm1*1.3, pm1*1.4]
+    return hk_lowcostcsv(path,duration,start,seed,header,values,"s")
+
+
+def ccs811csv(path,duration="1h",start="2025-06-01 10:00:00",seed=0):
+    """
+    Writes a CCS811 csv-file (1 Hz)
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+    duration : int, float or str, optional
+        Length of the measurement (see toseconds). The default is "1h".
+    start : str, optional
+        Timestamp of the first row. The default is "2025-06-01 10:00:00".
+    seed : int, optional
+        Seed of the random numbers. The default is 0.
+
+    Returns
+    -------
+    int
+        Number of data rows.
+
+    """
+
+    header = ["Date","Time","TVOC","CO2"]
+    def values(rng,m):
+        return [np.abs(50 + hk_walk(rng,m,0.5)), 420 + np.abs(hk_walk(rng,m,0.5))]
+    return hk_lowcostcsv(path,duration,start,seed,header,values,"s")
+
+
+def flyingflocsv(path,duration="1h",start="2025-06-01 10:00:00",seed=0):
+    """
+    Writes a FlyingFlo_USB csv-file (1 Hz)
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+    duration : int, float or str, optional
+        Length of the measurement (see toseconds). The default is "1h".
+    start : str, optional
+        Timestamp of the first row. The default is "2025-06-01 10:00:00".
+    seed : int, optional
+        Seed of the random numbers. The default is 0.
+
+    Returns
+    -------
+    int
+        Number of data rows.
+
+    """
+
+    header = ["Date","Time","CO2","TVOC","TempBME","Gas","HumBME","Press","PM1","PM2.5","PM4","PM10","HumSEN","TempSEN","VOCSEN","NOx"]
+    def values(rng,m):
+        pm1 = np.abs(5 + hk_walk(rng,m,0.05))
+        return [420 + np.abs(hk_walk(rng,m,0.5)), np.abs(50 + hk_walk(rng,m,0.5)), 20 + hk_walk(rng,m,0.01), 50000 + hk_walk(rng,m,10),
+                50 + hk_walk(rng,m,0.02), 950 + hk_walk(rng,m,0.01), pm1, pm1*1.2, pm1*1.3, pm1*1.4,
+                50 + hk_walk(rng,m,0.02), 20 + hk_walk(rng,m,0.01), 100 + hk_walk(rng,m,0.1), 1 + np.abs(hk_walk(rng,m,0.01))]
+    return hk_lowcostcsv(path,duration,start,seed,header,values,"ms")
+
+
+def weathercsv(path,duration="1d",interval=300,start="2025-06-01 00:00:00",seed=0):
+    """
+    Writes a csv-file of the weatherstation
+
+    Parameters
+    ----------
+    path : str
+        Path of the file (must not contain other dots than the one of '.csv').
+    duration : int, float or str, optional
+        Length of the measurement (see toseconds). The default is "1d".
+    interval : int, optional
+        Seconds between two rows. The default is 300.
+    start : str, optional
+        Timestamp of the first row. The default is "2025-06-01 00:00:00".
+    seed : int, optional
+        Seed of the random numbers. The default is 0.
+
+    Returns
+    -------
+    int
+        Number of data rows.
+
+    """
+
+    rng = np.random.default_rng(seed)
+    n = toseconds(duration) // interval
+    t0 = np.datetime64(start,"m")
+    header = ["Time","Indoor Temp","Indoor Hum","Outdoor Temp","Outdoor Hum","Dew Point","Feels Like","Wind","Gust","Wind Direction",
+              "Abs Pressure","Rel Pressure","Solar Rad","UVI","Hourly Rain"]
+    with open(path,"w",newline="") as f:
+        f.write(",".join(header) + "\n")
+        for a in range(0,n,chunk):
+            m = min(chunk,n-a)
+            t = t0 + (np.arange(a,a+m)*interval//60).astype("timedelta64[m]")
+            hours = (t - t.astype("datetime64[D]")).astype(float) / 60
+            sun = np.clip(np.sin((hours-6)/12*np.pi),0,None)
+            cols = np.vstack([21 + hk_walk(rng,m,0.02), 45 + hk_walk(rng,m,0.05), 15 + 8*sun + hk_walk(rng,m,0.05), 70 - 20*sun + hk_walk(rng,m,0.1),
+                              8 + hk_walk(rng,m,0.02), 15 + 8*sun, np.abs(2 + hk_walk(rng,m,0.1)), np.abs(4 + hk_walk(rng,m,0.2)), rng.uniform(0,360,m),
+                              960 + hk_walk(rng,m,0.05), 1013 + hk_walk(rng,m,0.05), 800*sun, np.round(8*sun), np.where(rng.random(m) < 0.02,rng.exponential(1,m),0)])
+            text = np.vstack([np.char.replace(np.char.replace(np.datetime_as_string(t,unit="m").astype("U16"),"-","/"),"T"," "),hk_format(cols,"%.1f")])
+            hk_writerows(f,text,",")
+    return n
+
+
+#housekeeping funcs
+
+def hk_walk(rng,n,scale):
+    """Returns a random walk of length n"""
+
+    return np.cumsum(rng.standard_normal(n)) * scale
+
+
+def hk_format(values,fmt):
+    """Formats a 2D array of numbers into a 2D array of str (wide enough to be overwritten with timestamps)"""
+
+    return np.char.mod(fmt,values).astype("U32")
+
+
+def hk_timeofday(t,unit):
+    """Formats np.datetime64 as 'hh:mm:ss' (unit='s'), 'hh:mm:ss.fff' (unit='ms') or 'hh:mm:ss.ffffff' (unit='us')"""
+
+    return np.array([s[11:] for s in np.datetime_as_string(t,unit=unit)])
+
+
+def hk_writerows(f,text,delimiter):
+    """Writes a 2D array of str (one row per column of the file) as delimited lines"""
+
+    f.write("\n".join(delimiter.join(row) for row in zip(*text)) + "\n")
+
+
+def hk_flightpath(secs,rng):
+    """Returns latitude, longitude and height AGL of a drone flying circles (with noise)"""
+
+    phase = secs / 120 * 2 * np.pi
+    lat = 48.2 + 0.0005*np.sin(phase) + 1e-6*rng.standard_normal(len(secs))
+    long = 16.37 + 0.0007*np.cos(phase) + 1e-6*rng.standard_normal(len(secs))
+    alt = np.clip(secs/10,0,100) + 0.1*rng.standard_normal(len(secs))
+    return lat,long,alt
+
+
+def hk_wibsparticles(f,secs,rng,forcedtrigger=False):
+    """Writes the datasets of NEO/ParticleData for all particles of the chunks of seconds in secs"""
+
+    group = f.create_group("NEO").create_group("ParticleData")
+    datasets = {"Seconds" : ((),np.uint32),
+                "Size_um" : ((),np.float32),
+                "Flag_Excited" : ((),np.uint8),
+                "Xe1_FluorPeak" : ((2,),np.float32),
+                "Xe2_FluorPeak" : ((2,),np.float32)}
+    for name,(shape,dtype) in datasets.items():
+        group.create_dataset(name,shape=(0,)+shape,maxshape=(None,)+shape,dtype=dtype,chunks=True)
+    total = 0
+    for sec in secs:
+        m = len(sec)
+        fluorescent = np.zeros(m,bool) if forcedtrigger else rng.random(m) < 0.1
+        values = {"Seconds" : sec,
+                  "Size_um" : (0.5 * np.exp(rng.exponential(0.8,m))).astype(np.float32),
+                  "Flag_Excited" : (rng.random(m) < (0.0 if forcedtrigger else 0.95)).astype(np.uint8),
+                  "Xe1_FluorPeak" : (rng.normal(60,10,(m,2)) + fluorescent[:,None]*rng.exponential(500,(m,2))).astype(np.float32),
+                  "Xe2_FluorPeak" : (rng.normal(80,10,(m,2)) + fluorescent[:,None]*rng.exponential(500,(m,2))).astype(np.float32)}
+        for name,val in values.items():
+            group[name].resize(total+m,axis=0)
+            group[name][total:total+m] = val
+        total += m
+    return total
+
+
+def hk_lowcostcsv(path,duration,start,seed,header,values,unit):
+    """Writes a 1 Hz csv-file of a lowcost sensor with date and time in the first two columns"""
+
+    rng = np.random.default_rng(seed)
+    n = toseconds(duration)
+    t0 = np.datetime64(start,"ms")
+    os.makedirs(os.path.dirname(os.path.abspath(path)),exist_ok=True)
+    with open(path,"w",newline="") as f:
+        f.write(",".join(header) + "\n")
+        for a in range(0,n,chunk):
+            m = min(chunk,n-a)
+            t = t0 + (np.arange(a,a+m)*1000 + 250).astype("timedelta64[ms]")
+            text = np.vstack([np.datetime_as_string(t,unit="D"),hk_timeofday(t,unit),hk_format(np.vstack(values(rng,m)),"%.2f")])
+            hk_writerows(f,text,",")
+    return n
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Measures the cold import time of every agg_dim class (each import runs in a fresh interpreter)
+
+usage: python benchmarks/startup.py [-n REPEATS] [classes ...]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+classes = ["Pops","OPC","WeatherData","CCS811","SEN55","FlyingFlo_USB","FData","NewFData","WIBS","Dronedata","DroneWrapper"]
+backends = ["matplotlib","numba","h5py","folium","branca","PIL","utm"]
+
+probe = """
+import sys,time
+t = time.perf_counter()
+from agg_dim import {name}
+t = time.perf_counter() - t
+print(t)
+print(",".join(m for m in {backends} if m in sys.modules))
+"""
+
+
+def coldimport(name,repeats=5):
+    """
+    Imports a class from agg_dim in a fresh interpreter
+
+    Parameters
+    ----------
+    name : str
+        Name of the class.
+    repeats : int, optional
+        Number of fresh interpreters. The default is 5.
+
+    Returns
+    -------
+    times : list of float
+        Contains the import time in seconds of every run.
+    loaded : list of str
+        Contains the heavy backends, which were imported by the class.
+
+    """
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ,PYTHONPATH=root+os.pathsep+os.environ.get("PYTHONPATH",""))
+    times,loaded = [],[]
+    for i in range(repeats):
+        out = subprocess.run([sys.executable,"-c",probe.format(name=name,backends=backends)],
+                             capture_output=True,text=True,env=env,check=True).stdout.splitlines()
+        times.append(float(out[0]))
+        loaded = out[1].split(",") if len(out) > 1 and out[1] else []
+    return times,loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("classes",nargs="*",default=classes)
+    parser.add_argument("-n","--repeats",type=int,default=5)
+    args = parser.parse_args()
+
+    print(f"{'class':<15}{'median [s]':>12}{'min [s]':>10}  backends")
+    for name in args.classes:
+        times,loaded = coldimport(name,args.repeats)
+        print(f"{name:<15}{statistics.median(times):>12.3f}{min(times):>10.3f}  {', '.join(loaded) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
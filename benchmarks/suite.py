@@ -0,0 +1,579 @@
+# -*- coding: utf-8 -*-
+"""
+Times loading, cropping, averaging, returndata/wrap, save/load round-trips, heatmaps, plots and flight maps of all agg_dim classes on synthetic files
+
+usage: python benchmarks/suite.py [-d DURATION] [-n REPEATS] [-o RESULTS.json] [--compare BASELINE.json] [cases ...]
+
+The files are written by generators.py into --data (once per duration and seed) and reused by later runs.
+Cases are selected by prefix (eg. 'load' or 'heatmap.pops'), cases whose optional backend is missing are skipped.
+"""
+
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+import numpy as np
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,root)
+import generators
+
+start = "2025-06-01 10:00:00"
+cases = {}
+
+
+def case(name,needs=()):
+    """
+    Registers a benchmark case
+
+    A case is a function of the dict of generated files, which does all the setup and returns the callable that is timed.
+    It is called once per repeat, so cases which change their obj (eg. average) get a fresh one every time.
+
+    Parameters
+    ----------
+    name : str
+        Name of the case ('<stage>.<class>[.<variant>]').
+    needs : tuple of str, optional
+        Optional modules the case needs. If one is missing the case is skipped. The default is ().
+
+    """
+
+    def decorator(func):
+        cases[name] = (func,needs)
+        return func
+    return decorator
+
+
+#files
+
+def generate(datadir,duration,seed=0):
+    """
+    Writes all synthetic files of one duration (existing files are reused)
+
+    Parameters
+    ----------
+    datadir : str
+        Folder of the files.
+    duration : str
+        Duration of the measurements (see generators.toseconds).
+    seed : int, optional
+        Seed of the random numbers. The default is 0.
+
+    Returns
+    -------
+    dict
+        Contains the paths (and the WIBS forced trigger kwargs) by name.
+
+    """
+
+    folder = os.path.join(datadir,f"{duration}_seed{seed}")
+    os.makedirs(folder,exist_ok=True)
+    files = {}
+    def make(name,filename,func,*args,**kwargs):
+        path = os.path.join(folder,filename)
+        files[name] = path
+        if not os.path.exists(path):
+            func(path,*args,duration=duration,start=start,seed=seed,**kwargs)
+
+    for layout in generators.popslayouts:
+        make(f"pops_{layout}",f"pops_{layout.replace('.','')}.csv",generators.popscsv,layout=layout)
+    make("fspec","fspec.csv",generators.fspeccsv)
+    files["fspec_bg"] = os.path.join(folder,"fspec_bg.csv")
+    if not os.path.exists(files["fspec_bg"]):
+        generators.fspeccsv(files["fspec_bg"],duration="2min",start=start,seed=seed+1)
+    make("bladescapes","bladescapes.csv",generators.bladescapescsv)
+    make("own","own.csv",generators.owncsv)
+    make("sen55","sen55.csv",generators.sen55csv)
+    make("ccs811","ccs811.csv",generators.ccs811csv)
+    make("flyingflo","flyingflo.csv",generators.flyingflocsv)
+    make("weather","weather.csv",generators.weathercsv)
+    files["opc"] = os.path.join(folder,"opc-C.dat")
+    if not os.path.exists(files["opc"]):
+        generators.opcdat(os.path.join(folder,"opc"),duration=duration,start=start,seed=seed)
+    files["wibs"],files["wibs_ft"] = os.path.join(folder,"wibs.h5"),os.path.join(folder,"wibs_ft.h5")
+    files["wibs_kwargs"] = os.path.join(folder,"wibs.json")
+    if hk_available("h5py") and not os.path.exists(files["wibs_kwargs"]):
+        kwargs = generators.wibsh5(files["wibs"],files["wibs_ft"],duration=duration,start=start,seed=seed)
+        with open(files["wibs_kwargs"],"w") as f:
+            json.dump(kwargs,f)
+    files["tmp"] = tempfile.mkdtemp(prefix="agg_dim_bench_")
+    files["crop"] = hk_cropborders(duration)
+    return files
+
+
+#cases
+
+@case("load.pops.desktopmode")
+def load_pops_desktopmode(files):
+    from agg_dim import Pops
+    return lambda: Pops(files["pops_desktopmode"],layout="desktopmode")
+
+@case("load.pops.box_pallnsdorfer")
+def load_pops_box(files):
+    from agg_dim import Pops
+    return lambda: Pops(files["pops_box_pallnsdorfer"],layout="box_pallnsdorfer")
+
+@case("load.pops.FlyingFlo2.0")
+def load_pops_flyingflo(files):
+    from agg_dim import Pops
+    return lambda: Pops(files["pops_FlyingFlo2.0"],layout="FlyingFlo2.0")
+
+@case("load.fdata")
+def load_fdata(files):
+    from agg_dim import FData
+    return lambda: FData(files["fspec"])
+
+@case("load.newfdata")
+def load_newfdata(files):
+    from agg_dim import NewFData
+    return lambda: NewFData(files["fspec"],files["fspec_bg"],jit=False)
+
+@case("load.newfdata.jit",needs=("numba",))
+def load_newfdata_jit(files):
+    from agg_dim import NewFData
+    NewFData(files["fspec"],files["fspec_bg"],jit=True) #compiles or loads the cached kernel
+    return lambda: NewFData(files["fspec"],files["fspec_bg"],jit=True)
+
+@case("load.wibs",needs=("h5py",))
+def load_wibs(files):
+    from agg_dim import WIBS
+    kwargs = hk_wibskwargs(files)
+    return lambda: WIBS(files["wibs"],FT_file=files["wibs_ft"],**kwargs)
+
+@case("load.opc")
+def load_opc(files):
+    from agg_dim import OPC
+    return lambda: OPC(files["opc"])
+
+@case("load.dronewrapper.bladescapes")
+def load_bladescapes(files):
+    from agg_dim import DroneWrapper
+    return lambda: DroneWrapper(files["bladescapes"],dronetype="BladeScapes")
+
+@case("load.dronewrapper.own")
+def load_own(files):
+    from agg_dim import DroneWrapper
+    return lambda: DroneWrapper(files["own"],dronetype="Own")
+
+@case("load.dronedata")
+def load_dronedata(files):
+    from agg_dim import Dronedata
+    return lambda: Dronedata(files["own"])
+
+@case("load.sen55")
+def load_sen55(files):
+    from agg_dim import SEN55
+    return lambda: SEN55(files["sen55"])
+
+@case("load.ccs811")
+def load_ccs811(files):
+    from agg_dim import CCS811
+    return lambda: CCS811(files["ccs811"])
+
+@case("load.flyingflo_usb")
+def load_flyingflo(files):
+    from agg_dim import FlyingFlo_USB
+    return lambda: FlyingFlo_USB(files["flyingflo"])
+
+@case("load.weatherdata")
+def load_weather(files):
+    from agg_dim import WeatherData
+    return lambda: WeatherData(files["weather"])
+
+@case("crop.pops")
+def crop_pops(files):
+    from agg_dim import Pops
+    s,e = files["crop"]
+    return lambda: Pops(files["pops_FlyingFlo2.0"],start=s,end=e)
+
+@case("crop.newfdata")
+def crop_newfdata(files):
+    from agg_dim import NewFData
+    s,e = files["crop"]
+    return lambda: NewFData(files["fspec"],files["fspec_bg"],jit=False,start=s,end=e)
+
+@case("crop.flyingflo_usb")
+def crop_flyingflo(files):
+    from agg_dim import FlyingFlo_USB
+    s,e = files["crop"]
+    return lambda: FlyingFlo_USB(files["flyingflo"],start=s,end=e)
+
+@case("crop.dronewrapper")
+def crop_dronewrapper(files):
+    from agg_dim import DroneWrapper
+    s,e = files["crop"]
+    return lambda: DroneWrapper(files["bladescapes"],start=s,end=e)
+
+@case("average.pops")
+def average_pops(files):
+    from agg_dim import Pops
+    obj = Pops(files["pops_FlyingFlo2.0"])
+    return lambda: obj.average(window="1min")
+
+@case("average.sen55")
+def average_sen55(files):
+    from agg_dim import SEN55
+    obj = SEN55(files["sen55"])
+    return lambda: obj.average(window="1min")
+
+@case("average.ccs811")
+def average_ccs811(files):
+    from agg_dim import CCS811
+    obj = CCS811(files["ccs811"])
+    return lambda: obj.average(window="1min")
+
+@case("average.flyingflo_usb")
+def average_flyingflo(files):
+    from agg_dim import FlyingFlo_USB
+    obj = FlyingFlo_USB(files["flyingflo"])
+    return lambda: obj.average(window="1min")
+
+@case("returndata.pops")
+def returndata_pops(files):
+    from agg_dim import Pops
+    obj = Pops(files["pops_FlyingFlo2.0"])
+    return lambda: obj.returndata()
+
+@case("returndata.newfdata")
+def returndata_newfdata(files):
+    from agg_dim import NewFData
+    obj = NewFData(files["fspec"],files["fspec_bg"],jit=False)
+    return lambda: obj.returndata()
+
+@case("returndata.flyingflo_usb")
+def returndata_flyingflo(files):
+    from agg_dim import FlyingFlo_USB
+    obj = FlyingFlo_USB(files["flyingflo"])
+    return lambda: obj.returndata()
+
+@case("wrap.dronewrapper")
+def wrap_dronewrapper(files):
+    from agg_dim import DroneWrapper,Pops,NewFData,FlyingFlo_USB
+    drone = DroneWrapper(files["bladescapes"])
+    objs = {"pops" : Pops(files["pops_FlyingFlo2.0"]),
+            "fspec" : NewFData(files["fspec"],files["fspec_bg"],jit=False),
+            "flyingflo" : FlyingFlo_USB(files["flyingflo"])}
+    def run():
+        for name,obj in objs.items():
+            drone.wrap(name,obj)
+        drone.returndata(nested=True)
+    return run
+
+@case("roundtrip.newfdata")
+def roundtrip_newfdata(files):
+    from agg_dim import NewFData
+    obj = NewFData(files["fspec"],files["fspec_bg"],jit=False)
+    path = hk_tmppath(files,"bench.fspec")
+    def run():
+        obj.save(path[:-6])
+        hk_touch(NewFData(path).__dict__)
+    return run
+
+@case("roundtrip.opc")
+def roundtrip_opc(files):
+    from agg_dim import OPC
+    obj = OPC(files["opc"])
+    path = hk_tmppath(files,"bench.opc")
+    def run():
+        obj.save(path)
+        hk_touch(OPC(path).data)
+    return run
+
+@case("roundtrip.wibs",needs=("h5py",))
+def roundtrip_wibs(files):
+    from agg_dim import WIBS
+    obj = WIBS(files["wibs"],FT_file=files["wibs_ft"],**hk_wibskwargs(files))
+    path = hk_tmppath(files,"bench.wibs")
+    def run():
+        obj.save(path)
+        hk_touch(WIBS(path).data)
+    return run
+
+@case("roundtrip.dronewrapper")
+def roundtrip_dronewrapper(files):
+    from agg_dim import DroneWrapper,Pops
+    obj = DroneWrapper(files["bladescapes"])
+    obj.wrap("pops",Pops(files["pops_FlyingFlo2.0"]))
+    path = hk_tmppath(files,"bench.flight")
+    def run():
+        obj.save(path)
+        hk_touch(DroneWrapper(path).data)
+    return run
+
+@case("heatmap.pops",needs=("matplotlib",))
+def heatmap_pops(files):
+    from agg_dim import Pops
+    obj = Pops(files["pops_FlyingFlo2.0"])
+    ax = hk_axis()
+    return lambda: obj.heatmap(ax)
+
+@case("heatmap.pops.new",needs=("matplotlib",))
+def heatmap_pops_new(files):
+    from agg_dim import Pops
+    obj = Pops(files["pops_FlyingFlo2.0"])
+    ax = hk_axis()
+    return lambda: obj.newheatmap(ax)
+
+@case("heatmap.newfdata",needs=("matplotlib",))
+def heatmap_newfdata(files):
+    from agg_dim import NewFData
+    obj = NewFData(files["fspec"],files["fspec_bg"],jit=False)
+    ax = hk_axis()
+    return lambda: obj.heatmap(ax)
+
+@case("heatmap.opc",needs=("matplotlib",))
+def heatmap_opc(files):
+    from agg_dim import OPC
+    obj = OPC(files["opc"])
+    ax = hk_axis()
+    return lambda: obj.heatmap(ax)
+
+@case("heatmap.wibs",needs=("matplotlib","h5py"))
+def heatmap_wibs(files):
+    from agg_dim import WIBS
+    obj = WIBS(files["wibs"],FT_file=files["wibs_ft"],**hk_wibskwargs(files))
+    ax = hk_axis()
+    return lambda: obj.heatmap(ax,"allparticles")
+
+@case("plot.pops",needs=("matplotlib",))
+def plot_pops(files):
+    from agg_dim import Pops
+    obj = Pops(files["pops_FlyingFlo2.0"])
+    ax = hk_axis()
+    return lambda: (obj.plot(ax,"total"),ax.figure.canvas.draw())
+
+@case("plot.pops.decimate",needs=("matplotlib",))
+def plot_pops_decimate(files):
+    from agg_dim import Pops
+    obj = Pops(files["pops_FlyingFlo2.0"])
+    ax = hk_axis()
+    return lambda: (obj.plot(ax,"total",decimate=True),ax.figure.canvas.draw())
+
+@case("map.bingrid")
+def map_bingrid(files):
+    from agg_dim import DroneWrapper
+    from agg_dim.gridding import bingrid
+    drone = DroneWrapper(files["bladescapes"])
+    lat,long,height = drone.data["Drone"]["lat"],drone.data["Drone"]["long"],drone.data["Drone"]["height"]
+    return lambda: [bingrid(lat,long,height,500,stat) for stat in ["mean","median","count"]]
+
+
+@case("map.advancedflightmap",needs=("folium",))
+def map_advancedflightmap(files):
+    from agg_dim import DroneWrapper,Pops
+    drone = DroneWrapper(files["bladescapes"])
+    drone.wrap("pops",Pops(files["pops_FlyingFlo2.0"]))
+    path = hk_tmppath(files,"bench.html")
+    return lambda: drone.advancedflightmap("pops_total",save_loc=path,tolerance=None)
+
+
+#runner
+
+def run(names,files,repeats=5):
+    """
+    Runs the benchmark cases
+
+    Parameters
+    ----------
+    names : list of str
+        Names of the cases.
+    files : dict
+        Generated files (see generate).
+    repeats : int, optional
+        Number of timed runs per case (after one untimed warmup). The default is 5.
+
+    Returns
+    -------
+    dict
+        Contains {"status", "times", "median", "min"} (or {"status", "reason"}) per case.
+
+    """
+
+    results = {}
+    for name in names:
+        func,needs = cases[name]
+        missing = [module for module in needs if not hk_available(module)]
+        if missing:
+            results[name] = {"status" : "skipped", "reason" : f"missing {', '.join(missing)}"}
+            continue
+        times = []
+        try:
+            for i in range(repeats+1):
+                bench = func(files)
+                t = time.perf_counter()
+                bench()
+                t = time.perf_counter() - t
+                hk_closefigures()
+                if i > 0:
+                    times.append(t)
+        except Exception as err:
+            results[name] = {"status" : "error", "reason" : f"{type(err).__name__}: {err}", "traceback" : traceback.format_exc()}
+            continue
+        results[name] = {"status" : "ok", "times" : times, "median" : statistics.median(times), "min" : min(times)}
+    return results
+
+
+def compare(results,baseline,threshold=1.25):
+    """
+    Compares the median times with the ones of an earlier run
+
+    Parameters
+    ----------
+    results : dict
+        Results of run.
+    baseline : dict
+        Results of an earlier run (the "cases" of its json file).
+    threshold : float, optional
+        Cases which are slower than threshold times the baseline count as regressions. The default is 1.25.
+
+    Returns
+    -------
+    dict
+        Contains the ratio new/old median per case, which ran successfully in both.
+    list of str
+        Contains the names of the regressed cases.
+
+    """
+
+    ratios = {name : res["median"] / baseline[name]["median"] for name,res in results.items()
+              if res["status"] == "ok" and baseline.get(name,{}).get("status") == "ok" and baseline[name]["median"] > 0}
+    return ratios,[name for name,ratio in ratios.items() if ratio > threshold]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("cases",nargs="*",help="prefixes of the cases to run (default: all)")
+    parser.add_argument("-d","--duration",default="10min",help="length of the synthetic measurements, eg. 90s, 10min, 2h, 1d (default: 10min)")
+    parser.add_argument("-n","--repeats",type=int,default=5)
+    parser.add_argument("-s","--seed",type=int,default=0)
+    parser.add_argument("-o","--output",help="writes the results to this json file")
+    parser.add_argument("--data",default=os.path.join(tempfile.gettempdir(),"agg_dim_benchmarks"),help="folder of the generated files")
+    parser.add_argument("--compare",help="json file of an earlier run")
+    parser.add_argument("--threshold",type=float,default=1.25,help="slowdown factor that counts as regression (default: 1.25)")
+    parser.add_argument("--list",action="store_true",help="lists the cases and exits")
+    args = parser.parse_args()
+
+    names = [name for name in cases if not args.cases or any(name.startswith(prefix) for prefix in args.cases)]
+    if args.list:
+        print("\n".join(names))
+        return 0
+
+    import matplotlib
+    matplotlib.use("Agg")
+    files = generate(args.data,args.duration,args.seed)
+    try:
+        results = run(names,files,args.repeats)
+    finally:
+        shutil.rmtree(files["tmp"],ignore_errors=True)
+
+    ratios,regressions = {},[]
+    if args.compare:
+        with open(args.compare) as f:
+            ratios,regressions = compare(results,json.load(f)["cases"],args.threshold)
+
+    print(f"{'case':<32}{'median [s]':>12}{'min [s]':>10}{'vs. baseline':>14}")
+    for name,res in results.items():
+        if res["status"] != "ok":
+            print(f"{name:<32}{res['status']:>12}  {res['reason']}")
+            continue
+        ratio = f"{ratios[name]:.2f}x" if name in ratios else ""
+        flag = " !" if name in regressions else ""
+        print(f"{name:<32}{res['median']:>12.4f}{res['min']:>10.4f}{ratio:>14}{flag}")
+
+    if args.output:
+        with open(args.output,"w") as f:
+            json.dump({"meta" : hk_meta(args), "cases" : results},f,indent=1)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) slower than {args.threshold}x: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+#housekeeping funcs
+
+def hk_available(module):
+    """Checks if an optional module can be imported"""
+
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+def hk_cropborders(duration):
+    """Returns 'hh:mm:ss' borders at 10 % and 90 % of the measurement"""
+
+    secs = generators.toseconds(duration)
+    t0 = dt.datetime.fromisoformat(start)
+    return [(t0 + dt.timedelta(seconds=secs*frac)).strftime("%H:%M:%S") for frac in [0.1,0.9]]
+
+
+def hk_wibskwargs(files):
+    """Returns FT_time and FT_date of the generated WIBS files"""
+
+    with open(files["wibs_kwargs"]) as f:
+        kwargs = json.load(f)
+    return {"FT_time" : kwargs["FT_time"], "FT_date" : kwargs["FT_date"]}
+
+
+def hk_tmppath(files,name):
+    """Returns a path in the temporary folder and removes what an earlier repeat saved there"""
+
+    path = os.path.join(files["tmp"],name)
+    shutil.rmtree(path,ignore_errors=True)
+    return path
+
+
+def hk_touch(obj):
+    """Reads every array of a (nested) dict, so that lazily loaded caches are measured completely"""
+
+    if isinstance(obj,dict) or hasattr(obj,"keys"):
+        for key in obj.keys():
+            hk_touch(obj[key])
+    elif isinstance(obj,np.ndarray) and obj.dtype != object:
+        obj.sum()
+
+
+def hk_axis():
+    """Returns a new mpl axis"""
+
+    import matplotlib.pyplot as plt
+    return plt.subplots()[1]
+
+
+def hk_closefigures():
+    """Closes all figures, which the case opened"""
+
+    if "matplotlib.pyplot" in sys.modules:
+        sys.modules["matplotlib.pyplot"].close("all")
+
+
+def hk_meta(args):
+    """Returns the environment of the run"""
+
+    try:
+        commit = subprocess.run(["git","rev-parse","HEAD"],cwd=root,capture_output=True,text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"timestamp" : dt.datetime.now().isoformat(timespec="seconds"),
+            "commit" : commit,
+            "python" : platform.python_version(),
+            "numpy" : np.__version__,
+            "platform" : platform.platform(),
+            "duration" : args.duration,
+            "seed" : args.seed,
+            "repeats" : args.repeats}
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""
+Makes the generators of the benchmarks importable in the tests (synthetic instrument files)
+"""
+
+import os
+import sys
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),"benchmarks"))
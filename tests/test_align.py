@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+Checks which timestamps timetools.align matches for series with real dates and with times of day only
+"""
+
+import numpy as np
+
+from agg_dim.timetools import align
+
+
+def test_real_dates_keep_their_day():
+    t1 = np.array(["2025-06-03T10:00:00"],dtype="datetime64[us]")
+    t2 = np.datetime64("2025-06-01T10:00:00") + np.arange(60).astype("timedelta64[h]")
+    i1,i2 = align(t1,t2)
+    assert t2[i2].tolist() == [np.datetime64("2025-06-03T10:00:00","us").item()]
+
+
+def test_times_of_day_match_first_day():
+    t1 = np.array(["1900-01-01T10:00:00"],dtype="datetime64[us]")
+    t2 = np.datetime64("2025-06-01T10:00:00") + np.arange(60).astype("timedelta64[h]")
+    i1,i2 = align(t1,t2)
+    assert i2.tolist() == [0]
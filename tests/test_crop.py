@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Checks time-of-day crop borders and times of day which pass midnight
+"""
+
+import numpy as np
+
+from agg_dim.timetools import crop,unwrapdays
+
+
+def test_borders_on_one_day():
+    t = np.datetime64("2025-06-01T10:00:00") + np.arange(600).astype("timedelta64[s]")
+    assert crop(t,None,"09:30:00") == slice(0,0)
+    assert crop(t,"10:05:00","10:03:00") == slice(300,300)
+    assert crop(t,"10:05:00","10:06:00") == slice(300,360)
+
+
+def test_borders_over_midnight():
+    t = np.datetime64("2025-06-01T23:00:00") + np.arange(80).astype("timedelta64[m]")
+    assert crop(t,None,"00:30:00") == slice(0,80)
+    assert crop(t,"00:30:00",None) == slice(80,80)
+    assert crop(t,"23:55:00","00:05:00") == slice(55,65)
+
+
+def test_unwrapdays():
+    t = np.datetime64("1900-01-01T23:50:00") + np.arange(1200).astype("timedelta64[s]")
+    wrapped = t - (t >= np.datetime64("1900-01-02")).astype("timedelta64[D]")
+    assert np.array_equal(unwrapdays(wrapped),t)
+    assert np.array_equal(unwrapdays(wrapped[600:],t[599]),t[600:])
+    assert np.array_equal(unwrapdays(wrapped[700:],t[699]),t[700:])
+    assert crop(unwrapdays(wrapped),"23:55:00","00:05:00") == slice(300,900)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that follow mode keeps the crop borders and the row filtering of a complete read when lines are appended later
+"""
+
+import datetime as dt
+
+import generators #on the path through conftest.py
+
+from agg_dim import Pops,FlyingFlo_USB
+
+
+def hk_split(path,n):
+    """Writes the first n lines of path back to it and returns the remaining lines"""
+
+    with open(path) as f:
+        lines = f.readlines()
+    with open(path,"w") as f:
+        f.writelines(lines[:n])
+    return lines[n:]
+
+
+def hk_append(path,lines):
+    """Appends lines to path"""
+
+    with open(path,"a") as f:
+        f.writelines(lines)
+
+
+def test_pops_end_after_refresh(tmp_path):
+    path = str(tmp_path / "pops.csv")
+    generators.popscsv(path,duration="10min")
+    rest = hk_split(path,40)
+    obj = Pops(path,follow=True,end="10:00:50")
+    assert len(obj.t) == 38 #the first row is skipped
+    hk_append(path,rest[:100])
+    assert obj.refresh() == 11
+    #this chunk starts after end
+    hk_append(path,rest[100:300])
+    assert obj.refresh() == 0
+    assert len(obj.t) == 49
+    assert obj.t[-1] == dt.datetime(1900,1,1,10,0,49)
+
+
+def test_flyingflo_end_after_refresh(tmp_path):
+    path = str(tmp_path / "flyingflo.csv")
+    generators.flyingflocsv(path,duration="10min")
+    rest = hk_split(path,40)
+    obj = FlyingFlo_USB(path,follow=True,end="10:00:50")
+    assert len(obj.t) == 39
+    hk_append(path,rest[:100])
+    assert obj.refresh() == 11
+    #this chunk starts after end
+    hk_append(path,rest[100:300])
+    assert obj.refresh() == 0
+    assert len(obj.t) == 50
+    assert obj.t[-1] == dt.datetime(1900,1,1,10,0,49,250000)
+
+
+def test_pops_short_last_row(tmp_path):
+    path = str(tmp_path / "pops.csv")
+    generators.popscsv(path,duration="10min")
+    with open(path) as f:
+        lines = f.readlines()
+    last = lines[-1].split(",")
+    hk_append(path,[",".join(last[:4]) + "\n"])
+    obj = Pops(path)
+    assert len(obj.t) == len(lines) - 2